@@ -0,0 +1,133 @@
+"""Stand-in for ``compresswitch --nsz-worker`` used by the benchmarks.
+
+Behaves like the real worker entry point (progress shim, ``--serve FD``
+pool server) but registers itself as the ``nsz`` module, so no Switch keys
+or game files are needed. Each job reads its input file, prints nsz-style
+log lines and drives enlighten-style counters, then writes a sparse output
+file (except with ``-V``, which only reads). Tunables come from the environment:
+
+    FAKE_NSZ_RATE     MiB/s to pretend to process (0 = as fast as possible)
+    FAKE_NSZ_NCAS     number of NCAs the input is split into
+    FAKE_NSZ_CHATTER  extra log lines printed per MiB
+    FAKE_NSZ_FAIL     exit code to finish with (default 0)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import types
+
+MiB = 1 << 20
+
+
+class _TextCounter:
+    """Minimal enlighten.Counter that renders bars the way enlighten does."""
+
+    def __init__(self, total=None, desc="", unit="", **_kwargs):
+        self.total = total or 0
+        self.desc = desc
+        self.unit = unit
+        self.count = 0
+
+    def add_subcounter(self, *_args, **_kwargs):
+        return types.SimpleNamespace(count=0, update=lambda *a, **k: None)
+
+    def update(self, incr=1, force=False):
+        self.count += incr
+        self.refresh()
+
+    def refresh(self, *_args, **_kwargs):
+        percent = int(self.count * 100 / self.total) if self.total else 0
+        bar = "█" * (percent // 4) + " " * (25 - percent // 4)
+        sys.stdout.write(
+            f"\r{self.desc} {percent:3d}%|{bar}| {self.count}/{self.total} {self.unit}"
+        )
+
+    def close(self, *_args, **_kwargs):
+        self.refresh()
+        sys.stdout.write("\n")
+
+
+def _ensure_enlighten() -> types.ModuleType:
+    """Return enlighten, or a tiny text-only replacement if it is missing."""
+    try:
+        import enlighten
+    except ImportError:
+        enlighten = types.ModuleType("enlighten")
+        enlighten.Counter = _TextCounter
+        enlighten.get_manager = lambda *a, **k: types.SimpleNamespace(
+            counter=lambda **kw: enlighten.Counter(**kw), stop=lambda: None
+        )
+        enlighten.Manager = enlighten.get_manager
+        sys.modules["enlighten"] = enlighten
+    return enlighten
+
+
+def _output_path(args: list[str], path: str) -> str:
+    stem, ext = os.path.splitext(os.path.basename(path))
+    target = stem + {".nsp": ".nsz", ".xci": ".xcz", ".nsz": ".nsp", ".xcz": ".xci"}.get(
+        ext.lower(), ".out"
+    )
+    if "-o" in args:
+        return os.path.join(args[args.index("-o") + 1], target)
+    return os.path.join(os.path.dirname(path), target)
+
+
+def main() -> None:
+    """Pretend to run nsz with the arguments in sys.argv."""
+    enlighten = _ensure_enlighten()
+    args = sys.argv[1:]
+    path = args[-1]
+    rate = float(os.environ.get("FAKE_NSZ_RATE", "0"))
+    ncas = max(1, int(os.environ.get("FAKE_NSZ_NCAS", "2")))
+    chatter = int(os.environ.get("FAKE_NSZ_CHATTER", "0"))
+    verify = "-V" in args
+    desc = "Compressing" if "-C" in args else "Verify" if verify else "Decompress"
+
+    print(f"fake nsz: {' '.join(args)}")
+    size = os.path.getsize(path)
+    per_nca = size // ncas
+    started = time.monotonic()
+    done = 0
+    with open(path, "rb") as f:
+        for n in range(ncas):
+            print(f"[NCZBLOCK] {n:032x}.nca")
+            counter = enlighten.Counter(total=per_nca // MiB, desc=desc, unit="MiB")
+            for _ in range(per_nca // MiB):
+                f.read(MiB)
+                done += 1
+                for i in range(chatter):
+                    print(f"[NCZBLOCK] block {i} of {n:032x}.nca")
+                counter.update()
+                if rate:
+                    delay = started + done / rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            counter.close()
+
+    if not verify:
+        with open(_output_path(args, path), "wb") as out:
+            out.truncate(size * 6 // 10)
+    sys.exit(int(os.environ.get("FAKE_NSZ_FAIL", "0")))
+
+
+if __name__ == "__main__":
+    sys.modules["nsz"] = sys.modules[__name__]
+    _ensure_enlighten()
+    if len(sys.argv) >= 3 and sys.argv[1] == "--serve":
+        from compresswitch.pool import serve
+
+        sock_fd = int(sys.argv[2])
+        sys.argv = [sys.argv[0]]
+        serve(sock_fd)
+    else:
+        from compresswitch import progress, resources
+
+        resources.apply_from_env()
+        progress.install_from_env(sys.argv[1:])
+        try:
+            main()
+        finally:
+            progress.finish()
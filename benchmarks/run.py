@@ -0,0 +1,318 @@
+"""Benchmarks for CompressSwitch's own overhead, using a fake nsz.
+
+Runs on any Linux box: nsz is replaced by benchmarks/fake_nsz.py and the
+inputs are sparse files, so no Switch keys or game files are needed.
+
+    python benchmarks/run.py [-o results.json] [--quick] [--compare old.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_NSZ = Path(__file__).resolve().parent / "fake_nsz.py"
+sys.path.insert(0, str(ROOT / "src"))
+
+from compresswitch import worker  # noqa: E402
+from compresswitch.file_queue import FileQueue, Status  # noqa: E402
+from compresswitch.mainloop import MainLoop  # noqa: E402
+from compresswitch.pool import WorkerPool  # noqa: E402
+from compresswitch.scheduler import JobScheduler  # noqa: E402
+from compresswitch.utils import LineSplitter, parse_progress  # noqa: E402
+
+MiB = 1 << 20
+
+
+def _fake_nsz_command() -> list[str]:
+    return [sys.executable, str(FAKE_NSZ)]
+
+
+def _configure_fake(rate: float = 0, ncas: int = 2, chatter: int = 0) -> None:
+    """Set the fake nsz tunables; pool servers started later inherit them."""
+    os.environ["FAKE_NSZ_RATE"] = str(rate)
+    os.environ["FAKE_NSZ_NCAS"] = str(ncas)
+    os.environ["FAKE_NSZ_CHATTER"] = str(chatter)
+
+
+def _make_inputs(directory: Path, count: int, size_mib: int, prefix: str) -> list[Path]:
+    paths = []
+    for i in range(count):
+        path = directory / f"{prefix}{i:05d}.nsp"
+        with open(path, "wb") as f:
+            f.truncate(size_mib * MiB)
+        paths.append(path)
+    return paths
+
+
+def _summary(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "runs": len(ordered),
+    }
+
+
+def _run_one(entry, output_dir: str, pool: WorkerPool | None) -> dict:
+    """Run a single NszWorker to completion; return its timings in seconds."""
+    loop = MainLoop()
+    timings: dict = {}
+    started = time.perf_counter()
+
+    def on_progress(_entry, _event):
+        timings.setdefault("first_progress", time.perf_counter() - started)
+
+    def on_done(_entry, success, message):
+        timings["done"] = time.perf_counter() - started
+        timings["ok"] = success
+        timings["message"] = message
+
+    worker.NszWorker(
+        entry,
+        output_dir=output_dir,
+        pool=pool,
+        on_progress=on_progress,
+        on_done=on_done,
+        dispatch=loop.dispatch,
+    ).start()
+    loop.run(lambda: "done" in timings, tick=0.05)
+    if not timings["ok"]:
+        raise RuntimeError(f"fake nsz job failed: {timings['message']}")
+    return timings
+
+
+# ── Benchmarks ───────────────────────────────────────────────────────
+
+
+def bench_spawn_latency(tmp: Path, runs: int) -> dict:
+    """Time from NszWorker.start() to first progress event and to completion."""
+    _configure_fake()
+    results = {}
+    for mode in ("spawn", "pool"):
+        pool = WorkerPool(1) if mode == "pool" else None
+        if pool is not None:
+            pool.prestart()
+            _run_one(FileQueue().add(_make_inputs(tmp, 1, 1, "warm")[0]), str(tmp), pool)
+        first, done = [], []
+        try:
+            for path in _make_inputs(tmp, runs, 1, f"lat-{mode}-"):
+                timings = _run_one(FileQueue().add(path), str(tmp), pool)
+                first.append(timings.get("first_progress", timings["done"]))
+                done.append(timings["done"])
+        finally:
+            if pool is not None:
+                pool.close()
+        results[mode] = {"first_progress": _summary(first), "done": _summary(done)}
+    return results
+
+
+def bench_parse_progress(lines: int) -> dict:
+    """Throughput of the text fallback path: LineSplitter plus parse_progress."""
+    samples = [
+        "Compressing  47%|███████████▊             |  94/200 MiB [00:03<00:04]\r",
+        "[NCZBLOCK] 0123456789abcdef0123456789abcdef.nca\n",
+        "Decompress 100%|█████████████████████████| 200/200 MiB [00:07<00:00]\r",
+        "Verifying   3%|▊                        |   6/200 MiB [00:00<00:09]\r",
+    ]
+    rng = random.Random(0)
+    data = "".join(rng.choice(samples) for _ in range(lines)).encode()
+    chunks = [data[i : i + 65536] for i in range(0, len(data), 65536)]
+
+    started = time.perf_counter()
+    splitter = LineSplitter()
+    split: list[bytes] = []
+    for chunk in chunks:
+        split += splitter.feed(chunk)
+    split_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matched = 0
+    for line in split:
+        if parse_progress(line.decode("utf-8", errors="replace")) is not None:
+            matched += 1
+    parse_seconds = time.perf_counter() - started
+    return {
+        "lines": len(split),
+        "split_mib_per_s": round(len(data) / MiB / split_seconds, 1),
+        "parse_lines_per_s": round(len(split) / parse_seconds),
+        "matched": matched,
+    }
+
+
+def bench_read_loop_cpu(tmp: Path, size_mib: int) -> dict:
+    """CPU the GUI process spends reading a chatty job's output and events.
+
+    The adaptation of the old pty read loop: NszWorker now reads two pipes,
+    so this measures that loop plus event coalescing, with the job paced
+    so the reader is mostly idle-waiting like in real use.
+    """
+    ncas, chatter = 4, 20
+    _configure_fake(rate=size_mib * 2, ncas=ncas, chatter=chatter)  # ~0.5 s of work
+    entry = FileQueue().add(_make_inputs(tmp, 1, size_mib, "cpu")[0])
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    timings = _run_one(entry, str(tmp), None)
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    lines = 1 + ncas + size_mib * chatter  # banner, NCA headers, chatter
+    return {
+        "wall_s": round(timings["done"], 3),
+        "cpu_ms": round(cpu * 1000, 2),
+        "cpu_percent": round(cpu / timings["done"] * 100, 2),
+        "output_lines": lines,
+        "cpu_us_per_line": round(cpu / lines * 1e6, 2),
+    }
+
+
+def bench_file_queue(size: int) -> dict:
+    """Cost of the FileQueue operations the GUI performs, at ``size`` entries."""
+    paths = [Path(f"/bench/{i // 1000:03d}/game{i:06d}.nsp") for i in range(size)]
+    queue = FileQueue()
+    results = {}
+
+    def timed(name: str, fn, repeat: int = 1) -> None:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        results[name + "_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    timed("add_all", lambda: [queue.add(p) for p in paths])
+    timed("add_duplicates_1000", lambda: [queue.add(p) for p in paths[-1000:]])
+    timed("has_pending_1000", queue.has_pending, 1000)
+    timed("has_any_compress_1000", queue.has_any_compress, 1000)
+    timed("pending_count_1000", queue.pending_count, 1000)
+    sample = random.Random(0).sample(list(queue), min(1000, size))
+    timed("get_1000", lambda: [queue.get(e.id) for e in sample])
+
+    def claim_all():
+        while (entry := queue.claim_next()) is not None:
+            queue.set_status(entry, Status.DONE)
+
+    timed("claim_all", claim_all)
+    timed("remove_1000", lambda: [queue.remove(e.id) for e in sample])
+    results["entries"] = size
+    return results
+
+
+def bench_drain(tmp: Path, files: int, size_mib: int, jobs: int) -> dict:
+    """End-to-end time for JobScheduler to drain a queue of fake jobs."""
+    _configure_fake()
+    results = {}
+    for use_pool in (False, True):
+        queue = FileQueue()
+        for path in _make_inputs(tmp, files, size_mib, f"drain-{int(use_pool)}-"):
+            queue.add(path)
+        loop = MainLoop()
+        finished = threading.Event()
+        scheduler = JobScheduler(
+            queue,
+            max_jobs=jobs,
+            use_pool=use_pool,
+            on_finished=finished.set,
+            dispatch=loop.dispatch,
+        )
+        started = time.perf_counter()
+        scheduler.start(output_dir=str(tmp))
+        loop.run(finished.is_set, tick=0.05)
+        elapsed = time.perf_counter() - started
+        scheduler.close()
+        failed = sum(1 for e in queue if e.status != Status.DONE)
+        results["pool" if use_pool else "spawn"] = {
+            "wall_s": round(elapsed, 3),
+            "files_per_s": round(files / elapsed, 2),
+            "failed": failed,
+        }
+    results.update(files=files, size_mib=size_mib, jobs=jobs)
+    return results
+
+
+# ── Driver ───────────────────────────────────────────────────────────
+
+
+def _flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old: dict, new: dict) -> None:
+    """Print every numeric result side by side with the old run."""
+    old_flat = _flatten(old["benchmarks"])
+    new_flat = _flatten(new["benchmarks"])
+    width = max(map(len, new_flat), default=10)
+    print(f"{'benchmark':{width}}  {'old':>12}  {'new':>12}  {'ratio':>7}")
+    for key, value in new_flat.items():
+        before = old_flat.get(key)
+        ratio = f"{value / before:7.2f}" if before else "      -"
+        shown = "-" if before is None else f"{before:g}"
+        print(f"{key:{width}}  {shown:>12}  {value:>12g}  {ratio}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("--quick", action="store_true", help="smaller, faster runs")
+    parser.add_argument("--compare", metavar="JSON", help="print a comparison with a previous run")
+    args = parser.parse_args(argv)
+
+    # Child processes (spawned workers and pool servers) run fake_nsz.py
+    # and need to import compresswitch from this tree.
+    worker._find_nsz_command = _fake_nsz_command
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT / "src"), os.environ.get("PYTHONPATH")])
+    )
+
+    quick = args.quick
+    benchmarks = {}
+    with tempfile.TemporaryDirectory(prefix="compresswitch-bench-") as tmp_name:
+        tmp = Path(tmp_name)
+        steps = [
+            ("spawn_latency", lambda: bench_spawn_latency(tmp, 5 if quick else 20)),
+            ("parse_progress", lambda: bench_parse_progress(50_000 if quick else 500_000)),
+            ("read_loop_cpu", lambda: bench_read_loop_cpu(tmp, 64 if quick else 256)),
+            ("file_queue", lambda: bench_file_queue(10_000 if quick else 20_000)),
+            ("drain", lambda: bench_drain(tmp, 16 if quick else 64, 8, 4)),
+        ]
+        for name, step in steps:
+            print(f"running {name}...", file=sys.stderr)
+            benchmarks[name] = step()
+
+    results = {
+        "schema": 1,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "quick": quick,
+        "benchmarks": benchmarks,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
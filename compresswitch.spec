@@ -1,6 +1,14 @@
 # -*- mode: python ; coding: utf-8 -*-
 import glob
 import os
+import sys
+
+from PyInstaller.utils.hooks import collect_submodules
+
+# Entry points import most modules lazily, so the analysis cannot follow
+# them; bundle every module of the package instead of a hand-kept list.
+sys.path.insert(0, os.path.abspath('src'))
+compresswitch_modules = collect_submodules('compresswitch')
 
 # Find typelib directory (varies by distro)
 _candidates = glob.glob('/usr/lib*/girepository-1.0') + \
@@ -29,7 +37,7 @@ typelib_datas = [(os.path.join(typelib_dir, t), 'gi_typelibs') for t in typelibs
 
 a = Analysis(
     ['src/compresswitch/main.py'],
-    pathex=[],
+    pathex=['src'],
     binaries=[],
     datas=typelib_datas,
     hiddenimports=[
@@ -41,12 +49,7 @@ a = Analysis(
         'gi.repository.GLib',
         'gi.repository.GObject',
         'gi.repository.Pango',
-        'compresswitch',
-        'compresswitch.main',
-        'compresswitch.window',
-        'compresswitch.worker',
-        'compresswitch.file_queue',
-        'compresswitch.utils',
+        *compresswitch_modules,
         # nsz and all its dependencies (invoked via --nsz-worker flag)
         'nsz',
         'nsz.Fs',
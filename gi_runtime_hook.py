@@ -1,8 +1,11 @@
 import os
 import sys
 
-# Point GI to the bundled typelibs
-if getattr(sys, '_MEIPASS', None):
+# Point GI to the bundled typelibs. Runs on every start of the bundle, so
+# skip the entry points that never load gi (nsz workers, batch, daemon and jobs).
+_HEADLESS = ('--nsz-worker', 'batch', 'daemon', 'jobs')
+_command = sys.argv[1] if len(sys.argv) > 1 else ''
+if getattr(sys, '_MEIPASS', None) and _command not in _HEADLESS:
     typelib_path = os.path.join(sys._MEIPASS, 'gi_typelibs')
     existing = os.environ.get('GI_TYPELIB_PATH', '')
     if existing:
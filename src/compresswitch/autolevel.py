@@ -0,0 +1,180 @@
+"""Automatic compression level: the highest level that still meets a speed target.
+
+Before a compress job, LevelTuner reads a few evenly spaced regions of the
+input and compresses them with zstandard at several levels in parallel,
+timing each level by its thread's CPU time. Speed is interpolated between
+the measured levels on a log scale, and the highest level expected to meet
+the target is chosen. The speed of one thread is scaled by the number of
+threads nsz gets per job.
+
+Most of an XCI or NSP is encrypted NCA data that nsz decrypts before
+compressing, and encrypted samples do not compress at any level. When the
+samples turn out incompressible, the throughput that real jobs recorded
+per level in the JobHistory is used instead. Without either, the
+configured fallback level is kept. Levels picked from a probe are
+remembered per file type, size class and target, so similar files skip it.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from compresswitch.ordering import JobHistory
+
+MIN_LEVEL = 1
+MAX_LEVEL = 22
+DEFAULT_TARGET_MBPS = 60  # MiB/s per job
+
+# Levels the probe measures; the others are interpolated
+PROBE_LEVELS = (1, 3, 6, 9, 12, 15, 18, 20, 22)
+_SAMPLE_COUNT = 8
+_SAMPLE_SIZE = 1 << 20
+# Samples that shrink less than this at the lowest level are taken to be encrypted
+_INCOMPRESSIBLE_RATIO = 0.97
+
+
+@dataclass
+class LevelPoint:
+    level: int
+    ratio: float  # compressed / original
+    speed: float  # bytes per second, one thread
+
+
+def read_samples(
+    path: Path, count: int = _SAMPLE_COUNT, size: int = _SAMPLE_SIZE
+) -> list[bytes]:
+    """Read ``count`` regions of ``size`` bytes spread evenly over the file."""
+    total = path.stat().st_size
+    if total <= count * size:
+        return [path.read_bytes()] if total else []
+    step = (total - size) // (count - 1)
+    samples = []
+    with open(path, "rb") as f:
+        for i in range(count):
+            f.seek(i * step)
+            samples.append(f.read(size))
+    return samples
+
+
+def _measure(zstd, level: int, samples: list[bytes]) -> LevelPoint:
+    compressor = zstd.ZstdCompressor(level=level)
+    started = time.thread_time()
+    compressed = sum(len(compressor.compress(sample)) for sample in samples)
+    elapsed = max(time.thread_time() - started, 1e-6)
+    original = sum(len(sample) for sample in samples)
+    return LevelPoint(level, compressed / original, original / elapsed)
+
+
+def probe(samples: list[bytes], levels: tuple[int, ...] = PROBE_LEVELS) -> list[LevelPoint]:
+    """Measure ratio and single-thread speed of each level on ``samples``.
+
+    Returns an empty list if zstandard is missing or the samples are
+    incompressible.
+    """
+    try:
+        import zstandard as zstd  # Installed with nsz
+    except ImportError:
+        return []
+    if not samples:
+        return []
+    from concurrent.futures import ThreadPoolExecutor
+
+    # zstandard releases the GIL while compressing.
+    workers = min(len(levels), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        points = list(pool.map(lambda level: _measure(zstd, level, samples), levels))
+    if points[0].ratio > _INCOMPRESSIBLE_RATIO:
+        return []
+    return points
+
+
+def pick_level(speeds: dict[int, float], target: float, fallback: int) -> int:
+    """Return the highest level whose interpolated speed reaches ``target``.
+
+    ``speeds`` maps measured levels to bytes per second; levels beyond
+    the highest measured one are never picked. If even the lowest measured
+    level is too slow, that level is returned.
+    """
+    if not speeds:
+        return fallback
+    measured = sorted(speeds)
+    best = measured[0]
+    for low, high in zip(measured, measured[1:]):
+        for level in range(low, high + 1):
+            if _interpolate(speeds, low, high, level) >= target:
+                best = level
+    return best
+
+
+def _interpolate(speeds: dict[int, float], low: int, high: int, level: int) -> float:
+    if high == low:
+        return speeds[low]
+    t = (level - low) / (high - low)
+    return math.exp(math.log(speeds[low]) * (1 - t) + math.log(speeds[high]) * t)
+
+
+class LevelTuner:
+    """Chooses a compression level per file to meet a throughput target.
+
+    ``target_mbps`` is the minimum MiB/s a job should sustain; a
+    ``deadline`` (seconds) raises it where needed so each file finishes in
+    that time. ``threads`` is how many threads nsz uses per job. Safe to
+    call from worker threads.
+    """
+
+    def __init__(
+        self,
+        *,
+        target_mbps: float = DEFAULT_TARGET_MBPS,
+        deadline: float | None = None,
+        threads: int = 1,
+        fallback_level: int = 18,
+        history: JobHistory | None = None,
+    ):
+        self.target_mbps = target_mbps
+        self.deadline = deadline
+        self.threads = max(1, threads)
+        self.fallback_level = fallback_level
+        self.history = history
+
+    def target_for(self, size: int) -> float:
+        """Return the bytes per second a file of ``size`` bytes must sustain."""
+        target = self.target_mbps * (1 << 20)
+        if self.deadline:
+            target = max(target, size / self.deadline)
+        return target
+
+    def level_for(self, path: Path) -> int:
+        """Return the level to compress ``path`` with."""
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return self.fallback_level
+        target = self.target_for(size)
+        kind = path.suffix.lower()
+        size_class = size.bit_length()
+        target_key = round(target / (1 << 20))
+        if self.history is not None:
+            level = self.history.chosen_level(kind, size_class, target_key)
+            if level is not None:
+                return level
+
+        try:
+            points = probe(read_samples(path))
+        except OSError:
+            points = []
+        if points:
+            speeds = {point.level: point.speed * self.threads for point in points}
+        elif self.history is not None:
+            # Not remembered: the recorded speeds improve with every job.
+            speeds = self.history.recorded("compress")
+        else:
+            speeds = {}
+        level = max(MIN_LEVEL, min(MAX_LEVEL, pick_level(speeds, target, self.fallback_level)))
+        if self.history is not None and points:
+            self.history.remember_level(kind, size_class, target_key, level)
+        return level
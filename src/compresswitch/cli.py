@@ -0,0 +1,873 @@
+"""Headless batch mode: ``compresswitch batch``, the daemon and ``compresswitch jobs``.
+
+Reuses FileQueue, JobScheduler and NszWorker with a plain-Python main loop,
+so nothing here (or anything it imports) loads gi. The batch machinery is
+imported in run_batch, so ``compresswitch jobs`` only loads the daemon
+client.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from compresswitch import startup
+from compresswitch.daemon import DaemonClient, DaemonError, default_socket_path
+from compresswitch.file_queue import FileQueue, QueueEntry, Status
+from compresswitch.keys import KEYS_MISSING_MESSAGE
+from compresswitch.utils import format_duration, format_rate, is_valid_switch_file
+
+if TYPE_CHECKING:
+    from compresswitch.coordination import LeaseCoordinator
+    from compresswitch.daemon import DaemonServer
+    from compresswitch.journal import Recovery
+    from compresswitch.progress import ProgressEvent
+    from compresswitch.scheduler import JobScheduler
+
+EXIT_OK = 0
+EXIT_FAILED = 1  # at least one file failed
+EXIT_USAGE = 2  # bad arguments or nothing to do
+EXIT_KEYS = 3  # Switch keys missing, batch stopped
+EXIT_INTERRUPTED = 130
+
+# Minimum seconds between two redraws of the terminal status line
+_STATUS_INTERVAL = 0.5
+
+
+def _level(value: str) -> int | str:
+    if value == "auto":
+        return value
+    try:
+        level = int(value)
+    except ValueError:
+        level = 0
+    if not 1 <= level <= 22:
+        raise argparse.ArgumentTypeError("must be 1-22 or 'auto'")
+    return level
+
+
+def _ionice(value: str) -> tuple[str, int]:
+    from compresswitch.resources import IONICE_CLASSES
+
+    name, _, level = value.partition(":")
+    if name not in IONICE_CLASSES:
+        raise argparse.ArgumentTypeError(f"class must be one of {', '.join(IONICE_CLASSES)}")
+    try:
+        return name, int(level) if level else 4
+    except ValueError:
+        raise argparse.ArgumentTypeError("level must be 0-7") from None
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    from compresswitch.autolevel import DEFAULT_TARGET_MBPS
+    from compresswitch.coordination import DEFAULT_TTL
+    from compresswitch.joblog import default_log_dir
+    from compresswitch.journal import default_journal_path
+    from compresswitch.metrics import default_metrics_path
+    from compresswitch.ordering import ORDERS, default_history_path
+    from compresswitch.resources import default_max_jobs
+    from compresswitch.uptodate import default_fingerprint_path
+    from compresswitch.watcher import DEFAULT_SETTLE
+
+    parser = argparse.ArgumentParser(
+        prog="compresswitch batch",
+        description="Compress or decompress Switch files without the GUI.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        metavar="PATH",
+        help="files or directories (searched recursively) to convert",
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="file listing one path per line ('-' reads stdin); may be repeated",
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="keep running and convert files as they appear in the given directories",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE,
+        metavar="SECONDS",
+        help="with --watch, how long a new file must stay unchanged before it is"
+        " converted (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--serve",
+        nargs="?",
+        const=str(default_socket_path()),
+        metavar="SOCKET",
+        help="keep running as a daemon that takes jobs from `compresswitch jobs`"
+        " over SOCKET (default: %(const)s); same as `compresswitch daemon`",
+    )
+    parser.add_argument(
+        "--coordinate",
+        metavar="DIR",
+        help="share the batch with other hosts running it with the same DIR (on"
+        " storage they all mount): each file is converted by whichever host"
+        " claims it first",
+    )
+    parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        metavar="SECONDS",
+        help="with --coordinate, how long a host's claims outlive its last"
+        " heartbeat before other hosts take them over (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--show-hosts",
+        action="store_true",
+        help="with --coordinate, only print what every host is converting and"
+        " has converted",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default="", help="output directory (default: next to input)"
+    )
+    parser.add_argument(
+        "--scratch",
+        default="",
+        metavar="DIR",
+        help="let nsz write to DIR (fast local storage) and move each finished file"
+        " to the output directory in the background",
+    )
+    parser.add_argument(
+        "-l",
+        "--level",
+        type=_level,
+        default=18,
+        metavar="1-22|auto",
+        help="compression level, or 'auto' to pick per file the highest level"
+        " that meets --target-speed (default: 18)",
+    )
+    parser.add_argument(
+        "--target-speed",
+        type=float,
+        default=DEFAULT_TARGET_MBPS,
+        metavar="MIB/S",
+        help="with --level auto, the speed each file must at least be compressed at"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="with --level auto, also pick a level fast enough to finish each file"
+        " within SECONDS",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check every output with nsz -V, alongside the next conversion",
+    )
+    parser.add_argument(
+        "--solid",
+        action="store_true",
+        help="use solid instead of block compression",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=default_max_jobs(),
+        help="files processed at the same time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="only print how long converting the files is expected to take, from the"
+        " throughput of earlier jobs",
+    )
+    parser.add_argument(
+        "--order",
+        choices=ORDERS,
+        default="fifo",
+        help="which files to start first: in the order given, smallest or largest"
+        " first, or by runtime estimated from earlier jobs (recorded in "
+        + str(default_history_path())
+        + "); default: %(default)s",
+    )
+    parser.add_argument(
+        "--cpus",
+        type=int,
+        default=0,
+        metavar="N",
+        help="CPUs all jobs together may use (default: every CPU this process may"
+        " run on, within any cgroup quota)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        metavar="N",
+        help="nsz threads per job (default: an equal share of --cpus)",
+    )
+    parser.add_argument(
+        "--pin",
+        action="store_true",
+        help="run each job on its own CPUs instead of sharing them",
+    )
+    parser.add_argument(
+        "--nice",
+        type=int,
+        metavar="N",
+        help="run nsz at this nice value (e.g. 19 to only use idle CPU time)",
+    )
+    parser.add_argument(
+        "--ionice",
+        type=_ionice,
+        metavar="CLASS[:LEVEL]",
+        help="run nsz in this I/O scheduling class: realtime, best-effort or idle",
+    )
+    parser.add_argument(
+        "--no-pool",
+        action="store_true",
+        help="spawn a fresh nsz process per file instead of reusing workers",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="convert files again and replace existing outputs, even up-to-date ones",
+    )
+    parser.add_argument(
+        "--fingerprints",
+        nargs="?",
+        const=str(default_fingerprint_path()),
+        metavar="FILE",
+        help="remember the size and mtime of converted files in FILE"
+        " (default: %(const)s) for a stricter up-to-date check",
+    )
+    parser.add_argument(
+        "--journal",
+        nargs="?",
+        const=str(default_journal_path()),
+        metavar="FILE",
+        help="record progress in FILE (default: %(const)s) and first resume"
+        " the files an interrupted run left unfinished",
+    )
+    parser.add_argument(
+        "--quarantine",
+        metavar="DIR",
+        help="with --journal, move partial outputs of interrupted jobs here"
+        " instead of deleting them",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="?",
+        const=str(default_metrics_path()),
+        metavar="FILE",
+        help="append the wall time, CPU time, peak memory, I/O and sizes of every job"
+        " to FILE as JSON lines (default: %(const)s)",
+    )
+    parser.add_argument(
+        "--log-dir",
+        nargs="?",
+        const=str(default_log_dir()),
+        metavar="DIR",
+        help="append nsz's output for every file to DIR/<file>.log (default: %(const)s)",
+    )
+    parser.add_argument(
+        "--prometheus",
+        metavar="FILE",
+        help="with --metrics, keep running totals in FILE in the Prometheus textfile format",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="only print failures and the summary"
+    )
+    return parser
+
+
+def _read_manifest(name: str) -> list[str]:
+    if name == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(name, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [
+        line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+def collect_paths(inputs: list[str]) -> list[Path]:
+    """Expand files and directories into the supported Switch files they hold."""
+    from compresswitch.scanner import scan_paths
+
+    roots: list[Path] = []
+    for item in inputs:
+        path = Path(item).expanduser()
+        if path.is_dir() or is_valid_switch_file(path):
+            roots.append(path)
+        else:
+            print(f"compresswitch: skipping {item}: not a supported file", file=sys.stderr)
+    return scan_paths(roots)
+
+
+class _BatchReporter:
+    """Prints job progress, passes it on to daemon clients and keeps the
+    tallies for the summary."""
+
+    def __init__(self, queue: FileQueue, quiet: bool):
+        self.queue = queue
+        self.quiet = quiet
+        self.tty = sys.stdout.isatty()
+        self.scheduler: JobScheduler | None = None
+        self.server: DaemonServer | None = None
+        self.keys_missing = False
+        self.failures: list[QueueEntry] = []
+        self._last_status = 0.0
+
+    def clear_status(self) -> None:
+        if self.tty and not self.quiet:
+            sys.stdout.write("\r\033[K")
+
+    def on_started(self, entry: QueueEntry) -> None:
+        startup.mark("first_job", final=True)
+        if self.server is not None:
+            self.server.publish("started", entry)
+        if not self.quiet:
+            self.clear_status()
+            if entry.status == Status.VERIFYING:
+                print(f"verify   {entry.output}", flush=True)
+            else:
+                print(f"started  {entry.path}  ({entry.operation})", flush=True)
+
+    def on_progress(self, entry: QueueEntry, _event: ProgressEvent) -> None:
+        if self.server is not None:
+            self.server.publish("progress", entry)
+        if self.quiet or not self.tty or self.scheduler is None:
+            return
+        now = time.monotonic()
+        if now - self._last_status < _STATUS_INTERVAL:
+            return
+        self._last_status = now
+        running = len(self.scheduler.active_entries)
+        estimate = self.scheduler.estimate()
+        status = f"[{self.scheduler.progress() * 100:3.0f}%] {running} running"
+        if estimate.rate:
+            status += f" at {format_rate(estimate.rate)}"
+        if estimate.remaining:
+            status += f", {format_duration(estimate.remaining)} left"
+        sys.stdout.write(f"\r\033[K{status}")
+        sys.stdout.flush()
+
+    def on_done(self, entry: QueueEntry, success: bool, message: str) -> None:
+        if self.server is not None:
+            self.server.publish("done", entry)
+        self.clear_status()
+        if entry.status == Status.SKIPPED:
+            if not self.quiet:
+                print(f"skipped  {entry.path}  ({message.lower()})", flush=True)
+            return
+        if success:
+            if not self.quiet:
+                summary = f"  ({entry.metrics.summary()})" if entry.metrics else ""
+                print(f"done     {entry.path}{summary}", flush=True)
+            return
+        if entry.status == Status.PENDING:
+            print(f"stopped  {entry.path}", file=sys.stderr, flush=True)
+            return
+        self.failures.append(entry)
+        log = f"  (log: {entry.log})" if entry.log is not None else ""
+        print(f"failed   {entry.path}: {message}{log}", file=sys.stderr, flush=True)
+        if message == KEYS_MISSING_MESSAGE and not self.keys_missing:
+            # Every other job would fail the same way.
+            self.keys_missing = True
+            if self.scheduler is not None:
+                self.scheduler.stop()
+
+    def on_keys_error(self, message: str) -> None:
+        self.clear_status()
+        self.keys_missing = True
+        print(f"compresswitch: {message}", file=sys.stderr, flush=True)
+
+
+def _report_recovery(recovery: Recovery, quarantine: str | None, quiet: bool) -> None:
+    for output in recovery.removed_outputs:
+        action = f"moved to {quarantine}" if quarantine else "removed"
+        print(f"compresswitch: partial output {output} {action}", file=sys.stderr)
+    if recovery.pending and not quiet:
+        print(f"resuming {len(recovery.pending)} unfinished files from the journal")
+
+
+def _check_watch_dirs(inputs: list[str], output_dir: str) -> str | None:
+    """Return why ``inputs`` cannot be watched, or None if they can."""
+    for name in inputs:
+        if not os.path.isdir(name):
+            return f"{name} is not a directory; --watch needs directories"
+        if output_dir and Path(output_dir).resolve().is_relative_to(Path(name).resolve()):
+            # Outputs would show up as new files to convert back.
+            return f"output directory {output_dir} must not be inside watched {name}"
+    return None
+
+
+def _show_hosts(coordinator: LeaseCoordinator) -> int:
+    now = time.time()
+    leases = coordinator.leases()
+    for lease in leases:
+        age = format_duration(max(0.0, now - lease.time))
+        print(f"{lease.host:<20} {lease.progress:>3}%  {lease.path}  (heartbeat {age} ago)")
+    results = coordinator.results()
+    converted = Counter(result.host for result in results if result.status == "done")
+    failed = [result for result in results if result.status != "done"]
+    for result in failed:
+        print(f"failed   {result.path} on {result.host}: {result.message}")
+    print(
+        f"{len(leases)} running, {sum(converted.values())} converted, {len(failed)} failed"
+        + "".join(f"\n  {host}: {count} converted" for host, count in sorted(converted.items()))
+    )
+    return EXIT_OK
+
+
+def _on_terminate(_signum, _frame) -> None:
+    raise KeyboardInterrupt
+
+
+def run_batch(argv: list[str]) -> int:
+    """Run ``compresswitch batch`` with the given arguments; return the exit code."""
+    import sqlite3
+
+    from compresswitch.autolevel import LevelTuner
+    from compresswitch.coordination import LeaseCoordinator
+    from compresswitch.daemon import DaemonServer
+    from compresswitch.journal import Journal, Recovery
+    from compresswitch.keys import KeysPreflight
+    from compresswitch.mainloop import MainLoop
+    from compresswitch.metrics import MetricsLog
+    from compresswitch.ordering import JobHistory
+    from compresswitch.resources import ResourcePolicy
+    from compresswitch.scheduler import JobScheduler
+    from compresswitch.uptodate import Fingerprints
+    from compresswitch.watcher import FolderWatcher, enqueue_arrivals
+
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    inputs = list(args.paths)
+    try:
+        for manifest in args.manifest:
+            inputs += _read_manifest(manifest)
+    except OSError as e:
+        print(f"compresswitch: cannot read manifest: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    coordinator = None
+    if args.coordinate:
+        try:
+            coordinator = LeaseCoordinator(Path(args.coordinate), ttl=max(1.0, args.lease_ttl))
+        except OSError as e:
+            print(f"compresswitch: cannot use {args.coordinate}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        if args.show_hosts:
+            return _show_hosts(coordinator)
+    elif args.show_hosts:
+        print("compresswitch: --show-hosts needs --coordinate", file=sys.stderr)
+        return EXIT_USAGE
+    if not inputs and not (args.journal or args.serve):
+        parser.print_usage(sys.stderr)
+        return EXIT_USAGE
+    if args.output_dir and not os.path.isdir(args.output_dir):
+        print(f"compresswitch: output directory {args.output_dir} does not exist", file=sys.stderr)
+        return EXIT_USAGE
+    if args.scratch and not os.path.isdir(args.scratch):
+        print(f"compresswitch: scratch directory {args.scratch} does not exist", file=sys.stderr)
+        return EXIT_USAGE
+    if args.watch:
+        error = _check_watch_dirs(inputs, args.output_dir)
+        if error:
+            print(f"compresswitch: {error}", file=sys.stderr)
+            return EXIT_USAGE
+
+    journal = None
+    recovery = Recovery()
+    if args.journal:
+        try:
+            journal = Journal(args.journal)
+            recovery = journal.recover(
+                Path(args.quarantine) if args.quarantine else None, dry_run=args.estimate
+            )
+        except (sqlite3.Error, OSError) as e:
+            print(f"compresswitch: cannot open journal {args.journal}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        if args.estimate:
+            # A dry run only looks: partial outputs and the journal stay as they are.
+            journal.close()
+            journal = None
+        else:
+            _report_recovery(recovery, args.quarantine, args.quiet)
+
+    fingerprints = None
+    if args.fingerprints:
+        try:
+            fingerprints = Fingerprints(args.fingerprints)
+        except (sqlite3.Error, OSError) as e:
+            print(
+                f"compresswitch: cannot open fingerprints {args.fingerprints}: {e}",
+                file=sys.stderr,
+            )
+            return EXIT_USAGE
+
+    metrics_log = None
+    if args.metrics and not args.estimate:
+        try:
+            metrics_log = MetricsLog(args.metrics, args.prometheus)
+        except OSError as e:
+            print(f"compresswitch: cannot open metrics log {args.metrics}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    history = None
+    try:
+        history = JobHistory()
+    except (sqlite3.Error, OSError) as e:
+        # Estimates fall back to typical throughput figures.
+        print(f"compresswitch: cannot open job history: {e}", file=sys.stderr)
+
+    queue = FileQueue(journal=journal)
+    queue.add_many(recovery.pending)
+    if not args.watch:
+        queue.add_many(collect_paths(inputs))
+    if len(queue) == 0 and not (args.watch or args.serve):
+        print("compresswitch: no supported files to process", file=sys.stderr)
+        return EXIT_USAGE
+
+    loop = MainLoop()
+    reporter = _BatchReporter(queue, args.quiet)
+    scheduler = JobScheduler(
+        queue,
+        max_jobs=max(1, args.jobs),
+        use_pool=not args.no_pool,
+        on_started=reporter.on_started,
+        on_progress=reporter.on_progress,
+        on_done=reporter.on_done,
+        on_keys_error=reporter.on_keys_error,
+        dispatch=loop.dispatch,
+        skip_up_to_date=not args.force,
+        fingerprints=fingerprints,
+        order=args.order,
+        history=history,
+        scratch_dir=args.scratch,
+        metrics_log=metrics_log,
+        verify=args.verify,
+        keys=KeysPreflight(),
+        log_dir=args.log_dir or "",
+        coordinator=coordinator,
+        resources=ResourcePolicy(
+            cpu_budget=max(0, args.cpus),
+            threads_per_job=max(0, args.threads),
+            pin=args.pin,
+            nice=args.nice,
+            ionice=args.ionice[0] if args.ionice else "",
+            ionice_level=args.ionice[1] if args.ionice else 4,
+        ),
+    )
+    reporter.scheduler = scheduler
+
+    level_tuner = None
+    if args.level == "auto":
+        level_tuner = LevelTuner(
+            target_mbps=args.target_speed,
+            deadline=args.deadline,
+            threads=scheduler.resources.threads_for(scheduler.max_jobs),
+            history=history,
+        )
+    options = dict(
+        compression_level=18 if level_tuner else args.level,
+        block_compression=not args.solid,
+        output_dir=args.output_dir,
+        level_tuner=level_tuner,
+    )
+    if args.estimate:
+        count, seconds = scheduler.forecast(recovery.interrupted, **options)
+        jobs = scheduler.max_jobs
+        print(
+            f"{count} file{'s' if count != 1 else ''} to convert: about"
+            f" {format_duration(seconds)} with {jobs} job{'s' if jobs != 1 else ''} at a time"
+        )
+        scheduler.close()
+        if coordinator is not None:
+            coordinator.close()
+        if fingerprints is not None:
+            fingerprints.close()
+        if history is not None:
+            history.close()
+        return EXIT_OK
+    server = None
+    if args.serve:
+        server = DaemonServer(
+            scheduler, Path(args.serve), dispatch=loop.dispatch, worker_options=options
+        )
+        try:
+            server.start()
+        except DaemonError as e:
+            print(f"compresswitch: {e}", file=sys.stderr)
+            scheduler.close()
+            return EXIT_USAGE
+        reporter.server = server
+        if not args.quiet:
+            print(f"listening on {args.serve} (Ctrl+C to stop)", flush=True)
+    watcher = None
+    if args.watch:
+        def on_arrivals(paths: list[Path]) -> None:
+            added, _replaced = enqueue_arrivals(queue, paths, args.output_dir)
+            if added:
+                scheduler.start(**options)
+
+        watcher = FolderWatcher(
+            [Path(p) for p in inputs],
+            on_files=on_arrivals,
+            dispatch=loop.dispatch,
+            settle=max(0.0, args.settle),
+        )
+        if not args.quiet:
+            print(f"watching {', '.join(inputs)} for new files (Ctrl+C to stop)", flush=True)
+
+    signal.signal(signal.SIGTERM, _on_terminate)
+
+    def suspend() -> None:
+        # nsz jobs run in process groups of their own, which the
+        # terminal's Ctrl+Z does not reach, so stop them here first.
+        scheduler.pause()
+        reporter.clear_status()
+        os.kill(os.getpid(), signal.SIGSTOP)
+
+    signal.signal(signal.SIGTSTP, lambda _signum, _frame: loop.dispatch(0, suspend))
+    signal.signal(signal.SIGCONT, lambda _signum, _frame: loop.dispatch(0, scheduler.resume))
+    interrupted = False
+
+    def finished() -> bool:
+        if server is not None and not interrupted:
+            return False
+        if watcher is not None and not (interrupted or reporter.keys_missing):
+            return False
+        return not scheduler.running
+
+    started = time.monotonic()
+    scheduler.start(**options)
+    if watcher is not None:
+        watcher.start()
+    while True:
+        try:
+            loop.run(finished)
+            break
+        except KeyboardInterrupt:
+            if not interrupted:
+                interrupted = True
+                reporter.clear_status()
+                if (watcher is None and server is None) or scheduler.running:
+                    print("compresswitch: interrupted, cancelling running jobs", file=sys.stderr)
+                scheduler.cancel()
+    if watcher is not None:
+        watcher.stop()
+    if server is not None:
+        server.close()
+    scheduler.close()
+    if coordinator is not None:
+        coordinator.close()
+    if journal is not None:
+        journal.close()
+    if fingerprints is not None:
+        fingerprints.close()
+    if history is not None:
+        history.close()
+    if metrics_log is not None:
+        metrics_log.close()
+    startup.mark("exit", final=True)
+
+    elapsed = time.monotonic() - started
+    done = queue.count(Status.DONE)
+    elsewhere = scheduler.converted_elsewhere
+    skipped = queue.count(Status.SKIPPED) - elsewhere
+    not_run = queue.pending_count()
+    reporter.clear_status()
+    print(
+        f"{done} converted, {len(reporter.failures)} failed, {not_run} not started"
+        + (f", {skipped} up to date" if skipped else "")
+        + (f", {elsewhere} converted on other hosts" if elsewhere else "")
+        + f" in {elapsed:.1f}s"
+    )
+
+    if interrupted and watcher is None and server is None:
+        return EXIT_INTERRUPTED
+    if reporter.keys_missing:
+        return EXIT_KEYS
+    if reporter.failures:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+# ── compresswitch jobs: client of the daemon ─────────────────────────
+
+
+def _build_jobs_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="compresswitch jobs",
+        description="Submit and manage jobs of a running `compresswitch daemon`.",
+    )
+    parser.add_argument(
+        "--socket",
+        default=str(default_socket_path()),
+        help="the daemon's socket (default: %(default)s)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    submit = commands.add_parser("submit", help="queue files or directories")
+    submit.add_argument("paths", nargs="*", metavar="PATH")
+    submit.add_argument(
+        "-m",
+        "--manifest",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="file listing one path per line ('-' reads stdin); may be repeated",
+    )
+    submit.add_argument(
+        "-p", "--priority", type=int, default=0, help="higher priorities start first"
+    )
+    submit.add_argument(
+        "--wait",
+        action="store_true",
+        help="wait until the files are converted; exit code as for batch mode",
+    )
+
+    listing = commands.add_parser("list", help="show every job")
+    listing.add_argument("--json", action="store_true", help="print the daemon's reply")
+
+    cancel = commands.add_parser("cancel", help="cancel running or pending jobs")
+    cancel.add_argument("ids", nargs="+", type=int, metavar="ID")
+
+    prioritize = commands.add_parser("prioritize", help="change when a pending job starts")
+    prioritize.add_argument("id", type=int, metavar="ID")
+    prioritize.add_argument("priority", type=int, metavar="PRIORITY")
+
+    for name, action in (("pause", "pause"), ("resume", "resume")):
+        command = commands.add_parser(name, help=f"{action} a job, or all of them")
+        command.add_argument("id", nargs="?", type=int, metavar="ID")
+
+    follow = commands.add_parser("follow", help="print jobs as they start, progress and end")
+    follow.add_argument("--json", action="store_true", help="print the events as JSON lines")
+    return parser
+
+
+def _job_line(job: dict) -> str:
+    line = f"{job['id']:>5}  {job['status']:<10} {job['progress']:>3}%  {job['path']}"
+    if job.get("paused"):
+        line += "  (paused)"
+    if job["priority"]:
+        line += f"  (priority {job['priority']})"
+    if job.get("remaining"):
+        line += f"  {format_duration(job['remaining'])} left"
+    if job["error"]:
+        line += f": {job['error']}"
+    return line
+
+
+def _submit(client: DaemonClient, args: argparse.Namespace) -> int:
+    inputs = list(args.paths)
+    try:
+        for manifest in args.manifest:
+            inputs += _read_manifest(manifest)
+    except OSError as e:
+        print(f"compresswitch: cannot read manifest: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not inputs:
+        print("compresswitch jobs submit: no paths given", file=sys.stderr)
+        return EXIT_USAGE
+    paths = [os.path.abspath(os.path.expanduser(name)) for name in inputs]
+    # Subscribe first, so no job can end before we listen.
+    events = client.events() if args.wait else None
+    reply = client.request("submit", paths=paths, priority=args.priority)
+    for name in reply["skipped"]:
+        print(f"compresswitch: skipping {name}: not a supported file", file=sys.stderr)
+    waiting: set[int] = set()
+    for job in reply["jobs"]:
+        print(f"queued   {job['id']:>5}  {job['path']}", flush=True)
+        if job["status"] in ("pending", "processing", "verifying"):
+            waiting.add(job["id"])
+    if events is None:
+        return EXIT_OK if reply["jobs"] else EXIT_USAGE
+    failed = False
+    for event in events:
+        job = event["job"]
+        if event["event"] != "done" or job["id"] not in waiting:
+            continue
+        waiting.discard(job["id"])
+        if job["status"] == "error":
+            failed = True
+            log = f"  (log: {job['log']})" if job["log"] else ""
+            print(f"failed   {job['path']}: {job['error']}{log}", file=sys.stderr, flush=True)
+        elif job["status"] == "pending":
+            failed = True
+            print(f"stopped  {job['path']}", file=sys.stderr, flush=True)
+        else:
+            print(f"{job['status']:<8} {job['path']}", flush=True)
+        if not waiting:
+            break
+    if waiting:
+        print("compresswitch: the daemon went away", file=sys.stderr)
+        return EXIT_FAILED
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def _follow(client: DaemonClient, as_json: bool) -> int:
+    for event in client.events():
+        if as_json:
+            print(json.dumps(event), flush=True)
+        else:
+            print(f"{event['event']:<9}{_job_line(event['job'])}", flush=True)
+    print("compresswitch: the daemon went away", file=sys.stderr)
+    return EXIT_FAILED
+
+
+def run_jobs(argv: list[str]) -> int:
+    """Run ``compresswitch jobs`` with the given arguments; return the exit code."""
+    args = _build_jobs_parser().parse_args(argv)
+    client = DaemonClient(Path(args.socket))
+    try:
+        if args.command == "submit":
+            return _submit(client, args)
+        if args.command == "follow":
+            return _follow(client, args.json)
+        if args.command == "list":
+            reply = client.request("list")
+            if args.json:
+                print(json.dumps(reply, indent=2))
+                return EXIT_OK
+            for job in reply["jobs"]:
+                print(_job_line(job))
+            summary = f"{len(reply['jobs'])} jobs"
+            if reply["remaining"]:
+                summary += f", {format_duration(reply['remaining'])} left"
+            if reply["paused"]:
+                summary += ", paused"
+            print(summary)
+        elif args.command == "cancel":
+            reply = client.request("cancel", ids=args.ids)
+            for entry_id in sorted(set(args.ids) - set(reply["cancelled"])):
+                print(f"compresswitch: job {entry_id} is not running or pending", file=sys.stderr)
+        elif args.command == "prioritize":
+            client.request("prioritize", id=args.id, priority=args.priority)
+        else:
+            client.request(args.command, id=args.id)
+    except DaemonError as e:
+        print(f"compresswitch: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    finally:
+        startup.mark("exit", final=True)
+    return EXIT_OK
@@ -0,0 +1,300 @@
+"""Sharing a batch between hosts through lease files in a shared directory.
+
+Every host runs the same batch (same paths, mounted at the same place)
+with the same ``--coordinate DIR``. Before converting a file a host takes
+its lease, ``DIR/leases/<key>.lease``, by hard-linking a file of its own
+there: link(2) fails if the name exists, also over NFS, so exactly one
+host gets each file. The others leave it alone and look at it again later.
+
+The holder rewrites its leases every ``ttl / 6`` seconds with a new
+heartbeat count and the job's progress. Hosts do not compare clocks: a
+lease is expired once another host has seen it unchanged for ``ttl``
+seconds of its own time. The expired lease is then renamed aside, which
+only one host can do, and checked to be the one that was judged dead
+before it is replaced. A holder that could not heartbeat for half the ttl
+considers its leases lost, so it never overwrites one taken over by now.
+
+When a job ends, its result goes to ``DIR/results/<key>.json`` and the
+lease is removed; every host sees the result and does not run the file
+again. A cancelled job leaves no result, so another host can pick its file
+up at once. Use a fresh directory for every batch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import socket
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+DEFAULT_TTL = 60.0
+
+
+@dataclass
+class Lease:
+    owner: str  # unique per process: host:token
+    host: str  # hostname:pid
+    path: str  # input file
+    output: str | None = None  # file the job writes
+    progress: int = 0
+    beat: int = 0  # heartbeat count
+    time: float = 0.0  # wall time of the heartbeat, for display only
+
+
+@dataclass
+class SharedResult:
+    path: str
+    status: str  # "done" or "error"
+    host: str
+    message: str = ""
+    output: str | None = None
+    time: float = 0.0
+
+
+@dataclass
+class Claim:
+    held: bool  # True if this host now holds the lease
+    # Held: the expired lease taken over, if any. Not held: the live lease.
+    lease: Lease | None = None
+
+
+def entry_key(path: Path) -> str:
+    """Return the name the leases and results of ``path`` are stored under."""
+    return hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:40]
+
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _read_lease(path: Path) -> Lease | None:
+    data = _read_json(path)
+    try:
+        return Lease(**data) if data is not None else None
+    except TypeError:
+        return None
+
+
+class LeaseCoordinator:
+    """Claims files for this host in the shared ``directory``.
+
+    Not thread-safe; the scheduler calls it from its own thread.
+    """
+
+    def __init__(self, directory: Path, ttl: float = DEFAULT_TTL):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.interval = ttl / 6  # between heartbeats
+        self.host = f"{socket.gethostname()}:{os.getpid()}"
+        self.owner = f"{self.host}:{os.urandom(4).hex()}"
+        self._leases = self.directory / "leases"
+        self._results = self.directory / "results"
+        self._leases.mkdir(parents=True, exist_ok=True)
+        self._results.mkdir(parents=True, exist_ok=True)
+        self._held: dict[str, Lease] = {}  # key -> our lease
+        # key -> (lease last read, monotonic time it was first seen unchanged)
+        self._seen: dict[str, tuple[Lease, float]] = {}
+        self._last_beat = time.monotonic()
+
+    # ── Files ────────────────────────────────────────────────────────
+
+    def _lease_path(self, key: str) -> Path:
+        return self._leases / f"{key}.lease"
+
+    def _write(self, target: Path, data: dict, replace: bool = True) -> bool:
+        """Write ``data`` to ``target`` atomically; without ``replace``, only if
+        ``target`` does not exist yet. Returns False if it did."""
+        temp = target.with_name(f".{target.name}.{self.owner}.tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        try:
+            if replace:
+                os.replace(temp, target)
+                return True
+            try:
+                os.link(temp, target)
+            except FileExistsError:
+                return False
+            return True
+        finally:
+            try:
+                temp.unlink()
+            except FileNotFoundError:
+                pass
+
+    # ── Claims ───────────────────────────────────────────────────────
+
+    def result(self, path: Path) -> SharedResult | None:
+        """Return the result a host recorded for ``path``, or None."""
+        data = _read_json(self._results / f"{entry_key(path)}.json")
+        try:
+            return SharedResult(**data) if data is not None else None
+        except TypeError:
+            return None
+
+    def claim(self, path: Path, output: Path | None = None) -> Claim:
+        """Take the lease of ``path``, or report the live lease of another host."""
+        key = entry_key(path)
+        if key in self._held:
+            return Claim(True)
+        lease = Lease(
+            self.owner, self.host, str(path), str(output) if output else None, time=time.time()
+        )
+        if self._write(self._lease_path(key), asdict(lease), replace=False):
+            self._take(key, lease)
+            return Claim(True)
+        current = self._observe(key)
+        if current is None:
+            # Released meanwhile (or unreadable); try once more.
+            if self._write(self._lease_path(key), asdict(lease), replace=False):
+                self._take(key, lease)
+                return Claim(True)
+            return Claim(False)
+        if not self._expired(key):
+            return Claim(False, current)
+        if not self._steal(key, current):
+            return Claim(False, _read_lease(self._lease_path(key)))
+        if self._write(self._lease_path(key), asdict(lease), replace=False):
+            self._take(key, lease)
+            return Claim(True, current)
+        return Claim(False, _read_lease(self._lease_path(key)))
+
+    def available(self, path: Path) -> bool:
+        """Return True if nobody holds a live lease on ``path``."""
+        key = entry_key(path)
+        return key not in self._held and (self._observe(key) is None or self._expired(key))
+
+    def heartbeat(self, progress: dict[Path, int] | None = None) -> list[Path]:
+        """Renew our leases, with the progress of their jobs.
+
+        Returns the files whose lease another host has taken over; their
+        jobs must stop.
+        """
+        now = time.monotonic()
+        stalled = now - self._last_beat > self.ttl / 2
+        self._last_beat = now
+        lost = []
+        for key, lease in list(self._held.items()):
+            current = _read_lease(self._lease_path(key))
+            if stalled or current is None or current.owner != self.owner:
+                del self._held[key]
+                lost.append(Path(lease.path))
+                continue
+            lease.beat += 1
+            lease.time = time.time()
+            if progress and Path(lease.path) in progress:
+                lease.progress = progress[Path(lease.path)]
+            try:
+                self._write(self._lease_path(key), asdict(lease))
+            except OSError:
+                pass  # Retried next time; the lease expires if it keeps failing
+        return lost
+
+    def release(
+        self,
+        path: Path,
+        status: str | None = None,
+        message: str = "",
+        output: Path | None = None,
+    ) -> None:
+        """Give up our lease of ``path``, first recording the result if ``status``."""
+        key = entry_key(path)
+        if key not in self._held:
+            return
+        del self._held[key]
+        if status is not None:
+            result = SharedResult(
+                str(path), status, self.host, message, str(output) if output else None, time.time()
+            )
+            try:
+                self._write(self._results / f"{key}.json", asdict(result))
+            except OSError:
+                pass
+        current = _read_lease(self._lease_path(key))
+        if current is not None and current.owner == self.owner:
+            try:
+                self._lease_path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        """Release every lease without a result, so other hosts take over."""
+        for lease in list(self._held.values()):
+            self.release(Path(lease.path))
+
+    # ── Status ───────────────────────────────────────────────────────
+
+    def leases(self) -> list[Lease]:
+        """Return the leases currently in the directory, live or not."""
+        found = []
+        for name in sorted(os.listdir(self._leases)):
+            if name.endswith(".lease"):
+                lease = _read_lease(self._leases / name)
+                if lease is not None:
+                    found.append(lease)
+        return found
+
+    def results(self) -> list[SharedResult]:
+        """Return the results every host recorded."""
+        found = []
+        for name in sorted(os.listdir(self._results)):
+            if name.endswith(".json"):
+                data = _read_json(self._results / name)
+                try:
+                    found.append(SharedResult(**data))
+                except TypeError:
+                    continue
+        return found
+
+    # ── Internals ────────────────────────────────────────────────────
+
+    def _take(self, key: str, lease: Lease) -> None:
+        self._held[key] = lease
+        self._seen.pop(key, None)
+        if len(self._held) == 1:
+            self._last_beat = time.monotonic()
+
+    def _observe(self, key: str) -> Lease | None:
+        """Read the lease of ``key`` and note when it last changed."""
+        lease = _read_lease(self._lease_path(key))
+        if lease is None:
+            self._seen.pop(key, None)
+            return None
+        seen = self._seen.get(key)
+        if seen is None or seen[0] != lease:
+            self._seen[key] = (lease, time.monotonic())
+        return lease
+
+    def _expired(self, key: str) -> bool:
+        seen = self._seen.get(key)
+        return seen is not None and time.monotonic() - seen[1] >= self.ttl
+
+    def _steal(self, key: str, dead: Lease) -> bool:
+        """Remove the expired lease ``dead``; False if another host got there first."""
+        target = self._lease_path(key)
+        aside = target.with_name(f".{target.name}.{self.owner}.stale")
+        try:
+            os.rename(target, aside)
+        except FileNotFoundError:
+            return False
+        moved = _read_lease(aside)
+        try:
+            if moved != dead:
+                # A fresh lease replaced the dead one meanwhile; put it back.
+                try:
+                    os.link(aside, target)
+                except FileExistsError:
+                    pass
+                return False
+            self._seen.pop(key, None)
+            return True
+        finally:
+            aside.unlink()
@@ -0,0 +1,451 @@
+"""Daemon mode: one scheduler shared by every client of a local socket.
+
+``compresswitch daemon`` (or ``batch --serve``) keeps a FileQueue and
+JobScheduler running and listens on a Unix socket, so scripts, cron jobs
+and several terminal sessions all feed the same queue instead of each
+starting nsz jobs of their own and fighting over the CPUs and disks.
+
+The protocol is one JSON object per line. A client sends requests like
+``{"op": "submit", "paths": [...]}`` and gets one reply per request,
+``{"ok": true, ...}`` or ``{"ok": false, "error": "..."}``:
+
+``submit``
+    queue ``paths`` (absolute; directories are searched) and start them;
+    replies with the ``jobs`` queued and the paths ``skipped``.
+``list``
+    replies with every job, ``paused`` and the ``remaining`` seconds.
+``cancel``
+    cancel the running or pending jobs ``ids``; replies with those ``cancelled``.
+``prioritize``
+    set the ``priority`` of job ``id``; higher priorities start first.
+``pause`` / ``resume``
+    pause or resume job ``id``, or everything without one.
+``subscribe``
+    after the reply, the connection receives an ``{"event": ..., "job":
+    {...}}`` line whenever a job starts, moves on by a percent or ends.
+
+Requests are read on a thread per connection and carried out on the
+scheduler's thread through ``dispatch``. A subscriber that falls too far
+behind is disconnected rather than holding up the scheduler.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue as queue_module
+import select
+import socket
+import threading
+import traceback
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+from compresswitch.file_queue import FileQueue, QueueEntry, Status
+from compresswitch.utils import is_valid_switch_file
+
+if TYPE_CHECKING:
+    # Only the server needs these; DaemonClient stays light for `jobs`.
+    from compresswitch.scheduler import JobScheduler
+    from compresswitch.worker import Dispatch
+
+# Longest request line accepted, in bytes
+_MAX_REQUEST = 1 << 20
+# Events a subscriber may have waiting before it is dropped
+_MAX_BACKLOG = 1000
+# Seconds a blocked request waits for the scheduler thread
+_REQUEST_TIMEOUT = 30.0
+
+
+def default_socket_path() -> Path:
+    """Return the daemon socket in the XDG runtime directory."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "compresswitch.sock"
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache_home) / "compresswitch" / "daemon.sock"
+
+
+class DaemonError(Exception):
+    """A request failed, or no daemon could be reached."""
+
+
+def job_info(entry: QueueEntry, scheduler: JobScheduler | None = None) -> dict:
+    """Describe ``entry`` as sent to clients."""
+    info = {
+        "id": entry.id,
+        "path": str(entry.path),
+        "operation": entry.operation,
+        "status": entry.status.name.lower(),
+        "progress": entry.progress,
+        "priority": entry.priority,
+        "output": str(entry.output) if entry.output is not None else None,
+        "error": entry.error_message if entry.status == Status.ERROR else "",
+        "log": str(entry.log) if entry.log is not None else None,
+    }
+    if scheduler is not None:
+        info["paused"] = scheduler.is_paused(entry.id)
+    return info
+
+
+def expand_paths(paths: list[str]) -> tuple[list[Path], list[str]]:
+    """Return the supported files under ``paths`` and the paths that hold none."""
+    from compresswitch.scanner import scan_paths
+
+    roots, skipped = [], []
+    for name in paths:
+        path = Path(name)
+        if path.is_absolute() and (path.is_dir() or is_valid_switch_file(path)):
+            roots.append(path)
+        else:
+            skipped.append(name)
+    return scan_paths(roots), skipped
+
+
+class _Connection:
+    """One client connection; becomes an event stream once subscribed."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.events: queue_module.Queue[dict] = queue_module.Queue(_MAX_BACKLOG)
+        self.subscribed = False
+        self.closed = False
+
+    def send(self, message: dict) -> None:
+        self.sock.sendall(json.dumps(message).encode() + b"\n")
+
+    def push(self, event: dict) -> bool:
+        """Queue ``event`` for the subscriber; False if it has fallen behind."""
+        try:
+            self.events.put_nowait(event)
+            return True
+        except queue_module.Full:
+            return False
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class DaemonServer:
+    """Serves the daemon protocol for ``scheduler`` on the socket at ``path``.
+
+    ``worker_options`` are what the scheduler is started with when jobs
+    are submitted. Call publish() from the scheduler's callbacks so
+    subscribers see the jobs move.
+    """
+
+    def __init__(
+        self,
+        scheduler: JobScheduler,
+        path: Path,
+        *,
+        dispatch: Dispatch,
+        worker_options: dict | None = None,
+    ):
+        self.scheduler = scheduler
+        self.queue: FileQueue = scheduler.queue
+        self.path = path
+        self.dispatch = dispatch
+        self.worker_options = worker_options or {}
+        self._listener: socket.socket | None = None
+        self._thread: threading.Thread | None = None
+        self._subscribers: list[_Connection] = []
+        self._connections: set[_Connection] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._published: dict[int, int] = {}  # entry id -> last percent sent
+
+    def start(self) -> None:
+        """Bind the socket; raises DaemonError if another daemon holds it."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            try:
+                DaemonClient(self.path).request("list")
+            except DaemonError:
+                self.path.unlink()  # Left behind by a daemon that died
+            else:
+                raise DaemonError(f"a daemon is already listening on {self.path}")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(str(self.path))
+            # Who may connect is up to the directory; XDG_RUNTIME_DIR is private.
+            os.chmod(self.path, 0o660)
+            listener.listen()
+        except OSError as e:
+            listener.close()
+            raise DaemonError(f"cannot listen on {self.path}: {e.strerror or e}") from e
+        self._listener = listener
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop listening and disconnect every client."""
+        self._closed = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.close()
+
+    def publish(self, event: str, entry: QueueEntry) -> None:
+        """Send ``event`` about ``entry`` to the subscribers.
+
+        Progress is only sent when the percentage changes.
+        """
+        if event == "progress":
+            if self._published.get(entry.id) == entry.progress:
+                return
+            self._published[entry.id] = entry.progress
+        elif event == "done":
+            self._published.pop(entry.id, None)
+        message = {"event": event, "job": job_info(entry, self.scheduler)}
+        for connection in list(self._subscribers):
+            if not connection.push(message):
+                self._subscribers.remove(connection)
+                connection.close()
+
+    # ── Connection threads ───────────────────────────────────────────
+
+    def _accept(self) -> None:
+        while not self._closed:
+            ready, _, _ = select.select([self._listener], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                sock, _addr = self._listener.accept()
+            except OSError:
+                continue
+            connection = _Connection(sock)
+            with self._lock:
+                self._connections.add(connection)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection: _Connection) -> None:
+        try:
+            with connection.sock.makefile("rb") as reader:
+                while not connection.subscribed:
+                    line = reader.readline(_MAX_REQUEST)
+                    if not line:
+                        break
+                    connection.send(self._reply(connection, line))
+            if connection.subscribed:
+                self._stream(connection)
+        except OSError:
+            pass
+        finally:
+            if connection.subscribed:
+                self.dispatch(0, self._unsubscribe, connection)
+            with self._lock:
+                self._connections.discard(connection)
+            connection.sock.close()
+
+    def _reply(self, connection: _Connection, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("not an object")
+        except ValueError as e:
+            return {"ok": False, "error": f"malformed request: {e}"}
+        op = request.get("op")
+        handler = getattr(self, f"_op_{op}", None) if isinstance(op, str) else None
+        if handler is None:
+            return {"ok": False, "error": f"unknown operation {op!r}"}
+        if op == "submit":
+            # Directories are searched here, not on the scheduler's thread.
+            paths = request.get("paths")
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                return {"ok": False, "error": "paths must be a list of strings"}
+            request["files"], request["skipped"] = expand_paths(paths)
+        future: Future[dict] = Future()
+        self.dispatch(0, self._run, handler, connection, request, future)
+        try:
+            return future.result(timeout=_REQUEST_TIMEOUT)
+        except TimeoutError:
+            return {"ok": False, "error": "the daemon is not responding"}
+
+    def _stream(self, connection: _Connection) -> None:
+        while not connection.closed:
+            try:
+                event = connection.events.get(timeout=1.0)
+            except queue_module.Empty:
+                continue
+            connection.send(event)
+
+    # ── Operations (on the scheduler's thread) ───────────────────────
+
+    def _run(self, handler, connection: _Connection, request: dict, future: Future) -> None:
+        try:
+            reply = handler(connection, request)
+        except DaemonError as e:
+            reply = {"ok": False, "error": str(e)}
+        except Exception as e:
+            # A bug in one request must not take the daemon and its jobs down.
+            traceback.print_exc()
+            reply = {"ok": False, "error": f"internal error: {e!r}"}
+        future.set_result({"ok": True, **reply} if "ok" not in reply else reply)
+
+    def _entry(self, value) -> QueueEntry:
+        entry = self.queue.get(value) if type(value) is int else None
+        if entry is None:
+            raise DaemonError(f"no job {value!r}")
+        return entry
+
+    def _op_submit(self, _connection: _Connection, request: dict) -> dict:
+        # Everything is checked before the queue changes.
+        priority = request.get("priority", 0)
+        if type(priority) is not int:
+            raise DaemonError("priority must be an integer")
+        keys = self.scheduler.keys
+        if keys is not None and not (check := keys.check()).ok:
+            return {"ok": False, "error": check.message}
+        files = []
+        for path in request["files"]:
+            entry = self.queue.find(path)
+            if entry is not None and entry.status in (
+                Status.DONE,
+                Status.ERROR,
+                Status.SKIPPED,
+            ):
+                self.queue.remove(entry.id)  # Submitted again: convert afresh
+            files.append(path)
+        self.queue.add_many(files, priority=priority)
+        jobs = [self.queue.find(path) for path in files]
+        for entry in jobs:
+            # Already pending from an earlier submit
+            if entry is not None and entry.status == Status.PENDING:
+                self.queue.set_priority(entry, priority)
+        self.scheduler.start(**self.worker_options)
+        return {
+            "jobs": [job_info(entry, self.scheduler) for entry in jobs if entry is not None],
+            "skipped": request["skipped"],
+        }
+
+    def _op_list(self, _connection: _Connection, _request: dict) -> dict:
+        estimate = self.scheduler.estimate()
+        jobs = []
+        for entry in self.queue:
+            info = job_info(entry, self.scheduler)
+            if entry.id in estimate.jobs:
+                info["remaining"] = estimate.jobs[entry.id]
+            jobs.append(info)
+        return {
+            "jobs": jobs,
+            "paused": self.scheduler.paused,
+            "remaining": estimate.remaining if self.scheduler.running else 0.0,
+        }
+
+    def _op_cancel(self, _connection: _Connection, request: dict) -> dict:
+        ids = request.get("ids")
+        if not isinstance(ids, list):
+            raise DaemonError("ids must be a list of job ids")
+        cancelled = [
+            entry_id
+            for entry_id in ids
+            if type(entry_id) is int and self.scheduler.cancel_job(entry_id)
+        ]
+        return {"cancelled": cancelled}
+
+    def _op_prioritize(self, _connection: _Connection, request: dict) -> dict:
+        entry = self._entry(request.get("id"))
+        priority = request.get("priority")
+        if type(priority) is not int:
+            raise DaemonError("priority must be an integer")
+        if entry.status != Status.PENDING:
+            raise DaemonError(f"job {entry.id} is {entry.status.name.lower()}, not pending")
+        self.queue.set_priority(entry, priority)
+        return {"job": job_info(entry, self.scheduler)}
+
+    def _op_pause(self, _connection: _Connection, request: dict) -> dict:
+        entry_id = request.get("id")
+        self.scheduler.pause(None if entry_id is None else self._entry(entry_id).id)
+        return {}
+
+    def _op_resume(self, _connection: _Connection, request: dict) -> dict:
+        entry_id = request.get("id")
+        self.scheduler.resume(None if entry_id is None else self._entry(entry_id).id)
+        return {}
+
+    def _op_subscribe(self, connection: _Connection, _request: dict) -> dict:
+        connection.subscribed = True
+        self._subscribers.append(connection)
+        return {}
+
+    def _unsubscribe(self, connection: _Connection) -> None:
+        if connection in self._subscribers:
+            self._subscribers.remove(connection)
+
+
+class DaemonClient:
+    """Talks to the daemon listening on ``path``."""
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or default_socket_path()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(self.path))
+        except OSError as e:
+            sock.close()
+            raise DaemonError(
+                f"no daemon is listening on {self.path}: {e.strerror or e}"
+            ) from e
+        return sock
+
+    @staticmethod
+    def _exchange(sock: socket.socket, reader, op: str, fields: dict) -> dict:
+        try:
+            sock.sendall(json.dumps({"op": op, **fields}).encode() + b"\n")
+            line = reader.readline()
+        except OSError as e:
+            raise DaemonError(f"lost the connection to the daemon: {e.strerror or e}") from e
+        if not line:
+            raise DaemonError("the daemon closed the connection")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise DaemonError(reply.get("error") or "request failed")
+        return reply
+
+    def request(self, op: str, **fields) -> dict:
+        """Send one request and return the reply; raises DaemonError on failure."""
+        with self._connect() as sock, sock.makefile("rb") as reader:
+            return self._exchange(sock, reader, op, fields)
+
+    def events(self) -> Iterator[dict]:
+        """Subscribe and return the events, which end when the daemon goes away.
+
+        The subscription is in place when this returns, so nothing that
+        happens afterwards is missed.
+        """
+        sock = self._connect()
+        reader = sock.makefile("rb")
+        try:
+            self._exchange(sock, reader, "subscribe", {})
+        except DaemonError:
+            reader.close()
+            sock.close()
+            raise
+        return self._read_events(sock, reader)
+
+    @staticmethod
+    def _read_events(sock: socket.socket, reader) -> Iterator[dict]:
+        with sock, reader:
+            try:
+                for line in reader:
+                    yield json.loads(line)
+            except OSError:
+                return
@@ -0,0 +1,143 @@
+"""Throughput and time-left estimates for running jobs and the whole queue.
+
+Each running job's speed is measured over a rolling window of its
+progress, so a job that slows down (a slower disk, a level that suits the
+data badly) shows it within seconds. Jobs that have not run long enough,
+and every pending file, are estimated from their size and the throughput
+JobHistory recorded for their operation, mode and level. That expectation
+is scaled by how fast the running jobs actually go compared with it, so
+pending estimates follow the machine's current speed.
+
+The queue's time left comes from replaying the run: pending files start,
+in queue order, on whichever job slot frees up first.
+"""
+
+from __future__ import annotations
+
+import heapq
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from compresswitch.file_queue import QueueEntry
+from compresswitch.ordering import JobHistory, entry_size, expected_throughput
+
+# Seconds of progress the live speed of a job is measured over
+_WINDOW = 20.0
+# A job's speed is only trusted once it spans this many seconds
+_MIN_SPAN = 3.0
+# Bounds on how far live speeds may correct the recorded ones
+_MIN_FACTOR = 0.2
+_MAX_FACTOR = 5.0
+
+
+class RateWindow:
+    """Bytes per second over the last ``window`` seconds of progress samples."""
+
+    def __init__(self, window: float = _WINDOW):
+        self.window = window
+        self._samples: deque[tuple[float, float]] = deque()  # (time, bytes done)
+
+    def add(self, now: float, done: float) -> None:
+        self._samples.append((now, done))
+        # Keep one sample at or before the window start so it spans all of it.
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    @property
+    def done(self) -> float:
+        return self._samples[-1][1] if self._samples else 0.0
+
+    def rate(self) -> float | None:
+        """Return the measured rate, or None until it spans _MIN_SPAN seconds."""
+        if len(self._samples) < 2:
+            return None
+        (t0, d0), (t1, d1) = self._samples[0], self._samples[-1]
+        if t1 - t0 < _MIN_SPAN:
+            return None
+        return max(0.0, (d1 - d0) / (t1 - t0))
+
+
+@dataclass
+class Estimate:
+    rate: float = 0.0  # bytes per second of all running jobs together
+    remaining: float | None = None  # seconds until the queue is done
+    jobs: dict[int, float] = field(default_factory=dict)  # entry id -> seconds left
+
+
+def replay(running: list[float], pending: list[float], slots: int) -> float:
+    """Return the seconds until the last job ends.
+
+    ``running`` holds the seconds left of the running jobs; each of the
+    ``pending`` jobs then starts on the first of ``slots`` to free up.
+    """
+    free_at = sorted(running) + [0.0] * max(0, slots - len(running))
+    heapq.heapify(free_at)
+    end = max(running, default=0.0)
+    for seconds in pending:
+        finish = heapq.heappop(free_at) + seconds
+        heapq.heappush(free_at, finish)
+        end = max(end, finish)
+    return end
+
+
+class EtaEstimator:
+    """Tracks the speed of running jobs and estimates the time left.
+
+    ``level`` and ``mode`` are those new jobs run with; ``history`` (may
+    be None) provides the recorded throughput.
+    """
+
+    def __init__(self, history: JobHistory | None, level: int = 18, mode: str = "block"):
+        self.history = history
+        self.level = level
+        self.mode = mode
+        self._windows: dict[int, RateWindow] = {}
+
+    def update(self, entry: QueueEntry, fraction: float, now: float | None = None) -> None:
+        """Record that ``entry``'s job has done ``fraction`` of its input."""
+        window = self._windows.get(entry.id)
+        if window is None:
+            window = self._windows[entry.id] = RateWindow()
+        window.add(time.monotonic() if now is None else now, fraction * entry_size(entry))
+
+    def remove(self, entry: QueueEntry) -> None:
+        self._windows.pop(entry.id, None)
+
+    def expected_rate(self, entry: QueueEntry) -> float:
+        return expected_throughput(entry.operation, self.level, self.mode, self.history)
+
+    def estimate(
+        self,
+        running: list[QueueEntry],
+        pending: list[QueueEntry],
+        slots: int,
+    ) -> Estimate:
+        """Estimate the time left of ``running`` jobs and of the queue.
+
+        ``pending`` entries are expected to run in the order given, on up
+        to ``slots`` jobs at once.
+        """
+        measured: dict[int, float] = {}
+        ratios = []
+        for entry in running:
+            window = self._windows.get(entry.id)
+            rate = window.rate() if window is not None else None
+            if rate is not None:
+                measured[entry.id] = rate
+                ratios.append(rate / self.expected_rate(entry))
+        factor = 1.0
+        if ratios:
+            factor = min(_MAX_FACTOR, max(_MIN_FACTOR, sum(ratios) / len(ratios)))
+
+        estimate = Estimate(rate=sum(measured.values()))
+        for entry in running:
+            rate = measured.get(entry.id) or self.expected_rate(entry) * factor
+            window = self._windows.get(entry.id)
+            left = entry_size(entry) - (window.done if window is not None else 0.0)
+            estimate.jobs[entry.id] = left / rate if rate else 0.0
+        pending_seconds = [
+            entry_size(entry) / (self.expected_rate(entry) * factor) for entry in pending
+        ]
+        estimate.remaining = replay(list(estimate.jobs.values()), pending_seconds, slots)
+        return estimate
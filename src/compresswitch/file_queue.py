@@ -2,28 +2,49 @@
 
 from __future__ import annotations
 
+import heapq
+import itertools
+import threading
+from collections import Counter
 from dataclasses import dataclass, field
 from enum import Enum, auto
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable
 
 from compresswitch.utils import file_operation, target_name
 
+if TYPE_CHECKING:
+    from compresswitch.journal import Journal
+    from compresswitch.metrics import JobMetrics
+
 
 class Status(Enum):
     PENDING = auto()
     PROCESSING = auto()
+    VERIFYING = auto()  # converted, output being checked with nsz -V
+    REMOTE = auto()  # claimed by another host (see compresswitch.coordination)
     DONE = auto()
     ERROR = auto()
+    SKIPPED = auto()  # output already up to date, nsz not run
+
 
+_entry_ids = itertools.count(1)
 
-@dataclass
+
+@dataclass(slots=True, eq=False)
 class QueueEntry:
     path: Path
     operation: str  # "compress" or "decompress"
     target: str  # expected output filename
-    status: Status = Status.PENDING
+    status: Status = Status.PENDING  # change through FileQueue.set_status
     progress: int = 0
     error_message: str = ""
+    output: Path | None = None  # file the job writes, once it has started
+    size: int = -1  # input size in bytes, once an ordering has needed it
+    metrics: JobMetrics | None = None  # cost of the last job run for it
+    log: Path | None = None  # nsz's output for it, once a job has run with a log
+    priority: int = 0  # higher runs first; change through FileQueue.set_priority
+    id: int = field(default_factory=lambda: next(_entry_ids))  # stable for its lifetime
 
     @classmethod
     def from_path(cls, path: Path) -> QueueEntry | None:
@@ -37,54 +58,217 @@ class QueueEntry:
             target=target_name(path),
         )
 
+    def output_in(self, output_dir: str) -> Path:
+        """Return the file nsz writes for this entry given an output directory."""
+        return (Path(output_dir) if output_dir else self.path.parent) / self.target
+
+
+# Sort key for pending entries; lower runs first (see compresswitch.ordering)
+OrderKey = Callable[[QueueEntry], float]
+
 
 class FileQueue:
-    """Manages the ordered list of queue entries."""
+    """Manages the ordered collection of queue entries.
+
+    Entries are indexed by id and by path, pending entries are kept in a
+    heap and per-status and per-operation counts are maintained, so every
+    operation except iteration and set_order is O(1) or O(log n). Entry
+    status must therefore be changed with set_status (claim_next does it
+    for PROCESSING).
+
+    Pending entries are handed out by descending priority, then in
+    insertion order unless set_order installs a sort key; entries with
+    equal keys keep insertion order.
 
-    def __init__(self) -> None:
-        self._entries: list[QueueEntry] = []
+    With a ``journal`` attached, every addition, removal and status change
+    is also recorded there (see compresswitch.journal).
+    """
+
+    def __init__(self, journal: Journal | None = None) -> None:
+        self.journal = journal
+        self._entries: dict[int, QueueEntry] = {}  # insertion ordered
+        self._by_path: dict[Path, QueueEntry] = {}
+        # (-priority, key, seq, entry); may hold stale entries (removed or
+        # no longer pending), which are skipped when they reach the front.
+        self._pending: list[tuple[int, float, int, QueueEntry]] = []
+        self._order_key: OrderKey | None = None
+        self._seq = itertools.count()
+        self._status_counts: Counter[Status] = Counter()
+        self._operation_counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
 
     def __len__(self) -> int:
         return len(self._entries)
 
     def __iter__(self):
-        return iter(self._entries)
+        with self._lock:
+            return iter(list(self._entries.values()))
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._by_path
 
-    def __getitem__(self, index: int) -> QueueEntry:
-        return self._entries[index]
+    def get(self, entry_id: int) -> QueueEntry | None:
+        return self._entries.get(entry_id)
+
+    def find(self, path: Path) -> QueueEntry | None:
+        return self._by_path.get(path)
 
     def add(self, path: Path) -> QueueEntry | None:
         """Add a file to the queue. Returns the entry or None if invalid/duplicate."""
-        # Skip duplicates
-        for entry in self._entries:
-            if entry.path == path:
-                return None
-        entry = QueueEntry.from_path(path)
-        if entry:
-            self._entries.append(entry)
-        return entry
-
-    def remove(self, index: int) -> None:
-        """Remove entry at index."""
-        if 0 <= index < len(self._entries):
-            del self._entries[index]
+        added = self.add_many([path])
+        return added[0] if added else None
+
+    def add_many(self, paths: Iterable[Path], priority: int = 0) -> list[QueueEntry]:
+        """Add several files at once; returns the entries that were added."""
+        added: list[QueueEntry] = []
+        with self._lock:
+            for path in paths:
+                if path in self._by_path:
+                    continue
+                entry = QueueEntry.from_path(path)
+                if entry is None:
+                    continue
+                entry.priority = priority
+                self._entries[entry.id] = entry
+                self._by_path[path] = entry
+                self._status_counts[entry.status] += 1
+                self._operation_counts[entry.operation] += 1
+                if entry.status == Status.PENDING:
+                    self._push_pending(entry)
+                added.append(entry)
+            if added and self.journal is not None:
+                self.journal.added(added)
+        return added
+
+    def remove(self, entry_id: int) -> QueueEntry | None:
+        """Remove the entry with the given id and return it."""
+        with self._lock:
+            entry = self._entries.pop(entry_id, None)
+            if entry is not None:
+                del self._by_path[entry.path]
+                self._status_counts[entry.status] -= 1
+                self._operation_counts[entry.operation] -= 1
+                if self.journal is not None:
+                    self.journal.removed(entry)
+            return entry
 
     def clear(self) -> None:
-        self._entries.clear()
+        with self._lock:
+            if self.journal is not None:
+                self.journal.cleared()
+            self._entries.clear()
+            self._by_path.clear()
+            self._pending.clear()
+            self._status_counts.clear()
+            self._operation_counts.clear()
 
-    def next_pending(self) -> QueueEntry | None:
-        """Return the first pending entry, or None."""
-        for entry in self._entries:
+    def set_status(
+        self, entry: QueueEntry, status: Status, error_message: str | None = None
+    ) -> None:
+        """Change an entry's status, keeping the counters and pending heap in step."""
+        with self._lock:
+            if error_message is not None:
+                entry.error_message = error_message
+            self._set_status(entry, status)
+
+    def set_output(self, entry: QueueEntry, output: Path) -> None:
+        """Record the file a starting job is about to write."""
+        with self._lock:
+            entry.output = output
+            if self.journal is not None and self._entries.get(entry.id) is entry:
+                self.journal.status_changed(entry)
+
+    def _set_status(self, entry: QueueEntry, status: Status) -> None:
+        previous = entry.status
+        if previous == status:
+            return
+        entry.status = status
+        if self._entries.get(entry.id) is entry:
+            self._status_counts[previous] -= 1
+            self._status_counts[status] += 1
+            if status == Status.PENDING:
+                self._push_pending(entry)
+            if self.journal is not None:
+                self.journal.status_changed(entry)
+
+    def set_order(self, key: OrderKey | None) -> None:
+        """Hand out pending entries by ascending ``key`` (None: insertion order).
+
+        Keys are computed once, when an entry becomes pending; call again to
+        re-sort after whatever the key depends on has changed.
+        """
+        with self._lock:
+            self._order_key = key
+            self._rebuild_pending()
+
+    def set_priority(self, entry: QueueEntry, priority: int) -> None:
+        """Change an entry's priority; pending entries with a higher one run first."""
+        with self._lock:
+            if entry.priority == priority:
+                return
+            entry.priority = priority
+            if entry.status == Status.PENDING and self._entries.get(entry.id) is entry:
+                self._rebuild_pending()
+
+    def _rebuild_pending(self) -> None:
+        self._pending.clear()
+        for entry in self._entries.values():
             if entry.status == Status.PENDING:
+                self._push_pending(entry)
+
+    def _push_pending(self, entry: QueueEntry) -> None:
+        seq = next(self._seq)
+        key = self._order_key(entry) if self._order_key is not None else 0.0
+        heapq.heappush(self._pending, (-entry.priority, key, seq, entry))
+
+    def _front_pending(self) -> QueueEntry | None:
+        pending = self._pending
+        while pending:
+            entry = pending[0][-1]
+            if entry.status == Status.PENDING and self._entries.get(entry.id) is entry:
                 return entry
+            heapq.heappop(pending)
         return None
 
+    def next_pending(self) -> QueueEntry | None:
+        """Return the pending entry that runs next, or None."""
+        with self._lock:
+            return self._front_pending()
+
+    def pending_entries(self) -> list[QueueEntry]:
+        """Return the pending entries in the order they will be handed out."""
+        with self._lock:
+            items = sorted(self._pending, key=lambda item: item[:3])
+            seen: set[int] = set()
+            entries = []
+            for *_key, entry in items:
+                if (
+                    entry.status == Status.PENDING
+                    and entry.id not in seen
+                    and self._entries.get(entry.id) is entry
+                ):
+                    seen.add(entry.id)
+                    entries.append(entry)
+            return entries
+
+    def claim_next(self) -> QueueEntry | None:
+        """Atomically take the next pending entry and mark it as processing."""
+        with self._lock:
+            entry = self._front_pending()
+            if entry is not None:
+                heapq.heappop(self._pending)
+                self._set_status(entry, Status.PROCESSING)
+            return entry
+
+    def count(self, status: Status) -> int:
+        return self._status_counts[status]
+
     def has_pending(self) -> bool:
-        return any(e.status == Status.PENDING for e in self._entries)
+        return self._status_counts[Status.PENDING] > 0
+
+    def pending_count(self) -> int:
+        return self._status_counts[Status.PENDING]
 
     def has_any_compress(self) -> bool:
         """Return True if any entry is a compress operation."""
-        return any(e.operation == "compress" for e in self._entries)
-
-    def index_of(self, entry: QueueEntry) -> int:
-        return self._entries.index(entry)
+        return self._operation_counts["compress"] > 0
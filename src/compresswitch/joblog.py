@@ -0,0 +1,104 @@
+"""Bounded capture of nsz's console output, and a log file per job.
+
+nsz redraws its progress bars many times a second for as long as a job
+runs. A job keeps only the last TAIL_LINES lines in memory, with
+consecutive redraws collapsed into one, which is enough to explain a
+failure. The complete output can also go to a log file per input file,
+where a redraw is only written when its percentage changes and the file
+is rotated once it reaches ``max_bytes``. Memory per job stays the same
+however long it runs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+TAIL_LINES = 200
+DEFAULT_MAX_BYTES = 1 << 20
+
+
+def default_log_dir() -> Path:
+    """Return the job log folder in the XDG state directory."""
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    return Path(state_home) / "compresswitch" / "logs"
+
+
+def log_path(log_dir: str, source: Path) -> Path:
+    """Return the log file of the jobs converting ``source``.
+
+    The name carries a hash of the full path, so inputs of the same name in
+    different folders get their own logs.
+    """
+    digest = hashlib.blake2b(str(source.resolve()).encode(), digest_size=4).hexdigest()
+    return Path(log_dir) / f"{source.name}-{digest}.log"
+
+
+class OutputTail:
+    """The last ``size`` lines of a job's output; progress redraws replace each other."""
+
+    def __init__(self, size: int = TAIL_LINES):
+        self._lines: deque[str] = deque(maxlen=size)
+        self._last_was_progress = False
+
+    def add(self, line: str, progress: bool = False) -> None:
+        if progress and self._last_was_progress:
+            self._lines[-1] = line
+        else:
+            self._lines.append(line)
+        self._last_was_progress = progress
+
+    def text(self) -> str:
+        return "\n".join(self._lines)
+
+
+class JobLog:
+    """Appends one job's output to ``path``.
+
+    Once the file would grow past ``max_bytes`` it is moved to ``path.1``
+    (replacing an older one) and a new file is started. Write errors close
+    the log instead of failing the job.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", errors="replace")
+        self._size = self._file.tell()
+        self._last_percent: int | None = None
+
+    def header(self, args: list[str]) -> None:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.write(f"── {stamp}  nsz {' '.join(args)}")
+
+    def write(self, line: str, percent: int | None = None) -> None:
+        """Write a line; ``percent`` marks a progress redraw (see parse_progress)."""
+        if self._file is None or (percent is not None and percent == self._last_percent):
+            return
+        self._last_percent = percent
+        data = line + "\n"
+        try:
+            if self._size + len(data) > self.max_bytes and self._size:
+                self._rotate()
+            self._file.write(data)
+            self._size += len(data)
+        except OSError:
+            self.close()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+        self._file = open(self.path, "a", encoding="utf-8", errors="replace")
+        self._size = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
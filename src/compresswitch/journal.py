@@ -0,0 +1,208 @@
+"""Crash-safe record of the queue, so an interrupted run can be resumed.
+
+Every entry added to a FileQueue with a journal attached, and each of its
+status changes, is written to a small SQLite database before the change
+takes effect elsewhere. After a crash, ``recover`` finds the jobs that
+were running, removes the partial outputs nsz left behind (nsz writes
+straight to the final file name and would otherwise skip it next time)
+and returns the files that still need to be converted.
+
+Only one process uses a journal at a time: it holds an exclusive lock on
+``<journal>.lock`` while open, so a second batch or the GUI never takes
+the jobs another live process is running for interrupted ones. Paths are
+stored absolute, so recovery works from any working directory.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from compresswitch.file_queue import QueueEntry, Status
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT NOT NULL DEFAULT '',
+    error_message TEXT NOT NULL DEFAULT '',
+    added REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+def default_journal_path() -> Path:
+    """Return the journal location in the XDG data directory."""
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return Path(data_home) / "compresswitch" / "journal.sqlite3"
+
+
+class JournalInUse(OSError):
+    """Another live process has the journal open."""
+
+
+def _stored(path: Path | None) -> str:
+    return str(path.resolve()) if path else ""
+
+
+@dataclass
+class Recovery:
+    pending: list[Path] = field(default_factory=list)  # inputs to queue again
+    interrupted: list[Path] = field(default_factory=list)  # inputs whose job was cut short
+    removed_outputs: list[Path] = field(default_factory=list)  # partial outputs cleaned up
+
+
+class Journal:
+    """SQLite journal of queue entries and their state transitions.
+
+    Safe to call from any thread. Writes use synchronous=FULL so a finished
+    job is never mistaken for an interrupted one after a power loss (which
+    would delete its complete output). Opening a journal another process
+    has open raises JournalInUse.
+    """
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = Path(path) if path else default_journal_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._owner = self._take_ownership()
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=FULL")
+            self._db.execute(_SCHEMA)
+            self._db.commit()
+        except sqlite3.Error:
+            os.close(self._owner)
+            raise
+
+    def _take_ownership(self) -> int:
+        """Lock the journal for this process; return the lock file descriptor."""
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            owner = os.read(fd, 32).decode(errors="replace").strip() or "?"
+            os.close(fd)
+            raise JournalInUse(f"in use by another CompressSwitch process (pid {owner})")
+        except OSError:
+            os.close(fd)
+            raise
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        return fd
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+            os.close(self._owner)  # Releases the lock
+
+    # ── Recording (called by FileQueue) ──────────────────────────────
+
+    def added(self, entries: Iterable[QueueEntry]) -> None:
+        now = time.time()
+        rows = [
+            (_stored(e.path), e.operation, e.status.name, _stored(e.output), now, now)
+            for e in entries
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries"
+                " (path, operation, status, output, added, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def status_changed(self, entry: QueueEntry) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE entries SET status = ?, output = ?, error_message = ?, updated = ?"
+                " WHERE path = ?",
+                (
+                    entry.status.name,
+                    _stored(entry.output),
+                    entry.error_message,
+                    time.time(),
+                    _stored(entry.path),
+                ),
+            )
+
+    def removed(self, entry: QueueEntry) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE path = ?", (_stored(entry.path),))
+
+    def cleared(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+
+    # ── Recovery ─────────────────────────────────────────────────────
+
+    def recover(self, quarantine_dir: Path | None = None, *, dry_run: bool = False) -> Recovery:
+        """Clean up after an interrupted run and return what is left to do.
+
+        Partial outputs of jobs that started but never finished are deleted,
+        or moved to ``quarantine_dir`` if given. Finished entries and entries whose
+        input no longer exists are dropped from the journal. With ``dry_run``
+        nothing is changed; removed_outputs lists what would be cleaned up.
+        """
+        recovery = Recovery()
+        for path, output in self._unfinished():
+            if output is not None:
+                # The job started but never finished: whatever it wrote is partial.
+                recovery.interrupted.append(path)
+                if dry_run:
+                    if output.is_file():
+                        recovery.removed_outputs.append(output)
+                elif self._discard_output(output, quarantine_dir):
+                    recovery.removed_outputs.append(output)
+            if path.is_file():
+                recovery.pending.append(path)
+
+        if not dry_run:
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM entries")
+        return recovery
+
+    def _unfinished(self) -> list[tuple[Path, Path | None]]:
+        """Return (input, output) for every entry whose job never finished."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, status, output FROM entries ORDER BY added, rowid"
+            ).fetchall()
+        # An output that was still being verified may be corrupt. Entries
+        # another host held have no output of ours; they are simply pending.
+        unfinished = (
+            Status.PENDING.name,
+            Status.PROCESSING.name,
+            Status.VERIFYING.name,
+            Status.REMOTE.name,
+        )
+        return [
+            (Path(path), Path(output) if output else None)
+            for path, status, output in rows
+            if status in unfinished
+        ]
+
+    @staticmethod
+    def _discard_output(output: Path, quarantine_dir: Path | None) -> bool:
+        try:
+            if not output.is_file():
+                return False
+            if quarantine_dir is None:
+                output.unlink()
+            else:
+                quarantine_dir.mkdir(parents=True, exist_ok=True)
+                stamp = time.strftime("%Y%m%d-%H%M%S")
+                shutil.move(output, quarantine_dir / f"{stamp}-{output.name}")
+            return True
+        except OSError:
+            return False
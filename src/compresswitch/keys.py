@@ -0,0 +1,104 @@
+"""Preflight check of the Switch keys nsz needs, so a run fails before launching it.
+
+nsz only finds out that ``prod.keys`` is missing or incomplete once it has
+started, and every job of a batch would fail the same way. KeysPreflight
+reads the keys file nsz would load, checks that the keys it decrypts with
+are present and well-formed, and caches the result: a file whose mtime and
+size are unchanged is not read again, and a changed one is only checked
+again if its content hash changed too.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+KEYS_MISSING_MESSAGE = "Switch keys not found. Place prod.keys in ~/.switch/"
+
+# Keys nsz cannot decrypt without, and their length in bytes
+REQUIRED_KEYS = {
+    "header_key": 32,
+    "aes_kek_generation_source": 16,
+    "aes_key_generation_source": 16,
+    "titlekek_source": 16,
+    "key_area_key_application_source": 16,
+}
+_MASTER_KEY = re.compile(r"master_key_[0-9a-f]{2}")
+_HEX = re.compile(r"[0-9a-fA-F]*")
+
+
+def default_keys_paths() -> list[Path]:
+    """Return the keys files nsz looks for, in the order it tries them."""
+    switch_dir = Path.home() / ".switch"
+    return [switch_dir / "prod.keys", switch_dir / "keys.txt"]
+
+
+def parse_keys(text: str) -> dict[str, str]:
+    """Parse ``name = hex`` lines; comments and malformed lines are ignored."""
+    keys = {}
+    for line in text.splitlines():
+        name, sep, value = line.partition("=")
+        if sep and not line.lstrip().startswith(("#", ";")):
+            keys[name.strip().lower()] = value.strip()
+    return keys
+
+
+def validate_keys(keys: dict[str, str]) -> str:
+    """Return what is wrong with ``keys``, or an empty string if nsz can use them."""
+    for name, size in REQUIRED_KEYS.items():
+        value = keys.get(name)
+        if value is None:
+            return f"{name} is missing"
+        if len(value) != size * 2 or not _HEX.fullmatch(value):
+            return f"{name} is not a {size}-byte hex value"
+    master_keys = [name for name in keys if _MASTER_KEY.fullmatch(name)]
+    if not master_keys:
+        return "no master_key_XX is present"
+    for name in master_keys:
+        if len(keys[name]) != 32 or not _HEX.fullmatch(keys[name]):
+            return f"{name} is not a 16-byte hex value"
+    return ""
+
+
+@dataclass(frozen=True)
+class KeysCheck:
+    ok: bool
+    message: str = ""  # why the keys cannot be used
+    path: Path | None = None  # the keys file checked
+
+
+class KeysPreflight:
+    """Validates the first existing file of ``paths``, caching the result."""
+
+    def __init__(self, paths: list[Path] | None = None):
+        self.paths = paths or default_keys_paths()
+        self._stamp: tuple[Path, int, int] | None = None  # (path, mtime_ns, size)
+        self._digest = b""
+        self._result = KeysCheck(False, KEYS_MISSING_MESSAGE)
+
+    def check(self) -> KeysCheck:
+        for path in self.paths:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            stamp = (path, st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp:
+                return self._result
+            try:
+                data = path.read_bytes()
+            except OSError as e:
+                return KeysCheck(False, f"Cannot read {path}: {e.strerror or e}", path)
+            digest = hashlib.blake2b(data).digest()
+            if digest != self._digest or self._result.path != path:
+                problem = validate_keys(parse_keys(data.decode("utf-8", errors="replace")))
+                message = f"Switch keys in {path} are unusable: {problem}" if problem else ""
+                self._result = KeysCheck(not problem, message, path)
+                self._digest = digest
+            self._stamp = stamp
+            return self._result
+        self._stamp = None
+        self._digest = b""
+        return KeysCheck(False, KEYS_MISSING_MESSAGE)
@@ -2,35 +2,89 @@
 
 from __future__ import annotations
 
-import os
 import sys
 
+from compresswitch import startup
+
 
 def _run_nsz_worker() -> None:
-    """Run nsz CLI with the remaining arguments (used in subprocess mode)."""
+    """Run nsz CLI with the remaining arguments (used in subprocess mode).
+
+    ``--nsz-worker --serve FD`` instead starts a persistent pool server that
+    takes jobs over the inherited socket (see compresswitch.pool).
+    """
+    if len(sys.argv) >= 4 and sys.argv[2] == "--serve":
+        from compresswitch.pool import serve
+
+        sock_fd = int(sys.argv[3])
+        sys.argv = [sys.argv[0]]
+        serve(sock_fd)
+        return
+
     # Strip our --nsz-worker flag and pass the rest to nsz
     sys.argv = [sys.argv[0]] + sys.argv[2:]
+    from compresswitch import progress, resources
+
+    resources.apply_from_env()
+
+    progress.install_from_env(sys.argv[1:])
+    startup.watch_first_byte()
     import nsz
 
-    nsz.main()
+    try:
+        nsz.main()
+    finally:
+        progress.finish()
+        startup.mark("exit", final=True)
+
+
+def _pop_profile_flag(argv: list[str]) -> str | None:
+    """Remove ``--profile-startup[=FILE]`` from argv and return the file."""
+    for i, arg in enumerate(argv[1:], 1):
+        if arg == "--profile-startup" or arg.startswith("--profile-startup="):
+            del argv[i]
+            return arg.partition("=")[2] or startup.DEFAULT_PROFILE_PATH
+    return None
 
 
 def main() -> None:
+    # Each entry point below imports only what it needs; keep it that way
+    # (see ``--profile-startup`` and benchmarks/startup_baseline.json).
+    profile_path = _pop_profile_flag(sys.argv)
+    command = sys.argv[1] if len(sys.argv) >= 2 else ""
+    if command == "--nsz-worker":
+        entry = "pool-server" if sys.argv[2:3] == ["--serve"] else "worker"
+    elif command in ("batch", "daemon"):
+        entry = "batch"
+    elif command == "jobs":
+        entry = "jobs"
+    else:
+        entry = "gui"
+    if profile_path:
+        startup.enable(entry, profile_path)
+    else:
+        startup.enable_from_env(entry)
+
     # If invoked as nsz subprocess worker, run nsz instead of the GUI
-    if len(sys.argv) >= 2 and sys.argv[1] == "--nsz-worker":
+    if command == "--nsz-worker":
         _run_nsz_worker()
         return
 
-    # When running from PyInstaller bundle, set GI_TYPELIB_PATH
-    meipass = getattr(sys, "_MEIPASS", None)
-    if meipass:
-        typelib_path = os.path.join(meipass, "gi_typelibs")
-        existing = os.environ.get("GI_TYPELIB_PATH", "")
-        if existing:
-            os.environ["GI_TYPELIB_PATH"] = typelib_path + ":" + existing
-        else:
-            os.environ["GI_TYPELIB_PATH"] = typelib_path
+    # Headless batch mode, the daemon and its client must never import gi
+    if command == "batch":
+        from compresswitch.cli import run_batch
+
+        sys.exit(run_batch(sys.argv[2:]))
+    if command == "daemon":
+        from compresswitch.cli import run_batch
+
+        sys.exit(run_batch(["--serve", *sys.argv[2:]]))
+    if command == "jobs":
+        from compresswitch.cli import run_jobs
+
+        sys.exit(run_jobs(sys.argv[2:]))
 
+    # GI_TYPELIB_PATH for PyInstaller bundles is set by gi_runtime_hook.py
     import gi
 
     gi.require_version("Gtk", "4.0")
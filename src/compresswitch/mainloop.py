@@ -0,0 +1,44 @@
+"""Minimal main loop for running worker callbacks without GLib."""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable
+
+
+class MainLoop:
+    """Runs callbacks posted from any thread on the thread that calls run().
+
+    ``dispatch`` has the same signature as worker.glib_dispatch, so it can
+    be handed to NszWorker and JobScheduler in place of the GLib loop.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._heap: list[tuple[float, int, Callable, tuple]] = []
+        self._seq = itertools.count()
+
+    def dispatch(self, delay: float, callback: Callable, *args) -> None:
+        """Schedule ``callback(*args)`` to run after ``delay`` seconds."""
+        with self._cond:
+            heapq.heappush(
+                self._heap, (time.monotonic() + delay, next(self._seq), callback, args)
+            )
+            self._cond.notify()
+
+    def run(self, until: Callable[[], bool], tick: float = 1.0) -> None:
+        """Run callbacks until ``until()`` is true (checked at least every ``tick``)."""
+        while not until():
+            with self._cond:
+                now = time.monotonic()
+                if not self._heap or self._heap[0][0] > now:
+                    timeout = tick
+                    if self._heap:
+                        timeout = min(tick, self._heap[0][0] - now)
+                    self._cond.wait(timeout)
+                    continue
+                _due, _seq, callback, args = heapq.heappop(self._heap)
+            callback(*args)
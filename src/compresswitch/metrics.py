@@ -0,0 +1,196 @@
+"""Per-job resource metrics and the logs they are exported to.
+
+The nsz process of each job is reaped with wait4, which gives its CPU time
+and peak RSS, and just before that (while it is still a zombie) its
+/proc/<pid>/io is read for the bytes it read and wrote. Pooled jobs are
+reaped by their pool server, which sends the same figures back with the
+exit code. Processes nsz starts itself are only counted once their parent
+has waited for them, and never in the I/O figures.
+
+Finished jobs can be appended to a JSON-lines log and summed up in a
+Prometheus textfile (for node_exporter's textfile collector).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+
+@dataclass
+class ProcessUsage:
+    user_seconds: float = 0.0
+    system_seconds: float = 0.0
+    max_rss_kib: int = 0
+    read_bytes: int = 0  # rchar: bytes read through read(2) and friends
+    written_bytes: int = 0  # wchar
+
+    @classmethod
+    def from_dict(cls, data: dict) -> ProcessUsage:
+        return cls(**{name: data[name] for name in cls.__dataclass_fields__ if name in data})
+
+
+def _read_proc_io(pid: int) -> dict[str, int]:
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            return {
+                key: int(value)
+                for key, _, value in (line.partition(": ") for line in f)
+                if value.strip().isdigit()
+            }
+    except OSError:
+        return {}
+
+
+def wait_with_usage(pid: int, block: bool = True) -> tuple[int, ProcessUsage] | None:
+    """Reap child ``pid``; return its exit code and resource usage.
+
+    Returns None if ``block`` is false and the child is still running.
+    """
+    flags = os.WEXITED | os.WNOWAIT | (0 if block else os.WNOHANG)
+    if os.waitid(os.P_PID, pid, flags) is None:
+        return None
+    io = _read_proc_io(pid)  # Still readable until the child is reaped
+    _pid, status, rusage = os.wait4(pid, 0)
+    usage = ProcessUsage(
+        user_seconds=rusage.ru_utime,
+        system_seconds=rusage.ru_stime,
+        max_rss_kib=rusage.ru_maxrss,
+        read_bytes=io.get("rchar", 0),
+        written_bytes=io.get("wchar", 0),
+    )
+    return os.waitstatus_to_exitcode(status), usage
+
+
+@dataclass
+class JobMetrics:
+    """What one job cost; filled in by NszWorker and JobScheduler."""
+
+    path: str = ""
+    operation: str = ""
+    level: int = 0  # 0 for decompression
+    mode: str = ""  # "block" or "solid" for compression
+    success: bool = False
+    finished: float = field(default_factory=time.time)  # Unix time
+    wall_seconds: float = 0.0  # nsz start to exit, excluding any staging move
+    usage: ProcessUsage | None = None  # None if the process could not be reaped by us
+    input_size: int = 0
+    output_size: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Output size as a fraction of the input size."""
+        return self.output_size / self.input_size if self.input_size else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Input bytes processed per second of wall time."""
+        return self.input_size / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def cpu_seconds(self) -> float:
+        if self.usage is None:
+            return 0.0
+        return self.usage.user_seconds + self.usage.system_seconds
+
+    def summary(self) -> str:
+        """One-line human summary, e.g. for a queue row."""
+        parts = [f"level {self.level}"] if self.level else []
+        parts.append(f"{self.wall_seconds:.1f}s")
+        if self.throughput:
+            parts.append(f"{self.throughput / (1 << 20):.1f} MiB/s")
+        if self.ratio:
+            parts.append(f"{self.ratio:.0%} of original")
+        if self.usage is not None:
+            parts.append(f"CPU {self.cpu_seconds:.1f}s")
+            parts.append(f"peak {self.usage.max_rss_kib // 1024} MiB")
+        return " · ".join(parts)
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["ratio"] = round(self.ratio, 4)
+        data["throughput"] = round(self.throughput)
+        return json.dumps(data, separators=(",", ":"))
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.3f}"
+
+
+def default_metrics_path() -> Path:
+    """Return the job log location in the XDG data directory."""
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return Path(data_home) / "compresswitch" / "jobs.jsonl"
+
+
+class MetricsLog:
+    """Appends JobMetrics to a JSON-lines file and keeps a Prometheus textfile.
+
+    The textfile (if ``prometheus_path`` is set) holds running totals per
+    operation and result since this log was opened and is rewritten
+    atomically after every job.
+    """
+
+    def __init__(self, path: Path | str | None = None, prometheus_path: Path | str | None = None):
+        self.path = Path(path) if path else default_metrics_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        # (operation, result) -> metric name -> total
+        self._totals: defaultdict[tuple[str, str], defaultdict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def record(self, metrics: JobMetrics) -> None:
+        with self._lock:
+            try:
+                self._file.write(metrics.to_json() + "\n")
+                self._file.flush()
+            except (OSError, ValueError):
+                pass  # A full disk must not fail the job
+            if self.prometheus_path is not None:
+                self._add_totals(metrics)
+                try:
+                    self._write_prometheus()
+                except OSError:
+                    pass
+
+    def _add_totals(self, metrics: JobMetrics) -> None:
+        totals = self._totals[(metrics.operation, "success" if metrics.success else "failure")]
+        totals["jobs_total"] += 1
+        totals["wall_seconds_total"] += metrics.wall_seconds
+        totals["cpu_seconds_total"] += metrics.cpu_seconds
+        totals["input_bytes_total"] += metrics.input_size
+        totals["output_bytes_total"] += metrics.output_size
+        if metrics.usage is not None:
+            totals["read_bytes_total"] += metrics.usage.read_bytes
+            totals["written_bytes_total"] += metrics.usage.written_bytes
+            totals["max_rss_bytes"] = max(
+                totals["max_rss_bytes"], metrics.usage.max_rss_kib * 1024
+            )
+
+    def _write_prometheus(self) -> None:
+        names = sorted({name for totals in self._totals.values() for name in totals})
+        lines = []
+        for name in names:
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE compresswitch_job_{name} {kind}")
+            for (operation, result), totals in sorted(self._totals.items()):
+                if name in totals:
+                    lines.append(
+                        f'compresswitch_job_{name}{{operation="{operation}",result="{result}"}}'
+                        f" {_format_value(totals[name])}"
+                    )
+        temp = self.prometheus_path.with_name(self.prometheus_path.name + ".tmp")
+        temp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(temp, self.prometheus_path)
@@ -0,0 +1,206 @@
+"""Queue ordering policies and the job history they estimate runtimes from.
+
+With several jobs in flight the batch ends when its longest job does, so
+starting the long jobs first (longest processing time first) shortens the
+whole run, while starting the short ones first gets finished files out
+sooner. File size alone is a poor measure of how long a job takes:
+decompressing runs several times faster than compressing, and higher
+levels compress more slowly. JobHistory records the throughput of every
+finished job per operation, mode (block or solid compression) and level
+so "estimated" can order by expected runtime instead.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from compresswitch.file_queue import OrderKey, QueueEntry
+
+ORDERS = ("fifo", "shortest", "longest", "estimated")
+ORDER_DESCRIPTIONS = {
+    "fifo": "In the order added",
+    "shortest": "Smallest files first",
+    "longest": "Largest files first",
+    "estimated": "Longest expected runtime first",
+}
+
+# Bytes per second assumed for an operation before any job has been timed
+_DEFAULT_THROUGHPUT = {"compress": 40 * 1024 * 1024, "decompress": 200 * 1024 * 1024}
+# Weight of the newest job in the running throughput average
+_SMOOTHING = 0.3
+# Jobs shorter than this are dominated by start-up cost and not recorded
+_MIN_SECONDS = 1.0
+
+# Replaces the "throughput" table of earlier versions, which had no mode
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_rates (
+    operation TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    bytes_per_second REAL NOT NULL,
+    jobs INTEGER NOT NULL,
+    PRIMARY KEY (operation, mode, level)
+)
+"""
+
+# Levels picked by compresswitch.autolevel, reused for similar files
+_CHOICES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS level_choices (
+    kind TEXT NOT NULL,
+    size_class INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    PRIMARY KEY (kind, size_class, target)
+)
+"""
+
+
+def default_history_path() -> Path:
+    """Return the job history location in the XDG cache directory."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache_home) / "compresswitch" / "history.sqlite3"
+
+
+def _key(operation: str, mode: str, level: int) -> tuple[str, str, int]:
+    # Mode and level only affect compression.
+    if operation == "compress":
+        return operation, mode, level
+    return operation, "", 0
+
+
+def compression_mode(block_compression: bool) -> str:
+    return "block" if block_compression else "solid"
+
+
+class JobHistory:
+    """SQLite record of job throughput per (operation, mode, level).
+
+    Also remembers the levels automatic level tuning settled on.
+    """
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = Path(path) if path else default_history_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.execute(_CHOICES_SCHEMA)
+        self._db.commit()
+        self._rates: dict[tuple[str, str, int], float] = {
+            (operation, mode, level): rate
+            for operation, mode, level, rate in self._db.execute(
+                "SELECT operation, mode, level, bytes_per_second FROM job_rates"
+            )
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def record(
+        self, operation: str, level: int, size: int, seconds: float, mode: str = "block"
+    ) -> None:
+        """Fold the throughput of a finished job into the running average."""
+        if size <= 0 or seconds < _MIN_SECONDS:
+            return
+        key = _key(operation, mode, level)
+        rate = size / seconds
+        with self._lock, self._db:
+            previous = self._rates.get(key)
+            if previous is not None:
+                rate = previous + _SMOOTHING * (rate - previous)
+            self._rates[key] = rate
+            self._db.execute(
+                "INSERT INTO job_rates VALUES (?, ?, ?, ?, 1)"
+                " ON CONFLICT (operation, mode, level) DO UPDATE"
+                " SET bytes_per_second = excluded.bytes_per_second, jobs = jobs + 1",
+                (*key, rate),
+            )
+
+    def throughput(self, operation: str, level: int, mode: str = "block") -> float:
+        """Return the expected bytes per second, from the nearest recorded level.
+
+        Levels recorded in the other mode are only used if this one has none.
+        """
+        key = _key(operation, mode, level)
+        with self._lock:
+            rate = self._rates.get(key)
+            if rate is not None:
+                return rate
+            recorded = [
+                (md != key[1], abs(lv - key[2]), r)
+                for (op, md, lv), r in self._rates.items()
+                if op == operation
+            ]
+        if recorded:
+            return min(recorded)[2]
+        return _DEFAULT_THROUGHPUT[operation]
+
+    def recorded(self, operation: str, mode: str = "block") -> dict[int, float]:
+        """Return the measured bytes per second of ``operation`` in ``mode`` by level."""
+        _op, mode, _level = _key(operation, mode, 0)
+        with self._lock:
+            return {
+                lv: r for (op, md, lv), r in self._rates.items() if op == operation and md == mode
+            }
+
+    def chosen_level(self, kind: str, size_class: int, target: int) -> int | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT level FROM level_choices"
+                " WHERE kind = ? AND size_class = ? AND target = ?",
+                (kind, size_class, target),
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember_level(self, kind: str, size_class: int, target: int, level: int) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO level_choices VALUES (?, ?, ?, ?)",
+                (kind, size_class, target, level),
+            )
+
+
+def entry_size(entry: QueueEntry) -> int:
+    """Return the input size of ``entry``, caching it on the entry."""
+    if entry.size < 0:
+        try:
+            entry.size = entry.path.stat().st_size
+        except OSError:
+            entry.size = 0
+    return entry.size
+
+
+def expected_throughput(
+    operation: str, level: int, mode: str, history: JobHistory | None
+) -> float:
+    """Return the bytes per second a job is expected to run at."""
+    if history is not None:
+        return history.throughput(operation, level, mode)
+    return _DEFAULT_THROUGHPUT[operation]
+
+
+def estimate_seconds(
+    entry: QueueEntry, level: int, history: JobHistory | None, mode: str = "block"
+) -> float:
+    """Return how long converting ``entry`` is expected to take."""
+    return entry_size(entry) / expected_throughput(entry.operation, level, mode, history)
+
+
+def order_key(
+    order: str, level: int = 18, history: JobHistory | None = None, mode: str = "block"
+) -> OrderKey | None:
+    """Return the FileQueue sort key for an ``ORDERS`` policy (None for fifo)."""
+    if order == "shortest":
+        return lambda entry: entry_size(entry)
+    if order == "longest":
+        return lambda entry: -entry_size(entry)
+    if order == "estimated":
+        return lambda entry: -estimate_seconds(entry, level, history, mode)
+    if order == "fifo":
+        return None
+    raise ValueError(f"unknown queue order {order!r}")
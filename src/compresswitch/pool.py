@@ -0,0 +1,370 @@
+"""Persistent nsz worker processes that run jobs in forked children.
+
+Each pool server is started once through ``main._run_nsz_worker`` and pays
+the interpreter start-up, PyInstaller unpacking, nsz import and keys loading
+cost a single time. For every job it forks a child that calls ``nsz.main()``
+with the job arguments and its output redirected to a file descriptor sent
+by the client, so nsz's global state never leaks between jobs.
+
+Client and server talk over a ``SOCK_SEQPACKET`` socket pair: one JSON
+message per packet, with file descriptors attached as ``SCM_RIGHTS``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import traceback
+from dataclasses import asdict
+
+from compresswitch import startup
+from compresswitch.metrics import ProcessUsage, wait_with_usage
+
+_MAX_MESSAGE = 65536
+_MAX_FDS = 4
+
+
+def _send(sock: socket.socket, message: dict, fds: list[int] | None = None) -> None:
+    data = json.dumps(message).encode()
+    if fds:
+        socket.send_fds(sock, [data], fds)
+    else:
+        sock.send(data)
+
+
+def _recv(sock: socket.socket) -> tuple[dict | None, list[int]]:
+    data, fds, _flags, _addr = socket.recv_fds(sock, _MAX_MESSAGE, _MAX_FDS)
+    if not data:
+        for fd in fds:
+            os.close(fd)
+        return None, []
+    return json.loads(data), fds
+
+
+# ── Server side (runs inside the worker process) ─────────────────────
+
+
+def _preload() -> None:
+    """Import nsz up front so forked jobs start warm."""
+    try:
+        import nsz  # noqa: F401
+    except BaseException:
+        # Missing keys or a broken install: leave it to the job child,
+        # which retries the import and reports the error on its output.
+        pass
+
+
+def _run_job(
+    sock: socket.socket, args: list[str], fds: list[int], limits: dict | None
+) -> None:
+    """Forked child: run one nsz invocation and exit. Never returns.
+
+    ``fds`` holds the output fd and, optionally, the progress event fd.
+    ``limits`` are JobLimits to apply first (see compresswitch.resources).
+    """
+    code = 1
+    try:
+        os.setpgid(0, 0)  # Signals to the job reach whatever nsz starts
+        sock.close()
+        if limits:
+            from compresswitch.resources import JobLimits
+
+            JobLimits.from_dict(limits).apply()
+        out_fd = fds[0]
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(out_fd, 2)
+        os.close(devnull)
+        os.close(out_fd)
+
+        sys.argv[:] = [sys.argv[0], *args]
+        if len(fds) > 1:
+            from compresswitch import progress
+
+            progress.install(fds[1], progress.input_path_of(args))
+        startup.enable_from_env("pool-job", since_exec=False)
+        startup.watch_first_byte()
+
+        import nsz
+
+        try:
+            nsz.main()
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            from compresswitch import progress
+
+            progress.finish()
+            # Lets multiprocessing shut down the manager nsz started.
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            startup.mark("exit", final=True)
+        finally:
+            os._exit(code)
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _wait_job(sock: socket.socket, pid: int) -> tuple[int, ProcessUsage] | None:
+    """Wait for the job child, killing it if the client goes away.
+
+    Returns the exit code and resource usage, or None if the client
+    disconnected.
+    """
+    try:
+        # Readable once the child exits, so its exit is noticed at once.
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        pidfd = None  # Before Linux 5.3: poll instead
+    try:
+        while True:
+            done = wait_with_usage(pid, block=False)
+            if done is not None:
+                return done
+            watched = [sock] if pidfd is None else [sock, pidfd]
+            ready, _, _ = select.select(watched, [], [], 0.2 if pidfd is None else None)
+            if sock in ready:
+                # The client never talks while a job runs; readable means EOF.
+                _kill_group(pid)
+                os.waitpid(pid, 0)
+                return None
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def serve(sock_fd: int) -> None:
+    """Serve nsz jobs over the inherited socket until the client hangs up."""
+    sock = socket.socket(fileno=sock_fd)
+    _preload()
+    startup.mark("ready", final=True)
+    while True:
+        try:
+            message, fds = _recv(sock)
+        except (ConnectionError, OSError):
+            return
+        if message is None:
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_job(sock, message["args"], fds, message.get("limits"))
+        try:
+            os.setpgid(pid, pid)  # Also in the child; whichever runs first wins
+        except OSError:
+            pass
+        for fd in fds:
+            os.close(fd)
+        try:
+            _send(sock, {"pid": pid})
+        except OSError:
+            _kill_group(pid)
+            os.waitpid(pid, 0)
+            return
+        done = _wait_job(sock, pid)
+        if done is None:
+            return
+        returncode, usage = done
+        try:
+            _send(sock, {"returncode": returncode, "usage": asdict(usage)})
+        except OSError:
+            return
+
+
+# ── Client side ──────────────────────────────────────────────────────
+
+
+class _Server:
+    """Client handle for one pool server process."""
+
+    def __init__(self) -> None:
+        # Imported here: the worker module imports this one.
+        from compresswitch.worker import _find_nsz_command
+
+        self.sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self.process = subprocess.Popen(
+                _find_nsz_command() + ["--serve", str(child_sock.fileno())],
+                stdin=subprocess.DEVNULL,
+                pass_fds=[child_sock.fileno()],
+                # Out of the terminal's process group: Ctrl+C is the client's
+                # to handle, and the server exits once the client hangs up.
+                start_new_session=True,
+            )
+        except OSError:
+            self.sock.close()
+            raise
+        finally:
+            child_sock.close()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        self.sock.close()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class PooledProcess:
+    """Popen-like handle for a job running in a pool server's child."""
+
+    def __init__(self, pool: WorkerPool, server: _Server, pid: int):
+        self._pool = pool
+        self._server = server
+        self._lock = threading.Lock()
+        self.pid = pid
+        self.returncode: int | None = None
+        self.usage: ProcessUsage | None = None
+
+    def _collect(self, timeout: float | None) -> None:
+        with self._lock:
+            if self.returncode is not None:
+                return
+            ready, _, _ = select.select([self._server.sock], [], [], timeout)
+            if not ready:
+                return
+            try:
+                message, _fds = _recv(self._server.sock)
+            except OSError:
+                message = None
+            if message is None:
+                # The server died under us; treat the job as killed.
+                self.returncode = -signal.SIGKILL
+                self._pool._discard(self._server)
+            else:
+                self.returncode = message["returncode"]
+                if "usage" in message:
+                    self.usage = ProcessUsage.from_dict(message["usage"])
+                self._pool._release(self._server)
+
+    def poll(self) -> int | None:
+        self._collect(0)
+        return self.returncode
+
+    def wait(self, timeout: float | None = None) -> int:
+        self._collect(timeout)
+        if self.returncode is None:
+            raise subprocess.TimeoutExpired(f"nsz worker pid {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig: int) -> None:
+        """Signal the job's process group (the job and anything nsz started)."""
+        if self.returncode is None:
+            try:
+                os.killpg(self.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+
+class WorkerPool:
+    """A pool of long-lived nsz worker processes.
+
+    Servers are started on demand and reused for later jobs; ``size`` is
+    how many are kept warm by ``prestart``.
+    """
+
+    def __init__(self, size: int = 1):
+        self.size = size
+        self._idle: list[_Server] = []
+        self._busy: set[_Server] = set()
+        self._lock = threading.Lock()
+
+    def prestart(self) -> None:
+        """Start servers until ``size`` are idle or busy, so imports overlap."""
+        with self._lock:
+            while len(self._idle) + len(self._busy) < self.size:
+                self._idle.append(_Server())
+
+    def launch(
+        self,
+        args: list[str],
+        stdout_fd: int,
+        progress_fd: int | None = None,
+        limits: dict | None = None,
+    ) -> PooledProcess:
+        """Run ``nsz <args>`` with stdout/stderr going to ``stdout_fd``.
+
+        If ``progress_fd`` is given, structured progress events are written
+        to it (see compresswitch.progress). ``limits`` (JobLimits as a dict)
+        are applied to the job's process.
+        """
+        fds = [stdout_fd] if progress_fd is None else [stdout_fd, progress_fd]
+        server = self._acquire()
+        try:
+            _send(server.sock, {"args": args, "limits": limits}, fds)
+            message, _fds = _recv(server.sock)
+        except OSError:
+            message = None
+        if message is None:
+            self._discard(server)
+            raise OSError("nsz worker process exited unexpectedly")
+        return PooledProcess(self, server, message["pid"])
+
+    def close(self) -> None:
+        """Shut down every server; running jobs are killed by their server."""
+        with self._lock:
+            servers = self._idle + list(self._busy)
+            self._idle.clear()
+            self._busy.clear()
+        for server in servers:
+            server.close()
+
+    def _acquire(self) -> _Server:
+        with self._lock:
+            while self._idle:
+                server = self._idle.pop()
+                if server.alive:
+                    break
+                server.close()
+            else:
+                server = _Server()
+            self._busy.add(server)
+            return server
+
+    def _release(self, server: _Server) -> None:
+        with self._lock:
+            self._busy.discard(server)
+            if len(self._idle) < self.size and server.alive:
+                self._idle.append(server)
+                return
+        server.close()
+
+    def _discard(self, server: _Server) -> None:
+        with self._lock:
+            self._busy.discard(server)
+        server.close()
@@ -0,0 +1,335 @@
+"""Structured progress events between the nsz worker and the GUI.
+
+The worker side replaces enlighten's counters with lightweight trackers
+that never render anything and instead write one JSON object per line to
+a dedicated file descriptor. The GUI side turns those lines back into
+ProgressEvent objects.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+# Name of the environment variable carrying the progress fd for spawned workers
+PROGRESS_FD_ENV = "COMPRESSWITCH_PROGRESS_FD"
+
+# Minimum interval between two events with the same stage
+_EMIT_INTERVAL = 0.1
+
+_NCA_RE = re.compile(r"\b([0-9a-fA-F]{32}\.(?:cnmt\.)?nc[az])\b")
+
+_UNIT_SCALE = {"B": 1, "KiB": 1 << 10, "MiB": 1 << 20, "GiB": 1 << 30}
+
+
+@dataclass
+class ProgressEvent:
+    stage: str = ""  # "compress", "decompress", "verify", "write", ...
+    fraction: float = 0.0  # overall progress of the job, 0.0 - 1.0
+    read: int = 0  # bytes consumed so far
+    written: int = 0  # bytes produced so far
+    total: int = 0  # input size in bytes
+    nca: str = ""  # NCA currently being processed
+
+    @property
+    def percent(self) -> int:
+        return int(self.fraction * 100)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, line: str | bytes) -> ProgressEvent | None:
+        """Parse one event line, or return None if it is not valid."""
+        try:
+            data = json.loads(line)
+            return cls(
+                stage=str(data.get("stage", "")),
+                fraction=min(1.0, max(0.0, float(data.get("fraction", 0.0)))),
+                read=int(data.get("read", 0)),
+                written=int(data.get("written", 0)),
+                total=int(data.get("total", 0)),
+                nca=str(data.get("nca", "")),
+            )
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+
+def _stage_of(desc: str) -> str:
+    desc = desc.lower()
+    if "verif" in desc:
+        return "verify"
+    if "decompress" in desc:
+        return "decompress"
+    if "compress" in desc:
+        return "compress"
+    if "writ" in desc:
+        return "write"
+    return desc.strip()
+
+
+# ── Worker side ──────────────────────────────────────────────────────
+
+
+class _Tracker:
+    """Aggregates counter updates into ProgressEvents written to ``fd``."""
+
+    def __init__(self, fd: int, input_path: str | None):
+        self._fd = fd
+        self._lock = threading.Lock()
+        self._counters: list[_Counter] = []
+        self._input_path = input_path
+        self._input_fd: int | None = None
+        self._total = 0
+        if input_path:
+            try:
+                self._total = os.path.getsize(input_path)
+            except OSError:
+                pass
+        self._stage = ""
+        self._nca = ""
+        self._fraction = 0.0
+        self._last_emit = 0.0
+        self._last_counter: _Counter | None = None
+
+    def set_nca(self, nca: str) -> None:
+        with self._lock:
+            self._nca = nca
+
+    def add(self, counter: _Counter) -> None:
+        with self._lock:
+            self._counters.append(counter)
+
+    def _find_input_fd(self) -> int | None:
+        try:
+            names = os.listdir("/proc/self/fd")
+        except OSError:
+            return None
+        for name in names:
+            try:
+                if os.readlink(f"/proc/self/fd/{name}") == self._input_path:
+                    return int(name)
+            except OSError:
+                continue
+        return None
+
+    def _input_position(self) -> int:
+        """Return how far this process has read into the input file."""
+        if not self._input_path:
+            return 0
+        for _attempt in range(2):
+            if self._input_fd is None:
+                self._input_fd = self._find_input_fd()
+                if self._input_fd is None:
+                    return 0
+            try:
+                if os.readlink(f"/proc/self/fd/{self._input_fd}") == self._input_path:
+                    with open(f"/proc/self/fdinfo/{self._input_fd}") as f:
+                        for line in f:
+                            if line.startswith("pos:"):
+                                return int(line.split()[1])
+            except (OSError, ValueError):
+                pass
+            self._input_fd = None
+        return 0
+
+    def update(self, counter: _Counter, force: bool = False) -> None:
+        with self._lock:
+            stage = self._stage if counter.is_written else _stage_of(counter.desc)
+            now = time.monotonic()
+            if (
+                not force
+                and stage == self._stage
+                and now - self._last_emit < _EMIT_INTERVAL
+            ):
+                return
+            if stage != self._stage:
+                self._fraction = 0.0
+            self._stage = stage
+            self._last_emit = now
+            self._last_counter = counter
+
+            read = sum(
+                c.read_bytes for c in self._counters if _stage_of(c.desc) == stage
+            )
+            written = sum(c.written_bytes for c in self._counters)
+            if self._total:
+                # Bars only cover NCA payloads; the input offset covers
+                # everything nsz reads in this process, so take the larger.
+                position = self._input_position() if stage != "verify" else 0
+                fraction = max(read, position) / self._total
+            elif counter.total:
+                fraction = counter.count / counter.total
+            else:
+                fraction = 0.0
+            # Never move backwards within a stage
+            self._fraction = max(self._fraction, min(1.0, fraction))
+            event = ProgressEvent(
+                stage=stage,
+                fraction=self._fraction,
+                read=read,
+                written=written,
+                total=self._total,
+                nca=self._nca,
+            )
+            try:
+                os.write(self._fd, (event.to_json() + "\n").encode())
+            except OSError:
+                pass
+
+    def flush(self) -> None:
+        if self._last_counter is not None:
+            self.update(self._last_counter, force=True)
+
+
+def _noop(*_args, **_kwargs) -> None:
+    return None
+
+
+class _SubCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __getattr__(self, _name):
+        return _noop
+
+    def update(self, incr: int = 1, force: bool = False) -> None:
+        self.count += incr
+
+
+class _Counter:
+    """Stand-in for enlighten.Counter that reports instead of rendering."""
+
+    def __init__(self, total=None, desc=None, unit=None, **_kwargs):
+        self.total = total or 0
+        self.desc = desc or ""
+        self.unit = unit or ""
+        self.count = 0
+        self._base = 0  # bytes of earlier items that reused this counter
+        self._last_total = self.total
+        self._subcounters: list[_SubCounter] = []
+        _tracker.add(self)
+
+    def __getattr__(self, _name):
+        # Anything else enlighten offers (formatting, colors...) is a no-op.
+        return _noop
+
+    @property
+    def is_written(self) -> bool:
+        return "written" in self.desc.lower()
+
+    @property
+    def _scale(self) -> int:
+        return _UNIT_SCALE.get(self.unit.strip(), 1)
+
+    @property
+    def read_bytes(self) -> int:
+        if self.is_written:
+            return 0
+        return self._base + int(self.count * self._scale)
+
+    @property
+    def written_bytes(self) -> int:
+        if self.is_written:
+            return int(self.count * self._scale)
+        return sum(int(sub.count * self._scale) for sub in self._subcounters)
+
+    def _check_total(self) -> None:
+        # nsz reuses one solid-compression bar for consecutive NCAs and
+        # just swaps its total; bank the finished item's size first.
+        if self.total != self._last_total:
+            if self.count and self._last_total:
+                self._base += int(self._last_total * self._scale)
+            self._last_total = self.total
+
+    def add_subcounter(self, *_args, **_kwargs) -> _SubCounter:
+        sub = _SubCounter()
+        self._subcounters.append(sub)
+        return sub
+
+    def update(self, incr: int = 1, force: bool = False) -> None:
+        self.count += incr
+        self.refresh()
+
+    def refresh(self, *_args, **_kwargs) -> None:
+        self._check_total()
+        _tracker.update(self)
+
+    def close(self, *_args, **_kwargs) -> None:
+        self._check_total()
+        _tracker.update(self, force=True)
+
+
+class _Manager:
+    """Stand-in for enlighten.Manager."""
+
+    def __init__(self, *_args, **_kwargs):
+        pass
+
+    def __getattr__(self, _name):
+        return _noop
+
+    def counter(self, *_args, **kwargs) -> _Counter:
+        return _Counter(**kwargs)
+
+
+class _NcaSniffer:
+    """Wraps a text stream and notes NCA names printed by nsz."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        m = _NCA_RE.search(text)
+        if m:
+            _tracker.set_nca(m.group(1))
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_tracker: _Tracker | None = None
+
+
+def install(fd: int, input_path: str | None = None) -> None:
+    """Route nsz's enlighten progress bars to JSON events on ``fd``.
+
+    Must be called in the worker process before nsz creates its bars.
+    nsz looks ``enlighten.Counter`` up at call time, so patching after
+    nsz has been imported is fine.
+    """
+    global _tracker
+    _tracker = _Tracker(fd, os.path.realpath(input_path) if input_path else None)
+
+    import enlighten
+
+    enlighten.Counter = _Counter
+    enlighten.Manager = _Manager
+    enlighten.get_manager = _Manager
+    sys.stdout = _NcaSniffer(sys.stdout)
+
+
+def install_from_env(args: list[str]) -> None:
+    """Install the progress shim if the parent passed a progress fd."""
+    value = os.environ.pop(PROGRESS_FD_ENV, "")
+    if value.isdigit():
+        install(int(value), input_path_of(args))
+
+
+def input_path_of(args: list[str]) -> str | None:
+    """Return the input file of an nsz argument list, if it names one."""
+    if args and os.path.isfile(args[-1]):
+        return args[-1]
+    return None
+
+
+def finish() -> None:
+    """Emit a final event so the last state is never throttled away."""
+    if _tracker is not None:
+        _tracker.flush()
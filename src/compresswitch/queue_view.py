@@ -0,0 +1,270 @@
+"""GObject wrappers and list rows for showing the queue in a Gtk.ListView."""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Iterable
+
+import gi
+
+gi.require_version("Gtk", "4.0")
+from gi.repository import Gio, GLib, GObject, Gtk, Pango
+
+from compresswitch.file_queue import QueueEntry, Status
+from compresswitch.progress import ProgressEvent
+from compresswitch.utils import format_duration, format_rate
+
+_STATUS_ICONS = {
+    Status.PENDING: "content-loading-symbolic",
+    Status.PROCESSING: "media-playback-start-symbolic",
+    Status.VERIFYING: "system-search-symbolic",
+    Status.REMOTE: "network-server-symbolic",
+    Status.DONE: "emblem-ok-symbolic",
+    Status.ERROR: "dialog-error-symbolic",
+    Status.SKIPPED: "emblem-default-symbolic",
+}
+
+# Seconds between two speed samples, and the weight of the newest one
+_SPEED_WINDOW = 0.5
+_SPEED_SMOOTHING = 0.3
+
+
+class QueueItem(GObject.Object):
+    """Observable view of one QueueEntry.
+
+    Properties only change (and notify) when their value actually changes,
+    so a bound row redraws just the widgets that need it.
+    """
+
+    __gtype_name__ = "CompressSwitchQueueItem"
+
+    title = GObject.Property(type=str, default="")
+    subtitle = GObject.Property(type=str, default="")  # Pango markup
+    icon_name = GObject.Property(type=str, default=_STATUS_ICONS[Status.PENDING])
+    fraction = GObject.Property(type=float, default=0.0)
+    detail = GObject.Property(type=str, default="")
+    active = GObject.Property(type=bool, default=False)
+    paused = GObject.Property(type=bool, default=False)
+    pause_icon = GObject.Property(type=str, default="media-playback-pause-symbolic")
+    pause_tooltip = GObject.Property(type=str, default="Pause")
+
+    def __init__(self, entry: QueueEntry):
+        super().__init__()
+        self.entry = entry
+        self._speed = 0.0
+        self._sample: tuple[float, int] | None = None  # (time, bytes read)
+        self.remaining: float | None = None  # seconds left, shown with the next event
+        self._set("title", entry.path.name)
+        self.sync()
+
+    def _set(self, name: str, value) -> None:
+        if self.get_property(name) != value:
+            self.set_property(name, value)
+
+    def sync(self) -> None:
+        """Refresh the status-dependent properties from the entry."""
+        entry = self.entry
+        self._set("icon-name", _STATUS_ICONS.get(entry.status, "content-loading-symbolic"))
+        if entry.status == Status.ERROR and entry.error_message:
+            subtitle = entry.error_message
+        elif entry.status == Status.SKIPPED:
+            subtitle = entry.error_message or f"{entry.target} is already up to date"
+        elif entry.status == Status.VERIFYING:
+            subtitle = f"→ {entry.target}  (verifying)"
+        elif entry.status == Status.DONE and entry.metrics is not None:
+            subtitle = f"→ {entry.target}  ({entry.metrics.summary()})"
+        else:
+            subtitle = f"→ {entry.target}  ({entry.operation})"
+        subtitle = GLib.markup_escape_text(subtitle)
+        if entry.status == Status.ERROR and entry.log is not None and entry.log.exists():
+            uri = GLib.markup_escape_text(entry.log.as_uri())
+            subtitle += f'  <a href="{uri}">Show log</a>'
+        self._set("subtitle", subtitle)
+        processing = entry.status in (Status.PROCESSING, Status.VERIFYING)
+        self._set("active", processing)
+        self.set_paused(False)
+        if processing:
+            self._speed = 0.0
+            self._sample = None
+            self.remaining = None
+        if entry.status == Status.VERIFYING:
+            self._set("fraction", 0.0)
+            self._set("detail", "Verifying")
+        elif processing:
+            self._set("fraction", entry.progress / 100)
+            self._set("detail", f"{entry.progress}%")
+        elif entry.status in (Status.DONE, Status.SKIPPED):
+            self._set("fraction", 1.0)
+
+    def set_paused(self, paused: bool) -> None:
+        self._set("paused", paused)
+        self._set(
+            "pause-icon",
+            "media-playback-start-symbolic" if paused else "media-playback-pause-symbolic",
+        )
+        self._set("pause-tooltip", "Resume" if paused else "Pause")
+        if paused:
+            self._speed = 0.0
+            self._sample = None
+            self._set("detail", f"{int(self.fraction * 100)}% · Paused")
+
+    def update_progress(self, event: ProgressEvent) -> None:
+        """Show a progress event, including a smoothed processing speed."""
+        now = time.monotonic()
+        if self._sample is None:
+            self._sample = (now, event.read)
+        elif now - self._sample[0] >= _SPEED_WINDOW:
+            then, read = self._sample
+            rate = max(0.0, (event.read - read) / (now - then))
+            if self._speed:
+                rate = self._speed + _SPEED_SMOOTHING * (rate - self._speed)
+            self._speed = rate
+            self._sample = (now, event.read)
+        if event.stage == "tune":
+            self._set("detail", "Choosing compression level…")
+            return
+        self._set("fraction", event.fraction)
+        detail = f"{event.percent}%"
+        if self.entry.status == Status.VERIFYING:
+            detail = f"Verifying · {detail}"
+        if self.paused:
+            detail += " · Paused"
+        elif self._speed:
+            detail += f" · {format_rate(self._speed)}"
+            if self.remaining is not None and self.entry.status == Status.PROCESSING:
+                detail += f" · {format_duration(self.remaining)} left"
+        self._set("detail", detail)
+
+
+class QueueStore:
+    """A Gio.ListStore of QueueItems with O(1) lookup by entry id."""
+
+    def __init__(self) -> None:
+        self.store = Gio.ListStore(item_type=QueueItem)
+        self._items: dict[int, QueueItem] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, entry_id: int) -> QueueItem | None:
+        return self._items.get(entry_id)
+
+    def append(self, entries: Iterable[QueueEntry]) -> None:
+        """Append entries with a single items-changed emission."""
+        items = [QueueItem(entry) for entry in entries]
+        for item in items:
+            self._items[item.entry.id] = item
+        if items:
+            self.store.splice(self.store.get_n_items(), 0, items)
+
+    def remove(self, entry_id: int) -> None:
+        item = self._items.pop(entry_id, None)
+        if item is None:
+            return
+        found, position = self.store.find(item)
+        if found:
+            self.store.remove(position)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.store.remove_all()
+
+
+class QueueRow(Gtk.Box):
+    """Row widget recycled by the list view for whichever item is visible."""
+
+    def __init__(self, on_remove: Callable[[int], None], on_pause: Callable[[int], None]):
+        super().__init__(
+            spacing=12, margin_top=8, margin_bottom=8, margin_start=12, margin_end=6
+        )
+        self.item: QueueItem | None = None
+        self._bindings: list[GObject.Binding] = []
+
+        self._icon = Gtk.Image(valign=Gtk.Align.CENTER)
+        self.append(self._icon)
+
+        text_box = Gtk.Box(
+            orientation=Gtk.Orientation.VERTICAL,
+            spacing=2,
+            hexpand=True,
+            valign=Gtk.Align.CENTER,
+        )
+        self._title = Gtk.Label(xalign=0, ellipsize=Pango.EllipsizeMode.MIDDLE)
+        self._subtitle = Gtk.Label(
+            xalign=0, ellipsize=Pango.EllipsizeMode.END, use_markup=True
+        )
+        self._subtitle.add_css_class("dim-label")
+        self._subtitle.add_css_class("caption")
+        self._progress = Gtk.ProgressBar(margin_top=4)
+        self._detail = Gtk.Label(xalign=0)
+        self._detail.add_css_class("dim-label")
+        self._detail.add_css_class("caption")
+        self._detail.add_css_class("numeric")
+        for widget in (self._title, self._subtitle, self._progress, self._detail):
+            text_box.append(widget)
+        self.append(text_box)
+
+        self._pause_btn = Gtk.Button(valign=Gtk.Align.CENTER)
+        self._pause_btn.add_css_class("flat")
+        self._pause_btn.connect("clicked", self._on_pause_clicked)
+        self.append(self._pause_btn)
+        self._on_pause = on_pause
+
+        remove_btn = Gtk.Button(
+            icon_name="edit-delete-symbolic",
+            valign=Gtk.Align.CENTER,
+            tooltip_text="Remove",
+        )
+        remove_btn.add_css_class("flat")
+        remove_btn.connect("clicked", self._on_remove_clicked)
+        self.append(remove_btn)
+        self._on_remove = on_remove
+
+    def _on_remove_clicked(self, _button: Gtk.Button) -> None:
+        if self.item is not None:
+            self._on_remove(self.item.entry.id)
+
+    def _on_pause_clicked(self, _button: Gtk.Button) -> None:
+        if self.item is not None:
+            self._on_pause(self.item.entry.id)
+
+    def bind(self, item: QueueItem) -> None:
+        self.item = item
+        flags = GObject.BindingFlags.SYNC_CREATE
+        self._bindings = [
+            item.bind_property("title", self._title, "label", flags),
+            item.bind_property("subtitle", self._subtitle, "label", flags),
+            item.bind_property("icon-name", self._icon, "icon-name", flags),
+            item.bind_property("fraction", self._progress, "fraction", flags),
+            item.bind_property("detail", self._detail, "label", flags),
+            item.bind_property("active", self._progress, "visible", flags),
+            item.bind_property("active", self._detail, "visible", flags),
+            item.bind_property("active", self._pause_btn, "visible", flags),
+            item.bind_property("pause-icon", self._pause_btn, "icon-name", flags),
+            item.bind_property("pause-tooltip", self._pause_btn, "tooltip-text", flags),
+        ]
+
+    def unbind(self) -> None:
+        for binding in self._bindings:
+            binding.unbind()
+        self._bindings = []
+        self.item = None
+
+
+def create_list_view(
+    model: QueueStore,
+    on_remove: Callable[[int], None],
+    on_pause: Callable[[int], None],
+) -> Gtk.ListView:
+    """Build a ListView over ``model`` that only realizes visible rows.
+
+    ``on_remove`` and ``on_pause`` get the entry id of the row whose button
+    was clicked; the pause button only shows on running entries.
+    """
+    factory = Gtk.SignalListItemFactory()
+    factory.connect(
+        "setup", lambda _f, item: item.set_child(QueueRow(on_remove, on_pause))
+    )
+    factory.connect("bind", lambda _f, item: item.get_child().bind(item.get_item()))
+    factory.connect("unbind", lambda _f, item: item.get_child().unbind())
+    return Gtk.ListView(model=Gtk.NoSelection(model=model.store), factory=factory)
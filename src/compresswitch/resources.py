@@ -0,0 +1,199 @@
+"""CPU budget, affinity and priority limits for nsz jobs.
+
+A ResourcePolicy splits a CPU budget between the jobs running at once:
+each job gets a thread count for nsz (``-t``), optionally its own slice of
+CPUs to run on, and a nice value and I/O scheduling class. The limits are
+applied by the job's own process before nsz is imported, passed through
+the environment for spawned workers and with the job message for pooled
+ones (see compresswitch.pool), so they never affect this process.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+# Environment variable carrying JobLimits as JSON for spawned workers
+LIMITS_ENV = "COMPRESSWITCH_LIMITS"
+
+IONICE_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+# nsz already multithreads a single job, so running more than a handful of
+# jobs at once mostly adds memory pressure and disk contention.
+MAX_DEFAULT_JOBS = 8
+
+# ioprio_set(2) has no wrapper in Python or glibc
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314, "ppc64le": 273}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def allowed_cpus() -> list[int]:
+    """Return the CPUs this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return list(range(os.cpu_count() or 1))
+
+
+def _cgroup_cpu_limit() -> float | None:
+    """Return the CPU quota of our cgroup in cores, or None if unlimited."""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()[:2]  # v2
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        v1 = Path("/sys/fs/cgroup/cpu")
+        quota = int((v1 / "cpu.cfs_quota_us").read_text())
+        period = int((v1 / "cpu.cfs_period_us").read_text())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """Return how many CPUs we can use, honouring affinity and cgroup quotas."""
+    cpus = len(allowed_cpus())
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def default_max_jobs() -> int:
+    """Return the default number of concurrent jobs for this machine."""
+    return max(1, min(MAX_DEFAULT_JOBS, available_cpus() // 4))
+
+
+@dataclass
+class JobLimits:
+    """Limits for one nsz job; empty fields leave the default alone."""
+
+    threads: int = 0  # nsz -t; 0 lets nsz use every core
+    cpus: list[int] = field(default_factory=list)  # CPU affinity
+    nice: int | None = None
+    ionice: str = ""  # a key of IONICE_CLASSES
+    ionice_level: int = 4  # 0 (highest) - 7, for realtime and best-effort
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> JobLimits:
+        return cls(**{name: data[name] for name in cls.__dataclass_fields__ if name in data})
+
+    def apply(self) -> None:
+        """Apply the limits to the calling process; failures are ignored."""
+        if self.cpus:
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except (AttributeError, OSError):
+                pass
+        if self.nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+            except OSError:
+                pass  # Raising priority needs privileges
+        if self.ionice:
+            _set_ioprio(IONICE_CLASSES[self.ionice], self.ionice_level)
+
+
+def _set_ioprio(io_class: int, level: int) -> None:
+    number = _SYS_IOPRIO_SET.get(platform.machine())
+    if number is None:
+        return
+    import ctypes
+
+    data = 0 if io_class == IONICE_CLASSES["idle"] else max(0, min(7, level))
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.syscall(number, _IOPRIO_WHO_PROCESS, 0, (io_class << _IOPRIO_CLASS_SHIFT) | data)
+    except (OSError, AttributeError):
+        pass
+
+
+def apply_from_env() -> None:
+    """Apply the JobLimits a spawned worker was given in its environment."""
+    raw = os.environ.pop(LIMITS_ENV, "")
+    if not raw:
+        return
+    try:
+        JobLimits.from_dict(json.loads(raw)).apply()
+    except (ValueError, TypeError, KeyError):
+        pass
+
+
+class ResourcePolicy:
+    """Divides ``cpu_budget`` CPUs (0: all available) between concurrent jobs.
+
+    Each job gets ``threads_per_job`` nsz threads (0: an equal share of the
+    budget). With ``pin`` each job slot runs on its own CPUs; otherwise a
+    budget smaller than the machine is enforced by an affinity mask all
+    jobs share. ``nice`` and ``ionice`` apply to every job.
+    """
+
+    def __init__(
+        self,
+        *,
+        cpu_budget: int = 0,
+        threads_per_job: int = 0,
+        pin: bool = False,
+        nice: int | None = None,
+        ionice: str = "",
+        ionice_level: int = 4,
+    ):
+        if ionice and ionice not in IONICE_CLASSES:
+            raise ValueError(f"unknown I/O class {ionice!r}")
+        self.cpu_budget = cpu_budget
+        self.threads_per_job = threads_per_job
+        self.pin = pin
+        self.nice = nice
+        self.ionice = ionice
+        self.ionice_level = ionice_level
+
+    def budget(self) -> int:
+        available = available_cpus()
+        return min(self.cpu_budget, available) if self.cpu_budget > 0 else available
+
+    def threads_for(self, max_jobs: int) -> int:
+        """Return the nsz thread count of each of ``max_jobs`` concurrent jobs."""
+        return self.threads_per_job or max(1, self.budget() // max(1, max_jobs))
+
+    def job_limits(self, slot: int, max_jobs: int) -> JobLimits:
+        """Return the limits for the job running in ``slot`` (0 to max_jobs - 1)."""
+        budget = self.budget()
+        threads = self.threads_for(max_jobs)
+        cpus = allowed_cpus()[:budget]
+        if self.pin:
+            start = slot * threads % len(cpus)
+            cpus = sorted({cpus[(start + i) % len(cpus)] for i in range(threads)})
+        elif budget >= len(allowed_cpus()):
+            cpus = []  # Nothing to restrict
+        return self._limits(threads, cpus)
+
+    def verify_limits(self, max_jobs: int) -> JobLimits:
+        """Return the limits for an ``nsz -V`` run alongside ``max_jobs`` jobs.
+
+        Verification has no slot of its own, so it is never pinned: it gets
+        one job's thread share and the budget's affinity mask, leaving the
+        kernel to fit it in beside the conversions rather than piling it onto
+        the CPUs of one of them.
+        """
+        budget = self.budget()
+        cpus = [] if budget >= len(allowed_cpus()) else allowed_cpus()[:budget]
+        return self._limits(self.threads_for(max_jobs), cpus)
+
+    def _limits(self, threads: int, cpus: list[int]) -> JobLimits:
+        return JobLimits(
+            threads=threads,
+            cpus=cpus,
+            nice=self.nice,
+            ionice=self.ionice,
+            ionice_level=self.ionice_level,
+        )
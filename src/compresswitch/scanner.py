@@ -0,0 +1,190 @@
+"""Recursive discovery of Switch files off the UI thread."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable
+
+from compresswitch.utils import ALL_EXTENSIONS
+from compresswitch.worker import Dispatch, glib_dispatch
+
+# Found paths are handed over once this many are buffered...
+_BATCH_SIZE = 256
+# ...or this many seconds after the previous hand-over, whichever is first
+_BATCH_INTERVAL = 0.1
+
+
+def _is_switch_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in ALL_EXTENSIONS
+
+
+class FolderScanner:
+    """Finds supported Switch files under files and directories in the background.
+
+    Directories are listed concurrently on a small thread pool with
+    os.scandir, which on most filesystems reports entry types without a
+    stat per file. Found paths are delivered in batches through
+    ``dispatch`` (the GLib main loop unless told otherwise), in the order
+    of ``roots``: the files under a directory, sorted, once it has been
+    searched completely and every root before it has been delivered.
+    ``found`` and ``scanned`` can be read at any time for a progress count.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[Path],
+        *,
+        on_batch: Callable[[list[Path]], None] | None = None,
+        on_finished: Callable[[bool], None] | None = None,
+        dispatch: Dispatch | None = None,
+        max_workers: int = 4,
+    ):
+        self.roots = list(roots)
+        self.on_batch = on_batch
+        self.on_finished = on_finished
+        self.found = 0  # supported files found so far
+        self.scanned = 0  # directories listed so far
+        self.errors = 0  # directories that could not be read
+
+        self._dispatch = dispatch or glib_dispatch
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="compresswitch-scan"
+        )
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._left = [1] * len(self.roots)  # listings still to do per root
+        self._found: list[list[Path]] = [[] for _ in self.roots]  # not delivered yet
+        self._next_root = 0  # first root not delivered yet
+        self._last_flush = 0.0
+        self._cancelled = False
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def start(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self.roots:
+            self._finish()
+            return
+        with self._lock:
+            self._outstanding = len(self.roots)
+        for index, root in enumerate(self.roots):
+            self._executor.submit(self._scan_root, index, root)
+
+    def cancel(self) -> None:
+        """Stop scanning; on_finished(True) fires once running listings return."""
+        self._cancelled = True
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until the scan has finished; return False on timeout."""
+        return self._done.wait(timeout)
+
+    # ── Worker threads ───────────────────────────────────────────────
+
+    def _scan_root(self, index: int, root: Path) -> None:
+        try:
+            if self._cancelled:
+                return
+            if root.is_dir():
+                self._submit(index, root)
+            elif root.is_file() and _is_switch_name(root.name):
+                self._add(index, [root])
+        finally:
+            self._task_done(index)
+
+    def _submit(self, index: int, directory: Path) -> None:
+        with self._lock:
+            self._outstanding += 1
+            self._left[index] += 1
+        self._executor.submit(self._scan_dir, index, directory)
+
+    def _scan_dir(self, index: int, directory: Path) -> None:
+        try:
+            if self._cancelled:
+                return
+            files = []
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            # Never follow directory symlinks: they can loop.
+                            if entry.is_dir(follow_symlinks=False):
+                                self._submit(index, Path(entry.path))
+                            elif _is_switch_name(entry.name) and entry.is_file():
+                                files.append(Path(entry.path))
+                        except OSError:
+                            continue
+            except OSError:
+                with self._lock:
+                    self.errors += 1
+            with self._lock:
+                self.scanned += 1
+            self._add(index, files)
+        finally:
+            self._task_done(index)
+
+    def _add(self, index: int, paths: list[Path]) -> None:
+        with self._lock:
+            self.found += len(paths)
+            self._found[index] += paths
+            if time.monotonic() - self._last_flush >= _BATCH_INTERVAL:
+                self._hand_over([])  # Only moves the progress counts
+
+    def _hand_over(self, batch: list[Path]) -> None:
+        # Called with the lock held, so batches are dispatched in order.
+        # One main-loop callback per _BATCH_SIZE paths keeps the UI drawing
+        # between them. Empty batches still go out so progress counts move.
+        self._last_flush = time.monotonic()
+        for start in range(0, max(1, len(batch)), _BATCH_SIZE):
+            self._dispatch(0, self._deliver, batch[start : start + _BATCH_SIZE])
+
+    def _task_done(self, index: int) -> None:
+        with self._lock:
+            self._outstanding -= 1
+            self._left[index] -= 1
+            batch: list[Path] = []
+            while self._next_root < len(self.roots) and not self._left[self._next_root]:
+                batch += sorted(self._found[self._next_root])
+                self._found[self._next_root] = []
+                self._next_root += 1
+            if batch and not self._cancelled:
+                self._hand_over(batch)
+            if self._outstanding:
+                return
+        self._executor.shutdown(wait=False)
+        self._dispatch(0, self._finish)
+
+    # ── Delivery (dispatch thread) ───────────────────────────────────
+
+    def _deliver(self, batch: list[Path]) -> bool:
+        if self.on_batch and not self._cancelled:
+            self.on_batch(batch)
+        return False
+
+    def _finish(self) -> bool:
+        self._done.set()
+        if self.on_finished:
+            self.on_finished(self._cancelled)
+        return False
+
+
+def _call_now(_delay: float, callback: Callable, *args) -> None:
+    callback(*args)
+
+
+def scan_paths(roots: Iterable[Path], max_workers: int = 4) -> list[Path]:
+    """Return every supported file under ``roots``, in the order of ``roots``
+    and sorted within each directory; blocks until done."""
+    found: list[Path] = []
+    scanner = FolderScanner(
+        roots, on_batch=found.extend, dispatch=_call_now, max_workers=max_workers
+    )
+    scanner.start()
+    scanner.wait()
+    return found
@@ -0,0 +1,734 @@
+"""Concurrent job scheduling on top of the file queue."""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Iterable
+
+from compresswitch.coordination import LeaseCoordinator, SharedResult
+from compresswitch.eta import Estimate, EtaEstimator
+from compresswitch.file_queue import FileQueue, QueueEntry, Status
+from compresswitch.joblog import log_path
+from compresswitch.keys import KeysPreflight
+from compresswitch.metrics import MetricsLog
+from compresswitch.ordering import JobHistory, compression_mode, entry_size, order_key
+from compresswitch.pool import WorkerPool
+from compresswitch.progress import ProgressEvent
+from compresswitch.resources import ResourcePolicy, default_max_jobs
+from compresswitch.staging import OutputMover, make_job_dir, remove_job_dir
+from compresswitch.uptodate import Fingerprints, Freshness, check_output
+from compresswitch.utils import VERIFY_EXTENSIONS
+from compresswitch.worker import Dispatch, NszWorker, glib_dispatch
+
+# How often to look for other hosts' results once there is no local work.
+REMOTE_POLL_INTERVAL = 0.5
+
+
+class JobScheduler:
+    """Keeps up to ``max_jobs`` NszWorker jobs in flight over a FileQueue.
+
+    Worker callbacks are delivered through ``dispatch`` (the GLib main loop
+    unless told otherwise), so all scheduler state is only touched from
+    that thread.
+
+    Before an entry is launched its output is checked (see
+    compresswitch.uptodate). With ``skip_up_to_date``, a current output
+    marks the entry SKIPPED without running nsz, and a stale one is only
+    replaced if ``fingerprints`` shows this app wrote it; without, every
+    existing output is replaced. nsz never overwrites an existing output,
+    so replacing means removing the old file first. Files that are
+    themselves in the queue are never removed. An entry whose output
+    another job is still writing (inputs of the same name in different
+    folders) fails instead of touching that file.
+
+    Each run hands out entries in ``order`` (see compresswitch.ordering).
+    With a ``history``, the throughput of every successful job is recorded
+    there, which is what the "estimated" order goes by.
+
+    With a ``scratch_dir``, nsz writes each output into its own folder
+    there and an OutputMover takes it to the real destination while the
+    next job already runs (see compresswitch.staging). The entry stays
+    PROCESSING until its output has arrived.
+
+    With ``resources``, each job runs within the share of the CPU budget
+    of the slot it occupies (see compresswitch.resources).
+
+    With a ``log_dir``, nsz's output for each entry is appended to a log
+    file there, which ``entry.log`` points to (see compresswitch.joblog).
+
+    estimate() gives the time left of each running job and of the whole
+    run, from the jobs' live speed and the throughput in ``history``
+    (see compresswitch.eta).
+
+    Every job that ran leaves its JobMetrics on ``entry.metrics``; with a
+    ``metrics_log`` those of finished and failed (not cancelled) jobs are
+    also written there.
+
+    With ``verify``, every output nsz can check is verified with
+    ``nsz -V`` (up to ``verify_jobs`` at once) before it counts as done,
+    while the freed slot already converts the next entry. The entry is
+    VERIFYING meanwhile, and on_started fires again when that begins. A
+    staged output is verified on the scratch directory, before it moves.
+
+    With ``keys``, the Switch keys are checked before any job is launched
+    (see compresswitch.keys); if they are unusable, the run stops without
+    starting nsz and ``on_keys_error`` gets the reason. The check is
+    cached, so it only costs a stat until the keys file changes.
+
+    Running jobs can be paused one at a time or all together; pausing the
+    whole run also holds back new jobs until it is resumed.
+
+    With a ``coordinator``, hosts running the same batch share it (see
+    compresswitch.coordination): an entry is only launched once its lease
+    is taken, and its result is recorded for the other hosts. Entries
+    another host holds are REMOTE until its result appears, which settles
+    them here too, or its lease expires and they are run here after all.
+    The run lasts until no entry is REMOTE; once nothing runs here, their
+    results are looked for every REMOTE_POLL_INTERVAL seconds instead of
+    at every heartbeat.
+    """
+
+    def __init__(
+        self,
+        queue: FileQueue,
+        *,
+        max_jobs: int | None = None,
+        use_pool: bool = True,
+        on_started: Callable[[QueueEntry], None] | None = None,
+        on_progress: Callable[[QueueEntry, ProgressEvent], None] | None = None,
+        on_done: Callable[[QueueEntry, bool, str], None] | None = None,
+        on_finished: Callable[[], None] | None = None,
+        on_keys_error: Callable[[str], None] | None = None,
+        dispatch: Dispatch | None = None,
+        skip_up_to_date: bool = True,
+        fingerprints: Fingerprints | None = None,
+        order: str = "fifo",
+        history: JobHistory | None = None,
+        scratch_dir: str = "",
+        metrics_log: MetricsLog | None = None,
+        resources: ResourcePolicy | None = None,
+        verify: bool = False,
+        verify_jobs: int = 1,
+        keys: KeysPreflight | None = None,
+        log_dir: str = "",
+        coordinator: LeaseCoordinator | None = None,
+    ):
+        self.queue = queue
+        self.max_jobs = max_jobs or default_max_jobs()
+        self.use_pool = use_pool
+        self.on_started = on_started
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_finished = on_finished
+        self.on_keys_error = on_keys_error
+        self.dispatch = dispatch
+        self.skip_up_to_date = skip_up_to_date
+        self.fingerprints = fingerprints
+        self.order = order
+        self.history = history
+        self.scratch_dir = scratch_dir
+        self.metrics_log = metrics_log
+        self.resources = resources
+        self.verify = verify
+        self.verify_jobs = verify_jobs
+        self.keys = keys
+        self.log_dir = log_dir
+        self.coordinator = coordinator
+
+        self._workers: dict[int, NszWorker] = {}
+        self._verifiers: dict[int, NszWorker] = {}  # entry id -> its nsz -V job
+        self._to_verify: deque[QueueEntry] = deque()
+        self._staged: dict[int, Path] = {}  # entry id -> its scratch folder
+        self._slots: dict[int, int] = {}  # entry id -> its job slot
+        self._moving: dict[Path, QueueEntry] = {}  # staged output -> entry
+        self._writing: dict[Path, QueueEntry] = {}  # output being produced -> entry
+        self._remote: dict[int, QueueEntry] = {}  # entries another host holds
+        self._lost: set[int] = set()  # entries whose lease another host took over
+        self._elsewhere = 0  # entries another host converted
+        self._heartbeat_due: float | None = None  # monotonic time of the next heartbeat
+        self._mover: OutputMover | None = None
+        self._eta = EtaEstimator(history)
+        self._pool: WorkerPool | None = None
+        self._worker_options: dict = {}
+        self._running = False
+        self._stopping = False
+        self._cancelling = False
+        self._paused = False
+        self._completed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def paused(self) -> bool:
+        """Whether the whole run is paused."""
+        return self._paused
+
+    @property
+    def converted_elsewhere(self) -> int:
+        """How many entries another host converted, over all runs."""
+        return self._elsewhere
+
+    @property
+    def active_entries(self) -> list[QueueEntry]:
+        return [worker.entry for worker in self._workers.values()]
+
+    def start(self, **worker_options) -> None:
+        """Start draining the queue; options are passed to every NszWorker.
+
+        While a run is in progress this only launches jobs for entries added
+        since, keeping the options it was started with.
+        """
+        if self._running:
+            self._fill()
+            return
+        self._running = True
+        self._stopping = False
+        self._cancelling = False
+        self._paused = False
+        self._completed = 0
+        self._worker_options = worker_options
+        self._eta = self._plan(worker_options)
+        if self.queue.has_pending() and not self._keys_usable():
+            self._finish()  # Before the pool starts any process
+            return
+        if self.use_pool:
+            self._start_pool()
+        self._fill()
+        if self._idle():
+            self._finish()
+        else:
+            self._schedule_heartbeat()
+
+    def stop(self) -> None:
+        """Stop launching new jobs and let the running ones finish."""
+        self._stopping = True
+        if self._running and self._idle():
+            self._finish()
+
+    def pause(self, entry_id: int | None = None) -> None:
+        """Pause the job running ``entry_id``, or the whole run if None."""
+        if entry_id is None:
+            self._paused = True
+            for worker in self._all_workers():
+                worker.pause()
+        elif worker := self._find_worker(entry_id):
+            worker.pause()
+
+    def resume(self, entry_id: int | None = None) -> None:
+        """Resume the job running ``entry_id``, or the whole run if None."""
+        if entry_id is None:
+            self._paused = False
+            for worker in self._all_workers():
+                worker.resume()
+            self._verify_next()
+            if self._running:
+                self._fill()
+                if self._idle():
+                    self._finish()
+        elif worker := self._find_worker(entry_id):
+            worker.resume()
+
+    def is_paused(self, entry_id: int) -> bool:
+        worker = self._find_worker(entry_id)
+        return worker is not None and worker.paused
+
+    def cancel(self) -> None:
+        """Cancel every running job. on_finished fires once they report back.
+
+        Cancelled entries go back to PENDING, so the next run picks them up.
+        Outputs already on their way from the scratch directory still arrive;
+        unverified ones are discarded. Returns at once; jobs that ignore SIGTERM are killed after
+        worker.KILL_TIMEOUT seconds.
+        """
+        self._stopping = True
+        self._cancelling = True
+        self._paused = False
+        for worker in self._all_workers():
+            worker.cancel()
+        while self._to_verify:
+            entry = self._to_verify.popleft()
+            self._discard_staged(entry)
+            self._complete(entry, False, "Cancelled")
+        if self._running and self._idle():
+            self._finish()
+
+    def cancel_job(self, entry_id: int) -> bool:
+        """Cancel the job of ``entry_id``, or keep it from starting if pending.
+
+        Unlike cancel(), the entry ends as ERROR ("Cancelled") and the rest of
+        the run goes on. Returns False if the entry is not pending or running.
+        """
+        entry = self.queue.get(entry_id)
+        if entry is None:
+            return False
+        if worker := self._find_worker(entry_id):
+            worker.cancel()
+        elif entry in self._to_verify:
+            self._to_verify.remove(entry)
+            self._discard_staged(entry)
+            self._complete(entry, False, "Cancelled")
+        elif entry.status == Status.PENDING:
+            self._settle(entry, Status.ERROR, "Cancelled")
+        else:
+            return False
+        return True
+
+    def close(self) -> None:
+        """Cancel running jobs and shut down the persistent worker pool.
+
+        Staged outputs not yet moved are left for the journal to clean up.
+        """
+        self.cancel()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self._mover is not None:
+            self._mover.close()
+            self._mover = None
+
+    def forecast(self, interrupted: Iterable[Path] = (), **worker_options) -> tuple[int, float]:
+        """Return how many entries a run with ``worker_options`` would convert
+        and how many seconds it is expected to take.
+
+        Nothing is started; entries whose output is up to date are left out,
+        except ``interrupted`` inputs, whose output is a partial one a real run
+        would discard first.
+        """
+        eta = self._plan(worker_options)
+        output_dir = worker_options.get("output_dir", "")
+        redo = set(interrupted)
+        pending = [
+            entry
+            for entry in self.queue.pending_entries()
+            if entry.path in redo
+            or not (
+                self.skip_up_to_date
+                and check_output(entry.path, entry.output_in(output_dir), self.fingerprints)
+                == Freshness.CURRENT
+            )
+        ]
+        return len(pending), eta.estimate([], pending, self.max_jobs).remaining
+
+    def estimate(self) -> Estimate:
+        """Estimate the time left of the running jobs and of the whole run."""
+        pending = [] if self._stopping else self.queue.pending_entries()
+        return self._eta.estimate(self.active_entries, pending, self.max_jobs)
+
+    def progress(self) -> float:
+        """Return the aggregate progress of the current run as a fraction."""
+        pending = 0 if self._stopping else self.queue.pending_count()
+        # Verification is not counted; its entries are converted already.
+        finished = (
+            self._completed + len(self._moving) + len(self._verifiers) + len(self._to_verify)
+        )
+        total = finished + len(self._workers) + len(self._remote) + pending
+        if total == 0:
+            return 0.0
+        done = finished * 100 + sum(
+            worker.entry.progress for worker in self._workers.values()
+        )
+        return done / (total * 100)
+
+    # ── Internals ────────────────────────────────────────────────────
+
+    def _plan(self, worker_options: dict) -> EtaEstimator:
+        """Order the queue for a run with ``worker_options``; return its estimator."""
+        level = worker_options.get("compression_level", 18)
+        mode = compression_mode(worker_options.get("block_compression", True))
+        self.queue.set_order(order_key(self.order, level, self.history, mode))
+        return EtaEstimator(self.history, level, mode)
+
+    def _local_work(self) -> bool:
+        return bool(self._workers or self._moving or self._verifiers or self._to_verify)
+
+    def _idle(self) -> bool:
+        if self._local_work():
+            return False
+        if self._remote and not self._stopping:
+            return False
+        # A paused run is not over while it has work left.
+        return not (self._paused and not self._stopping and self.queue.has_pending())
+
+    def _start_pool(self) -> None:
+        if self._pool is None:
+            self._pool = WorkerPool(self.max_jobs)
+        self._pool.size = self.max_jobs
+        try:
+            self._pool.prestart()
+        except OSError:
+            # Jobs fall back to spawning nsz directly.
+            self._pool.close()
+            self._pool = None
+
+    def _keys_usable(self) -> bool:
+        """Check the keys; on failure stop the run and report why."""
+        if self.keys is None:
+            return True
+        check = self.keys.check()
+        if not check.ok and not self._stopping:
+            self._stopping = True
+            if self.on_keys_error:
+                self.on_keys_error(check.message)
+        return check.ok
+
+    def _claim(self, entry: QueueEntry) -> bool:
+        """Take the lease of a claimed entry; False if another host has it."""
+        result = self.coordinator.result(entry.path)
+        if result is not None:
+            self._settle_remote(entry, result)
+            return False
+        output = entry.output_in(self._worker_options.get("output_dir", ""))
+        claim = self.coordinator.claim(entry.path, output)
+        if not claim.held:
+            self._await_remote(entry)
+            return False
+        if claim.lease is not None and claim.lease.output:
+            # Taken over from a host that stopped mid-job: its output is partial.
+            self._discard(Path(claim.lease.output))
+        return True
+
+    def _await_remote(self, entry: QueueEntry) -> None:
+        entry.progress = 0
+        entry.output = None  # Whatever is written now is the other host's
+        self.queue.set_status(entry, Status.REMOTE)
+        self._remote[entry.id] = entry
+
+    def _settle_remote(self, entry: QueueEntry, result: SharedResult) -> None:
+        self._remote.pop(entry.id, None)
+        if result.status == "done":
+            self._elsewhere += 1
+            self._settle(entry, Status.SKIPPED, f"Converted on {result.host}")
+        else:
+            self._settle(entry, Status.ERROR, f"Failed on {result.host}: {result.message}")
+
+    def _release(self, entry: QueueEntry) -> None:
+        """Give up the entry's lease, recording how it ended for the other hosts."""
+        if self.coordinator is None:
+            return
+        if entry.status in (Status.DONE, Status.SKIPPED):
+            self.coordinator.release(entry.path, "done", output=entry.output)
+        elif entry.status == Status.ERROR:
+            self.coordinator.release(entry.path, "error", entry.error_message)
+        else:
+            self.coordinator.release(entry.path)  # Cancelled: free for any host
+
+    def _schedule_heartbeat(self, delay: float | None = None) -> None:
+        """Schedule the next heartbeat in ``delay`` seconds, unless one is due sooner."""
+        if self.coordinator is None:
+            return
+        if delay is None:
+            delay = self.coordinator.interval
+            if not self._local_work():
+                # No leases to renew; only waiting for the other hosts.
+                delay = min(delay, REMOTE_POLL_INTERVAL)
+        due = time.monotonic() + delay
+        if self._heartbeat_due is not None and self._heartbeat_due <= due:
+            return
+        self._heartbeat_due = due
+        (self.dispatch or glib_dispatch)(delay, self._heartbeat, due)
+
+    def _heartbeat(self, due: float) -> None:
+        """Renew our leases and look in on the entries other hosts hold."""
+        if due != self._heartbeat_due:
+            return  # Superseded by an earlier one
+        self._heartbeat_due = None
+        if not self._running:
+            return
+        progress = {worker.entry.path: worker.entry.progress for worker in self._workers.values()}
+        for path in self.coordinator.heartbeat(progress):
+            entry = self.queue.find(path)
+            if entry is None:
+                continue
+            self._lost.add(entry.id)
+            if worker := self._find_worker(entry.id):
+                # The output path may already hold the new holder's file.
+                worker.cancel(discard=False)
+            elif entry in self._to_verify:
+                self._to_verify.remove(entry)
+                self._discard_staged(entry)
+                self._complete(entry, False, "")
+        for entry in list(self._remote.values()):
+            result = self.coordinator.result(entry.path)
+            if result is not None:
+                self._settle_remote(entry, result)
+            elif self.coordinator.available(entry.path):
+                del self._remote[entry.id]
+                self.queue.set_status(entry, Status.PENDING)
+        self._fill()
+        if self._idle():
+            self._finish()
+        else:
+            self._schedule_heartbeat()
+
+    def _fill(self) -> None:
+        if self._stopping or self._paused or not self.queue.has_pending():
+            return
+        if not self._keys_usable():
+            return
+        while not (self._stopping or self._paused) and len(self._workers) < self.max_jobs:
+            entry = self.queue.claim_next()
+            if entry is None:
+                break
+            if self.coordinator is not None and not self._claim(entry):
+                continue
+            if not self._prepare_output(entry):
+                continue
+            self._launch(entry)
+
+    def _prepare_output(self, entry: QueueEntry) -> bool:
+        """Clear the way for a job; return False if it was skipped instead."""
+        output = entry.output_in(self._worker_options.get("output_dir", ""))
+        writer = self._writing.get(output)
+        if writer is not None:
+            # Another input of the same name, e.g. a/x.nsp and b/x.nsp.
+            self._settle(
+                entry, Status.ERROR, f"{output.name} is already being written for {writer.path}"
+            )
+            return False
+        if entry.output is not None:
+            # An earlier attempt was cut short and left a partial output.
+            self._discard(entry.output)
+        freshness = check_output(entry.path, output, self.fingerprints)
+        if freshness == Freshness.MISSING:
+            return True
+        if freshness == Freshness.CURRENT and self.skip_up_to_date:
+            self._settle(entry, Status.SKIPPED, "")
+        elif output in self.queue:
+            # The other form of the same file is an input of this run.
+            self._settle(entry, Status.SKIPPED, f"{output.name} is also in the queue")
+        elif self.skip_up_to_date and not (
+            self.fingerprints is not None and self.fingerprints.owns(entry.path, output)
+        ):
+            self._settle(
+                entry, Status.ERROR, f"{output.name} already exists and is older than this file"
+            )
+        else:
+            self._discard(output)
+            return True
+        return False
+
+    def _settle(self, entry: QueueEntry, status: Status, message: str) -> None:
+        """Finish an entry without running nsz."""
+        entry.progress = 100 if status == Status.SKIPPED else 0
+        self.queue.set_status(entry, status, message)
+        self._done_writing(entry)
+        self._completed += 1
+        self._release(entry)
+        if self.on_done:
+            self.on_done(entry, status == Status.SKIPPED, message or "Already up to date")
+
+    @staticmethod
+    def _discard(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def _launch(self, entry: QueueEntry) -> None:
+        options = self._worker_options
+        if self.scratch_dir:
+            try:
+                staged = make_job_dir(self.scratch_dir, entry.id)
+            except OSError as e:
+                self._settle(
+                    entry, Status.ERROR, f"Cannot write to scratch directory: {e.strerror or e}"
+                )
+                return
+            self._staged[entry.id] = staged
+            options = {**options, "output_dir": str(staged)}
+        if self.resources is not None:
+            slot = min(set(range(self.max_jobs + 1)) - set(self._slots.values()))
+            self._slots[entry.id] = slot
+            options = {**options, "limits": self.resources.job_limits(slot, self.max_jobs)}
+        if self.log_dir:
+            entry.log = log_path(self.log_dir, entry.path)
+            options = {**options, "log_path": entry.log}
+        self._writing[entry.output_in(self._worker_options.get("output_dir", ""))] = entry
+        entry.progress = 0
+        entry.metrics = None
+        worker = NszWorker(
+            entry,
+            on_progress=self._on_worker_progress,
+            on_done=self._on_worker_done,
+            pool=self._pool,
+            dispatch=self.dispatch,
+            **options,
+        )
+        self.queue.set_output(entry, worker.output_path)
+        self._workers[entry.id] = worker
+        if self.on_started:
+            self.on_started(entry)
+        worker.start()
+
+    def _on_worker_progress(self, entry: QueueEntry, event: ProgressEvent) -> None:
+        entry.progress = event.percent
+        if event.stage != "tune":
+            self._eta.update(entry, event.fraction)
+        if self.on_progress:
+            self.on_progress(entry, event)
+
+    def _all_workers(self) -> list[NszWorker]:
+        return [*self._workers.values(), *self._verifiers.values()]
+
+    def _find_worker(self, entry_id: int) -> NszWorker | None:
+        return self._workers.get(entry_id) or self._verifiers.get(entry_id)
+
+    def _on_worker_done(self, entry: QueueEntry, success: bool, message: str) -> None:
+        worker = self._workers.pop(entry.id, None)
+        self._slots.pop(entry.id, None)
+        self._eta.remove(entry)
+        entry.metrics = worker.metrics if worker is not None else None
+        if success and self.history is not None and entry.metrics is not None:
+            self.history.record(
+                entry.operation,
+                entry.metrics.level,
+                entry_size(entry),
+                entry.metrics.wall_seconds,
+                entry.metrics.mode,
+            )
+        if success and self.verify and self._verifiable(entry):
+            # Free the slot now; verification runs alongside the next job.
+            entry.progress = 100
+            self.queue.set_status(entry, Status.VERIFYING)
+            self._to_verify.append(entry)
+            self._verify_next()
+        else:
+            self._deliver(entry, success, message)
+
+        if self._running:
+            self._fill()
+            self._check_idle()
+
+    def _deliver(self, entry: QueueEntry, success: bool, message: str) -> None:
+        """Complete a converted (and verified) entry once its output is in place."""
+        staged = self._staged.pop(entry.id, None)
+        if success and staged is not None and entry.output is not None:
+            # The entry completes once its output arrives.
+            entry.progress = 100
+            self._moving[entry.output] = entry
+            if self._mover is None:
+                self._mover = OutputMover(self._on_output_moved, self.dispatch)
+            self._mover.move(
+                entry.output, entry.output_in(self._worker_options.get("output_dir", ""))
+            )
+        else:
+            if staged is not None:
+                remove_job_dir(staged)
+            self._complete(entry, success, message)
+
+    def _discard_staged(self, entry: QueueEntry) -> None:
+        staged = self._staged.pop(entry.id, None)
+        if staged is not None:
+            remove_job_dir(staged)
+
+    @staticmethod
+    def _verifiable(entry: QueueEntry) -> bool:
+        return entry.output is not None and entry.output.suffix.lower() in VERIFY_EXTENSIONS
+
+    def _verify_next(self) -> None:
+        while not self._paused and self._to_verify and len(self._verifiers) < self.verify_jobs:
+            entry = self._to_verify.popleft()
+            limits = None
+            if self.resources is not None:
+                limits = self.resources.verify_limits(self.max_jobs)
+            verifier = NszWorker(
+                entry,
+                output_dir=str(entry.output.parent),
+                verify=True,
+                log_path=entry.log,
+                limits=limits,
+                pool=self._pool,
+                on_progress=self.on_progress,
+                on_done=self._on_verified,
+                dispatch=self.dispatch,
+            )
+            self._verifiers[entry.id] = verifier
+            if self.on_started:
+                self.on_started(entry)
+            verifier.start()
+
+    def _on_verified(self, entry: QueueEntry, success: bool, message: str) -> None:
+        self._verifiers.pop(entry.id, None)
+        self._deliver(entry, success, message)
+        self._verify_next()
+        if self._running:
+            self._check_idle()
+
+    def _on_output_moved(self, source: Path, destination: Path, error: str) -> None:
+        entry = self._moving.pop(source, None)
+        if entry is None:
+            return
+        if error:
+            self._settle(entry, Status.ERROR, error)  # The staged output is kept
+            self._log_metrics(entry, False)
+        else:
+            self.queue.set_output(entry, destination)
+            remove_job_dir(source.parent)
+            self._complete(entry, True, "")
+        if self._running:
+            self._check_idle()
+
+    def _done_writing(self, entry: QueueEntry) -> None:
+        """Let other entries with the same output run now that ``entry`` ended."""
+        output = entry.output_in(self._worker_options.get("output_dir", ""))
+        if self._writing.get(output) is entry:
+            del self._writing[output]
+
+    def _complete(self, entry: QueueEntry, success: bool, message: str) -> None:
+        self._done_writing(entry)
+        if entry.id in self._lost:
+            # Another host runs it now and records the result.
+            self._lost.discard(entry.id)
+            self._await_remote(entry)
+            return
+        self._completed += 1
+        if success:
+            entry.progress = 100
+            self.queue.set_status(entry, Status.DONE)
+            if self.fingerprints is not None and entry.output is not None:
+                self.fingerprints.record(entry.path, entry.output)
+            self._log_metrics(entry, True)
+        elif self._cancelling:
+            entry.progress = 0
+            self.queue.set_status(entry, Status.PENDING)
+        else:
+            self.queue.set_status(entry, Status.ERROR, message)
+            self._log_metrics(entry, False)
+        self._release(entry)
+        if self.on_done:
+            self.on_done(entry, success, message)
+
+    def _log_metrics(self, entry: QueueEntry, success: bool) -> None:
+        """Complete the entry's metrics with the file sizes and log them."""
+        metrics = entry.metrics
+        if metrics is None:
+            return
+        metrics.success = success
+        metrics.input_size = entry_size(entry)
+        if success and entry.output is not None:
+            try:
+                metrics.output_size = entry.output.stat().st_size
+            except OSError:
+                pass
+        if self.metrics_log is not None:
+            self.metrics_log.record(metrics)
+
+    def _check_idle(self) -> None:
+        """Finish the run once nothing is left to do."""
+        if self._idle():
+            self._finish()
+        elif self._remote and not self._local_work():
+            # Only other hosts' entries are left: look for their results now.
+            self._schedule_heartbeat(0)
+
+    def _finish(self) -> None:
+        self._running = False
+        for entry in self._remote.values():
+            self.queue.set_status(entry, Status.PENDING)
+        self._remote.clear()
+        if self.on_finished:
+            self.on_finished()
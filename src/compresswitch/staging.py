@@ -0,0 +1,150 @@
+"""Output staging: nsz writes to fast scratch storage, a mover delivers the result.
+
+When the output directory is slow (a NAS, a USB disk), nsz spends much of
+a job waiting on writes. With a scratch directory, each job writes into its
+own folder there instead, and once it succeeds an OutputMover moves the
+file to its real destination on a background thread while the next job is
+already compressing. Moves within one filesystem are a plain rename; across
+filesystems the file is copied to a hidden temporary name next to the
+destination, checked against a checksum of the staged file and renamed into
+place, so the destination never holds a partial output under its real name.
+"""
+
+from __future__ import annotations
+
+import errno
+import hashlib
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable
+
+from compresswitch.worker import Dispatch, glib_dispatch
+
+_CHUNK = 4 * 1024 * 1024
+
+
+def make_job_dir(scratch_dir: str, entry_id: int) -> Path:
+    """Create a new, empty scratch folder for a job to write its output into.
+
+    The name is unique even across processes, so a job never finds the
+    partial output of an earlier run there, which nsz would not overwrite.
+    """
+    Path(scratch_dir).mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=f"job-{entry_id}-", dir=scratch_dir))
+
+
+def remove_job_dir(path: Path) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _fsync_dir(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _digest(path: Path) -> bytes:
+    h = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            h.update(chunk)
+    return h.digest()
+
+
+def _copy_verified(source: Path, destination: Path) -> None:
+    """Copy ``source`` over ``destination`` atomically, verifying the copy."""
+    temp = destination.with_name(f".{destination.name}.compresswitch-part")
+    h = hashlib.blake2b()
+    try:
+        with open(source, "rb") as src, open(temp, "wb") as dst:
+            while chunk := src.read(_CHUNK):
+                h.update(chunk)
+                dst.write(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if _digest(temp) != h.digest():
+            raise OSError(f"copy of {source.name} does not match the original")
+        shutil.copystat(source, temp)
+        os.replace(temp, destination)
+    except BaseException:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+        raise
+    _fsync_dir(destination.parent)
+
+
+def move_output(source: Path, destination: Path) -> None:
+    """Move a finished output into place; raises OSError on failure."""
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        _copy_verified(source, destination)
+        source.unlink()
+    else:
+        _fsync_dir(destination.parent)
+
+
+class OutputMover:
+    """Moves staged outputs to their destination, one at a time, off the UI thread.
+
+    ``on_moved(source, destination, error)`` is called through ``dispatch``
+    after each move; ``error`` is empty on success. A failed move leaves the
+    staged file where it is.
+    """
+
+    def __init__(
+        self,
+        on_moved: Callable[[Path, Path, str], None],
+        dispatch: Dispatch | None = None,
+    ):
+        self.on_moved = on_moved
+        self._dispatch = dispatch or glib_dispatch
+        self._moves: queue.SimpleQueue[tuple[Path, Path] | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def move(self, source: Path, destination: Path) -> None:
+        """Queue ``source`` to be moved to ``destination``."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="compresswitch-mover", daemon=True
+            )
+            self._thread.start()
+        self._moves.put((source, destination))
+
+    def close(self) -> None:
+        """Stop after the current move; queued moves are abandoned."""
+        self._closed = True
+        self._moves.put(None)
+
+    def _run(self) -> None:
+        while True:
+            item = self._moves.get()
+            if item is None or self._closed:
+                return
+            source, destination = item
+            try:
+                move_output(source, destination)
+                error = ""
+            except OSError as e:
+                error = f"Could not move output to {destination.parent}: {e.strerror or e}"
+            self._dispatch(0, self._deliver, source, destination, error)
+
+    def _deliver(self, source: Path, destination: Path, error: str) -> bool:
+        self.on_moved(source, destination, error)
+        return False
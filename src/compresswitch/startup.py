@@ -0,0 +1,256 @@
+"""Opt-in start-up profiling (``--profile-startup``) and baseline checks.
+
+When enabled, every entry point (GUI, batch, nsz worker, pool server and
+pool job) appends one JSON line to the profile file with an import-time
+breakdown and its key milestones, measured from the moment the process was
+exec'd (or forked, for pool jobs). Child processes inherit the setting
+through PROFILE_ENV.
+
+    python -m compresswitch.startup record PROFILE BASELINE
+    python -m compresswitch.startup check PROFILE BASELINE
+"""
+
+from __future__ import annotations
+
+import builtins
+import json
+import os
+import sys
+import time
+
+PROFILE_ENV = "COMPRESSWITCH_PROFILE_STARTUP"
+DEFAULT_PROFILE_PATH = "compresswitch-startup.jsonl"
+
+# Number of slowest imports kept in each report
+_TOP_IMPORTS = 25
+
+# A value may exceed its recorded baseline by this factor, plus a fixed
+# allowance for timer and scheduling noise, before check fails
+DEFAULT_TOLERANCE = 1.5
+DEFAULT_SLACK_MS = 25.0
+
+
+def _process_age() -> float:
+    """Return seconds since this process was exec'd, or 0.0 if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after ')'.
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return max(0.0, time.clock_gettime(time.CLOCK_BOOTTIME) - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+
+class _Profile:
+    def __init__(self, path: str, entry: str, since_exec: bool):
+        self.path = path
+        self.entry = entry
+        self.t0 = time.perf_counter()
+        self.since_exec = since_exec
+        self.offset = _process_age() if since_exec else 0.0
+        self.marks: dict[str, float] = {}
+        # module -> [inclusive seconds, self seconds]
+        self.imports: dict[str, list[float]] = {}
+        self._stack: list[float] = []  # child time accumulated per level
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def elapsed_ms(self) -> float:
+        return (self.offset + time.perf_counter() - self.t0) * 1000
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            inclusive = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += inclusive
+            self.imports[name] = [inclusive, inclusive - children]
+
+    def stop(self) -> None:
+        if builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._original_import
+
+    def report(self) -> dict:
+        slowest = sorted(self.imports.items(), key=lambda kv: kv[1][1], reverse=True)
+        # A forked process was never exec'd; its times start at the fork.
+        since_exec = {"exec_to_main": round(self.offset * 1000, 2)} if self.since_exec else {}
+        return {
+            "entry": self.entry,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "ms": {
+                **since_exec,
+                "imports": round(
+                    sum(self_s for _inc, self_s in self.imports.values()) * 1000, 2
+                ),
+                **{name: round(value, 2) for name, value in self.marks.items()},
+            },
+            "modules": sorted({name.split(".")[0] for name in sys.modules}),
+            "slowest_imports": [
+                {
+                    "module": name,
+                    "self_ms": round(self_s * 1000, 2),
+                    "cumulative_ms": round(inclusive * 1000, 2),
+                }
+                for name, (inclusive, self_s) in slowest[:_TOP_IMPORTS]
+            ],
+        }
+
+
+_profile: _Profile | None = None
+
+
+def enable(entry: str, path: str | None = None, since_exec: bool = True) -> None:
+    """Start profiling this process and let child processes inherit it."""
+    global _profile
+    if _profile is not None:
+        _profile.stop()
+    path = path or os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE_PATH
+    os.environ[PROFILE_ENV] = os.path.abspath(path)
+    _profile = _Profile(os.environ[PROFILE_ENV], entry, since_exec)
+
+
+def enable_from_env(entry: str, since_exec: bool = True) -> None:
+    """Enable profiling if a parent process asked for it."""
+    if os.environ.get(PROFILE_ENV):
+        enable(entry, since_exec=since_exec)
+
+
+def active() -> bool:
+    return _profile is not None
+
+
+def mark(name: str, final: bool = False) -> None:
+    """Record a milestone; ``final`` writes the report and stops profiling."""
+    global _profile
+    if _profile is None or name in _profile.marks:
+        return
+    _profile.marks[name] = _profile.elapsed_ms()
+    if final:
+        _profile.stop()
+        line = json.dumps(_profile.report()) + "\n"
+        path = _profile.path
+        _profile = None
+        # One O_APPEND write per report keeps lines from concurrent
+        # processes intact.
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError:
+            return
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+
+class _FirstWrite:
+    """Wraps a text stream and records ``first_byte`` on its first write."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._seen = False
+
+    def write(self, text: str) -> int:
+        # Stays installed afterwards: print() only borrows sys.stdout, so
+        # swapping it back from inside write() could free it mid-call.
+        if not self._seen:
+            self._seen = True
+            mark("first_byte", final=True)
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def watch_first_byte() -> None:
+    """Write the report as soon as this process prints its first output."""
+    if _profile is not None:
+        sys.stdout = _FirstWrite(sys.stdout)
+
+
+# ── Baselines ────────────────────────────────────────────────────────
+
+
+def _load_profile(path: str) -> dict[str, dict]:
+    """Return the latest report per entry point from a profile file."""
+    latest: dict[str, dict] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                report = json.loads(line)
+            except ValueError:
+                continue
+            latest[report["entry"]] = report
+    return latest
+
+
+def record(profile_path: str, baseline_path: str) -> None:
+    """Store the timings from a profile as the new baseline."""
+    try:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {
+            "tolerance": DEFAULT_TOLERANCE,
+            "slack_ms": DEFAULT_SLACK_MS,
+            "entries": {},
+        }
+    for entry, report in _load_profile(profile_path).items():
+        known = baseline["entries"].setdefault(entry, {})
+        known["ms"] = report["ms"]
+        known.setdefault("forbidden_modules", [])
+    with open(baseline_path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def check(profile_path: str, baseline_path: str) -> list[str]:
+    """Compare a profile against the baseline; return the regressions found."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE)
+    slack = baseline.get("slack_ms", DEFAULT_SLACK_MS)
+    problems = []
+    for entry, report in _load_profile(profile_path).items():
+        expected = baseline["entries"].get(entry)
+        if expected is None:
+            continue
+        for module in expected.get("forbidden_modules", []):
+            if module in report["modules"]:
+                problems.append(f"{entry}: imports {module}")
+        for name, limit in expected.get("ms", {}).items():
+            value = report["ms"].get(name)
+            if value is not None and value > limit * tolerance + slack:
+                problems.append(
+                    f"{entry}: {name} took {value:.0f} ms (baseline {limit:.0f} ms)"
+                )
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] not in ("record", "check"):
+        print(
+            "usage: python -m compresswitch.startup {record,check} PROFILE BASELINE",
+            file=sys.stderr,
+        )
+        return 2
+    command, profile_path, baseline_path = argv
+    if command == "record":
+        record(profile_path, baseline_path)
+        return 0
+    problems = check(profile_path, baseline_path)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Up-to-date checks, so a re-run over a library skips files it already converted.
+
+An output is current when it exists, is not empty and is at least as new
+as its input. A Fingerprints cache can also record the size and mtime of
+both files after each successful conversion. Then an input that was replaced
+is caught even if its mtime went backwards (``cp -p``, a restored
+backup), an input that was itself made from its "output" (an .nsp next to
+the .nsz compressed from it) is recognised, and only outputs CompressSwitch
+wrote are ever replaced without being asked to.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from enum import Enum, auto
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    source TEXT PRIMARY KEY,
+    source_size INTEGER NOT NULL,
+    source_mtime_ns INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    output_mtime_ns INTEGER NOT NULL
+)
+"""
+
+
+class Freshness(Enum):
+    MISSING = auto()  # no output yet
+    STALE = auto()  # an output exists but must be made again
+    CURRENT = auto()  # the output is up to date; nothing to do
+
+
+def default_fingerprint_path() -> Path:
+    """Return the fingerprint cache location in the XDG cache directory."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache_home) / "compresswitch" / "fingerprints.sqlite3"
+
+
+class Fingerprints:
+    """SQLite cache of (size, mtime) pairs recorded after each conversion."""
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = Path(path) if path else default_fingerprint_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def owns(self, source: Path, output: Path) -> bool:
+        """Return True if ``output`` was written by converting ``source``."""
+        recorded = self.lookup(source)
+        return recorded is not None and recorded[2] == str(output)
+
+    def lookup(self, source: Path) -> tuple[int, int, str, int, int] | None:
+        with self._lock:
+            return self._db.execute(
+                "SELECT source_size, source_mtime_ns, output, output_size, output_mtime_ns"
+                " FROM fingerprints WHERE source = ?",
+                (str(source),),
+            ).fetchone()
+
+    def record(self, source: Path, output: Path) -> None:
+        """Remember the state of ``source`` and ``output`` after a conversion."""
+        try:
+            src, out = source.stat(), output.stat()
+        except OSError:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(source),
+                    src.st_size,
+                    src.st_mtime_ns,
+                    str(output),
+                    out.st_size,
+                    out.st_mtime_ns,
+                ),
+            )
+
+
+def check_output(
+    source: Path, output: Path, fingerprints: Fingerprints | None = None
+) -> Freshness:
+    """Return whether ``output`` is an up-to-date conversion of ``source``.
+
+    Costs two stat calls, plus one indexed lookup with ``fingerprints``.
+    """
+    try:
+        out = output.stat()
+    except OSError:
+        return Freshness.MISSING
+    try:
+        src = source.stat()
+    except OSError:
+        return Freshness.STALE
+    if out.st_size == 0:
+        return Freshness.STALE
+
+    if fingerprints is not None:
+        src_state = (src.st_size, src.st_mtime_ns)
+        out_state = (out.st_size, out.st_mtime_ns)
+        recorded = fingerprints.lookup(source)
+        if recorded is not None and recorded[2] == str(output):
+            if recorded[:2] != src_state:
+                return Freshness.STALE  # the input changed since it was converted
+            if recorded[3:] == out_state:
+                return Freshness.CURRENT
+            # The output was touched by something else; judge it by mtime.
+        reverse = fingerprints.lookup(output)
+        if reverse is not None and reverse[2] == str(source):
+            if reverse[:2] == out_state and reverse[3:] == src_state:
+                return Freshness.CURRENT  # the input was made from the output
+
+    return Freshness.CURRENT if out.st_mtime_ns >= src.st_mtime_ns else Freshness.STALE
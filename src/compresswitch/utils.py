@@ -8,6 +8,8 @@ from pathlib import Path
 COMPRESS_EXTENSIONS = {".xci", ".nsp"}
 DECOMPRESS_EXTENSIONS = {".xcz", ".nsz", ".ncz"}
 ALL_EXTENSIONS = COMPRESS_EXTENSIONS | DECOMPRESS_EXTENSIONS
+# Outputs ``nsz -V`` can check
+VERIFY_EXTENSIONS = {".nsp", ".nsz", ".xci", ".xcz"}
 
 TARGET_EXTENSION = {
     ".xci": ".xcz",
@@ -21,6 +23,9 @@ TARGET_EXTENSION = {
 # We look for a percentage anywhere in the ANSI-laden output.
 _PROGRESS_RE = re.compile(r"(\d{1,3})%\|")
 
+# enlighten redraws with \r, regular output ends in \n
+_LINE_END_RE = re.compile(rb"[\r\n]")
+
 
 def file_operation(path: Path) -> str | None:
     """Return 'compress' or 'decompress' based on extension, or None if unsupported."""
@@ -57,6 +62,71 @@ def parse_progress(line: str) -> int | None:
     return None
 
 
+def format_rate(bytes_per_second: float) -> str:
+    """Format a transfer rate for display, e.g. ``"85.3 MiB/s"``."""
+    if bytes_per_second < 1024:
+        return f"{bytes_per_second:.0f} B/s"
+    value = bytes_per_second / 1024
+    for unit in ("KiB/s", "MiB/s"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB/s"
+
+
+def format_duration(seconds: float) -> str:
+    """Format a time span for display, e.g. ``"45 s"``, ``"12 min"``, ``"2 h 05 min"``."""
+    seconds = max(0, round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    minutes = round(seconds / 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60:02d} min"
+
+
 def file_filter_extensions() -> list[str]:
     """Return glob patterns for the file chooser filter."""
     return [f"*{ext}" for ext in sorted(ALL_EXTENSIONS)]
+
+
+class LineSplitter:
+    """Incrementally split a byte stream into CR- or LF-terminated lines.
+
+    Incoming data is appended to a single bytearray and scanning resumes
+    where the previous feed stopped, so every byte is scanned once and the
+    consumed prefix is dropped once per feed rather than once per line.
+    """
+
+    def __init__(self, max_line: int = 1 << 16):
+        self._buf = bytearray()
+        self._max_line = max_line
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Add data and return the complete lines it finished, without terminators."""
+        buf = self._buf
+        scan_from = len(buf)  # the leftover partial line has no terminator
+        buf += data
+        lines: list[bytes] = []
+        start = 0
+        view = memoryview(buf)
+        try:
+            for m in _LINE_END_RE.finditer(buf, scan_from):
+                end = m.start()
+                lines.append(bytes(view[start:end]))
+                start = end + 1
+            if len(buf) - start > self._max_line:
+                # Runaway output without line breaks; hand it out as is.
+                lines.append(bytes(view[start:]))
+                start = len(buf)
+        finally:
+            view.release()
+        if start:
+            del buf[:start]
+        return lines
+
+    def flush(self) -> bytes:
+        """Return and clear whatever partial line is left."""
+        rest = bytes(self._buf)
+        self._buf.clear()
+        return rest
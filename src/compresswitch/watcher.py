@@ -0,0 +1,253 @@
+"""Watch inbox folders and report Switch files once they have finished arriving."""
+
+from __future__ import annotations
+
+import ctypes
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+from compresswitch.file_queue import FileQueue, QueueEntry, Status
+from compresswitch.scanner import scan_paths
+from compresswitch.utils import ALL_EXTENSIONS, target_name
+from compresswitch.worker import Dispatch, glib_dispatch
+
+# Seconds a file's size and mtime must stay unchanged before it is reported
+DEFAULT_SETTLE = 10.0
+# Seconds between stability checks (and between rescans without inotify)
+_CHECK_INTERVAL = 1.0
+
+# inotify(7) event bits. Writes in progress are left to the stability
+# check rather than watched with IN_MODIFY, which fires for every write.
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _is_switch_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in ALL_EXTENSIONS
+
+
+def enqueue_arrivals(
+    queue: FileQueue, paths: Iterable[Path], output_dir: str = ""
+) -> tuple[list[QueueEntry], list[QueueEntry]]:
+    """Add files reported by a FolderWatcher to ``queue``.
+
+    Our own outputs (files in ``output_dir``, or written next to their
+    input by a queued job) are ignored, and a file that arrives again after
+    its entry finished is queued afresh. Returns the entries added and the
+    finished entries they replaced.
+    """
+    arrivals, replaced = [], []
+    for path in paths:
+        if output_dir and path.parent == Path(output_dir):
+            continue
+        if path.with_name(target_name(path)) in queue:
+            continue
+        entry = queue.find(path)
+        if entry is not None and entry.status not in (Status.PENDING, Status.PROCESSING):
+            queue.remove(entry.id)
+            replaced.append(entry)
+        arrivals.append(path)
+    return queue.add_many(arrivals), replaced
+
+
+class _Inotify:
+    """Just enough of inotify(7) through ctypes; raises OSError where unsupported."""
+
+    def __init__(self) -> None:
+        try:
+            self._libc = ctypes.CDLL(None, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError("inotify is not available") from e
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, Path] = {}
+
+    def add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+        self._dirs[wd] = directory
+
+    def read(self) -> list[tuple[Path, int, str]]:
+        """Return pending (directory, mask, name) events without blocking."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self._dirs.get(wd)
+            if mask & _IN_Q_OVERFLOW or directory is not None:
+                events.append((directory or Path(), mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Reports new Switch files under ``roots``, including subfolders.
+
+    Uses inotify where available and falls back to rescanning every
+    second. A file is reported through ``on_files`` (on the ``dispatch``
+    thread) only once its size and mtime have stopped changing for
+    ``settle`` seconds, so a copy in progress is never picked up half
+    written. Files already present when watching starts are reported too.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[Path],
+        *,
+        on_files: Callable[[list[Path]], None],
+        dispatch: Dispatch | None = None,
+        settle: float = DEFAULT_SETTLE,
+    ):
+        self.roots = list(roots)
+        self.on_files = on_files
+        self.settle = settle
+        self.uses_inotify = False
+
+        self._dispatch = dispatch or glib_dispatch
+        self._thread: threading.Thread | None = None
+        self._wake_r, self._wake_w = os.pipe()
+        self._stopped = False
+        # path -> (size, mtime_ns, monotonic time it last changed)
+        self._candidates: dict[Path, tuple[int, int, float]] = {}
+        self._reported: set[Path] = set()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="compresswitch-watch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching; files still settling are not reported."""
+        if self._stopped:
+            return
+        self._stopped = True
+        os.write(self._wake_w, b"\0")
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    # ── Watch thread ─────────────────────────────────────────────────
+
+    def _run(self) -> None:
+        inotify = None
+        try:
+            inotify = _Inotify()
+            for root in self.roots:
+                self._watch_tree(inotify, root)
+            self.uses_inotify = True
+        except OSError:
+            if inotify is not None:
+                inotify.close()
+            inotify = None
+        try:
+            self._rescan()
+            while not self._stopped:
+                fds = [self._wake_r] + ([inotify.fd] if inotify else [])
+                ready, _, _ = select.select(fds, [], [], _CHECK_INTERVAL)
+                if self._stopped:
+                    break
+                if inotify is None:
+                    self._rescan()
+                elif inotify.fd in ready:
+                    self._handle_events(inotify, inotify.read())
+                self._check_candidates()
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def _watch_tree(self, inotify: _Inotify, root: Path) -> None:
+        if not root.is_dir():
+            return
+        inotify.add_watch(root)
+        for dirpath, dirnames, _files in os.walk(root):  # never follows symlinks
+            for name in dirnames:
+                try:
+                    inotify.add_watch(Path(dirpath) / name)
+                except OSError:
+                    continue
+
+    def _handle_events(self, inotify: _Inotify, events: list[tuple[Path, int, str]]) -> None:
+        for directory, mask, name in events:
+            if mask & _IN_Q_OVERFLOW:
+                self._rescan()
+                continue
+            path = directory / name
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # A folder was created or moved in: watch it and pick up
+                    # whatever it already holds.
+                    try:
+                        self._watch_tree(inotify, path)
+                    except OSError:
+                        pass
+                    self._add_candidates(scan_paths([path]))
+            elif _is_switch_name(name):
+                if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self._candidates.pop(path, None)
+                    self._reported.discard(path)
+                else:
+                    # Written, replaced or moved in: (re)start its settle time.
+                    self._reported.discard(path)
+                    self._candidates[path] = (-1, -1, time.monotonic())
+
+    def _rescan(self) -> None:
+        present = scan_paths(self.roots)
+        self._reported.intersection_update(present)
+        self._add_candidates(present)
+
+    def _add_candidates(self, paths: Iterable[Path]) -> None:
+        now = time.monotonic()
+        for path in paths:
+            if path not in self._reported and path not in self._candidates:
+                self._candidates[path] = (-1, -1, now)
+
+    def _check_candidates(self) -> None:
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, since) in list(self._candidates.items()):
+            try:
+                st = path.stat()
+            except OSError:
+                del self._candidates[path]  # gone again
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                self._candidates[path] = (st.st_size, st.st_mtime_ns, now)
+            elif now - since >= self.settle:
+                del self._candidates[path]
+                self._reported.add(path)
+                ready.append(path)
+        if ready:
+            self._dispatch(0, self._deliver, sorted(ready))
+
+    # ── Delivery (dispatch thread) ───────────────────────────────────
+
+    def _deliver(self, paths: list[Path]) -> bool:
+        if not self._stopped:
+            self.on_files(paths)
+        return False
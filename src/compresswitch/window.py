@@ -3,16 +3,34 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import gi
 
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
-from gi.repository import Adw, Gdk, Gio, GLib, Gtk
-
-from compresswitch.file_queue import FileQueue, QueueEntry, Status
-from compresswitch.utils import ALL_EXTENSIONS, is_valid_switch_file
-from compresswitch.worker import NszWorker
+from gi.repository import Adw, Gdk, Gio, GLib, GObject, Gtk
+
+from compresswitch import startup
+from compresswitch.autolevel import DEFAULT_TARGET_MBPS, LevelTuner
+from compresswitch.file_queue import FileQueue, QueueEntry
+from compresswitch.keys import KEYS_MISSING_MESSAGE
+from compresswitch.ordering import ORDER_DESCRIPTIONS, ORDERS
+from compresswitch.queue_view import QueueStore, create_list_view
+from compresswitch.resources import ResourcePolicy, available_cpus, default_max_jobs
+from compresswitch.utils import ALL_EXTENSIONS, format_duration, format_rate
+
+if TYPE_CHECKING:
+    # The rest is imported where it is first used, after the first frame.
+    from compresswitch.eta import Estimate
+    from compresswitch.journal import Journal, Recovery
+    from compresswitch.metrics import MetricsLog
+    from compresswitch.ordering import JobHistory
+    from compresswitch.progress import ProgressEvent
+    from compresswitch.scanner import FolderScanner
+    from compresswitch.scheduler import JobScheduler
+    from compresswitch.uptodate import Fingerprints
+    from compresswitch.watcher import FolderWatcher
 
 APP_ID = "com.github.dan.compresswitch"
 
@@ -24,13 +42,89 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         self.set_default_size(500, 700)
 
         self.queue = FileQueue()
-        self._worker: NszWorker | None = None
+        self._journal: Journal | None = None  # Opened once the window is up
+        self._model = QueueStore()
+        self._scanners: set[FolderScanner] = set()
+        self._watcher: FolderWatcher | None = None
+        self._scratch_dir = ""
+        # Created on the first start (see _create_scheduler)
+        self._scheduler: JobScheduler | None = None
+        self._fingerprints: Fingerprints | None = None
+        self._history: JobHistory | None = None
+        self._metrics_log: MetricsLog | None = None
         self._processing = False
+        self._keys_dialog_shown = False
         self._pulse_timeout_id: int | None = None
         self._last_progress_time: float = 0
+        self._estimate: Estimate | None = None
 
         self._build_ui()
         self._setup_drop_target()
+        self.connect("close-request", self._on_close_request)
+        GLib.idle_add(self._open_journal)
+
+    def _open_journal(self) -> bool:
+        """Open the queue journal and recover what the last session left behind."""
+        import sqlite3
+
+        from compresswitch.journal import Journal
+
+        try:
+            journal = Journal()
+            recovery = journal.recover()
+        except (sqlite3.Error, OSError):
+            return GLib.SOURCE_REMOVE  # Run without crash recovery
+        journal.added(list(self.queue))  # Files dropped in before it was open
+        self.queue.journal = journal
+        self._journal = journal
+        self._restore(recovery)
+        return GLib.SOURCE_REMOVE
+
+    def _create_scheduler(self) -> JobScheduler:
+        """Create the scheduler, and the stores it records jobs in, on first use."""
+        import sqlite3
+
+        from compresswitch.joblog import default_log_dir
+        from compresswitch.keys import KeysPreflight
+        from compresswitch.metrics import MetricsLog
+        from compresswitch.ordering import JobHistory
+        from compresswitch.scheduler import JobScheduler
+        from compresswitch.uptodate import Fingerprints
+
+        try:
+            self._fingerprints = Fingerprints()
+        except (sqlite3.Error, OSError):
+            self._fingerprints = None  # Fall back to the mtime check alone
+        try:
+            self._history = JobHistory()
+        except (sqlite3.Error, OSError):
+            self._history = None  # Estimates use typical throughput figures
+        try:
+            self._metrics_log = MetricsLog()
+        except OSError:
+            self._metrics_log = None
+        return JobScheduler(
+            self.queue,
+            on_started=self._on_job_started,
+            on_progress=self._on_worker_progress,
+            on_done=self._on_worker_done,
+            on_finished=self._finish_processing,
+            on_keys_error=self._on_keys_error,
+            fingerprints=self._fingerprints,
+            history=self._history,
+            metrics_log=self._metrics_log,
+            keys=KeysPreflight(),
+            log_dir=str(default_log_dir()),
+        )
+
+    def _restore(self, recovery: Recovery) -> None:
+        if not recovery.pending:
+            return
+        self._add_entries(recovery.pending)
+        count = len(recovery.pending)
+        self._progress_label.set_label(
+            f"Restored {count} unfinished file{'s' if count != 1 else ''} from the last session"
+        )
 
     # ── UI construction ──────────────────────────────────────────────
 
@@ -64,6 +158,19 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         )
         scrolled.set_child(content_box)
 
+        # Folder scan status, shown while dropped folders are being searched
+        self._scan_revealer = Gtk.Revealer()
+        scan_box = Gtk.Box(spacing=8)
+        scan_box.append(Gtk.Spinner(spinning=True))
+        self._scan_label = Gtk.Label(halign=Gtk.Align.START, hexpand=True)
+        scan_box.append(self._scan_label)
+        stop_scan_button = Gtk.Button(label="Stop")
+        stop_scan_button.add_css_class("flat")
+        stop_scan_button.connect("clicked", self._on_stop_scan)
+        scan_box.append(stop_scan_button)
+        self._scan_revealer.set_child(scan_box)
+        content_box.append(self._scan_revealer)
+
         # Stack for empty state vs file list
         self._stack = Gtk.Stack(transition_type=Gtk.StackTransitionType.CROSSFADE)
         content_box.append(self._stack)
@@ -71,15 +178,21 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         # Empty state
         self._status_page = Adw.StatusPage(
             title="No Files Added",
-            description="Drop files here or click to add",
+            description="Drop files or folders here or click to add",
             icon_name="document-open-symbolic",
             vexpand=True,
         )
-        add_button = Gtk.Button(label="Add Files", halign=Gtk.Align.CENTER)
+        empty_buttons = Gtk.Box(spacing=12, halign=Gtk.Align.CENTER)
+        add_button = Gtk.Button(label="Add Files")
         add_button.add_css_class("suggested-action")
         add_button.add_css_class("pill")
         add_button.connect("clicked", self._on_add_files_clicked)
-        self._status_page.set_child(add_button)
+        empty_buttons.append(add_button)
+        add_folder_button = Gtk.Button(label="Add Folder")
+        add_folder_button.add_css_class("pill")
+        add_folder_button.connect("clicked", self._on_add_folder_clicked)
+        empty_buttons.append(add_folder_button)
+        self._status_page.set_child(empty_buttons)
         self._stack.add_named(self._status_page, "empty")
 
         # File list state
@@ -92,11 +205,27 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         add_more_button.add_css_class("flat")
         add_more_button.connect("clicked", self._on_add_files_clicked)
         add_row_box.append(add_more_button)
+        add_folder_more_button = Gtk.Button(
+            icon_name="folder-new-symbolic", tooltip_text="Add Folder"
+        )
+        add_folder_more_button.add_css_class("flat")
+        add_folder_more_button.connect("clicked", self._on_add_folder_clicked)
+        add_row_box.append(add_folder_more_button)
         list_box_container.append(add_row_box)
 
-        self._list_box = Gtk.ListBox(selection_mode=Gtk.SelectionMode.NONE)
-        self._list_box.add_css_class("boxed-list")
-        list_box_container.append(self._list_box)
+        # Only the visible rows are realized; the list scrolls on its own
+        # once it outgrows max-content-height.
+        self._list_view = create_list_view(
+            self._model, self._on_remove_file, self._on_pause_file
+        )
+        self._list_view.add_css_class("card")
+        list_scroller = Gtk.ScrolledWindow(
+            hscrollbar_policy=Gtk.PolicyType.NEVER,
+            propagate_natural_height=True,
+            max_content_height=360,
+            child=self._list_view,
+        )
+        list_box_container.append(list_scroller)
 
         # Settings group
         self._settings_group = Adw.PreferencesGroup(title="Settings", margin_top=8)
@@ -108,6 +237,21 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         self._level_row.set_value(18)
         self._settings_group.add(self._level_row)
 
+        # Automatic level: highest level that keeps up with a target speed
+        self._auto_level_row = Adw.SwitchRow(
+            title="Automatic Level",
+            subtitle="Pick the highest level that meets the target speed",
+        )
+        self._settings_group.add(self._auto_level_row)
+        self._target_row = Adw.SpinRow.new_with_range(1, 2000, 5)
+        self._target_row.set_title("Target Speed (MiB/s)")
+        self._target_row.set_subtitle("Per file; the level above is used if unsure")
+        self._target_row.set_value(DEFAULT_TARGET_MBPS)
+        self._settings_group.add(self._target_row)
+        self._auto_level_row.bind_property(
+            "active", self._target_row, "visible", GObject.BindingFlags.SYNC_CREATE
+        )
+
         # Block compression
         self._block_row = Adw.SwitchRow(title="Block Compression")
         self._block_row.set_active(True)
@@ -126,6 +270,87 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         self._output_row.set_activatable_widget(browse_button)
         self._settings_group.add(self._output_row)
 
+        # Processing group (applies to compression and decompression alike)
+        processing_group = Adw.PreferencesGroup(title="Processing")
+        content_box.append(processing_group)
+
+        self._jobs_row = Adw.SpinRow.new_with_range(1, available_cpus(), 1)
+        self._jobs_row.set_title("Parallel Jobs")
+        self._jobs_row.set_subtitle("Files processed at the same time")
+        self._jobs_row.set_value(default_max_jobs())
+        processing_group.add(self._jobs_row)
+
+        # CPU budget shared by all jobs, split evenly into nsz threads
+        self._cpus_row = Adw.SpinRow.new_with_range(1, available_cpus(), 1)
+        self._cpus_row.set_title("CPU Budget")
+        self._cpus_row.set_subtitle("Cores all jobs together may use")
+        self._cpus_row.set_value(available_cpus())
+        processing_group.add(self._cpus_row)
+
+        self._background_row = Adw.SwitchRow(
+            title="Low Priority",
+            subtitle="Only use CPU and disk time other programs leave idle",
+        )
+        processing_group.add(self._background_row)
+
+        self._verify_row = Adw.SwitchRow(
+            title="Verify Outputs",
+            subtitle="Check each output with nsz while the next file converts",
+        )
+        processing_group.add(self._verify_row)
+
+        self._order_row = Adw.ComboRow(
+            title="Queue Order",
+            model=Gtk.StringList.new([ORDER_DESCRIPTIONS[order] for order in ORDERS]),
+        )
+        processing_group.add(self._order_row)
+
+        # Watch folder: new files dropped there are converted automatically
+        self._watch_row = Adw.ActionRow(title="Watch Folder", subtitle="Off")
+        self._unwatch_button = Gtk.Button(
+            icon_name="edit-clear-symbolic",
+            valign=Gtk.Align.CENTER,
+            tooltip_text="Stop Watching",
+            visible=False,
+        )
+        self._unwatch_button.add_css_class("flat")
+        self._unwatch_button.connect("clicked", self._on_unwatch_clicked)
+        self._watch_row.add_suffix(self._unwatch_button)
+        watch_button = Gtk.Button(
+            icon_name="folder-open-symbolic",
+            valign=Gtk.Align.CENTER,
+            tooltip_text="Choose Folder to Watch",
+        )
+        watch_button.add_css_class("flat")
+        watch_button.connect("clicked", self._on_watch_clicked)
+        self._watch_row.add_suffix(watch_button)
+        self._watch_row.set_activatable_widget(watch_button)
+        processing_group.add(self._watch_row)
+
+        # Scratch directory: nsz writes there, outputs are moved afterwards
+        self._scratch_row = Adw.ActionRow(
+            title="Scratch Directory", subtitle="Off (write directly to output)"
+        )
+        self._clear_scratch_button = Gtk.Button(
+            icon_name="edit-clear-symbolic",
+            valign=Gtk.Align.CENTER,
+            tooltip_text="Write Directly to Output",
+            visible=False,
+        )
+        self._clear_scratch_button.add_css_class("flat")
+        self._clear_scratch_button.connect("clicked", self._on_clear_scratch_clicked)
+        self._scratch_row.add_suffix(self._clear_scratch_button)
+        scratch_button = Gtk.Button(
+            icon_name="folder-open-symbolic",
+            valign=Gtk.Align.CENTER,
+            tooltip_text="Choose Scratch Directory",
+        )
+        scratch_button.add_css_class("flat")
+        scratch_button.connect("clicked", self._on_scratch_clicked)
+        self._scratch_row.add_suffix(scratch_button)
+        self._scratch_row.set_activatable_widget(scratch_button)
+        processing_group.add(self._scratch_row)
+
         # Progress area
         progress_box = Gtk.Box(
             orientation=Gtk.Orientation.VERTICAL,
@@ -144,8 +369,14 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         self._progress_bar = Gtk.ProgressBar(show_text=True)
         progress_box.append(self._progress_bar)
 
-        # Start/Cancel button
-        button_box = Gtk.Box(halign=Gtk.Align.CENTER, margin_top=4, margin_bottom=8)
+        # Start/Cancel and Pause/Resume buttons
+        button_box = Gtk.Box(
+            halign=Gtk.Align.CENTER, spacing=12, margin_top=4, margin_bottom=8
+        )
+        self._pause_button = Gtk.Button(label="Pause", visible=False)
+        self._pause_button.add_css_class("pill")
+        self._pause_button.connect("clicked", self._on_pause_resume)
+        button_box.append(self._pause_button)
         self._start_button = Gtk.Button(label="Start")
         self._start_button.add_css_class("suggested-action")
         self._start_button.add_css_class("pill")
@@ -180,68 +411,50 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
 
     # ── File list rows ───────────────────────────────────────────────
 
-    def _add_queue_row(self, entry: QueueEntry) -> None:
-        row = Adw.ActionRow(
-            title=entry.path.name,
-            subtitle=f"→ {entry.target}  ({entry.operation})",
-        )
-
-        # Status icon
-        icon = Gtk.Image(icon_name="content-loading-symbolic")
-        row.add_prefix(icon)
-
-        # Remove button
-        remove_btn = Gtk.Button(
-            icon_name="edit-delete-symbolic",
-            valign=Gtk.Align.CENTER,
-            tooltip_text="Remove",
-        )
-        remove_btn.add_css_class("flat")
-        idx = self.queue.index_of(entry)
-        remove_btn.connect("clicked", self._on_remove_file, idx)
-        row.add_suffix(remove_btn)
-
-        self._list_box.append(row)
-
-    def _refresh_list(self) -> None:
-        # Remove all rows
-        while True:
-            row = self._list_box.get_row_at_index(0)
-            if row is None:
-                break
-            self._list_box.remove(row)
-        # Re-add
-        for entry in self.queue:
-            self._add_queue_row(entry)
+    def _scan(self, paths: list[Path]) -> None:
+        """Search files and folders for Switch files without blocking the UI."""
+        if not paths:
+            return
+        from compresswitch.scanner import FolderScanner
+
+        scanner = FolderScanner(paths, on_batch=self._on_scan_batch)
+        scanner.on_finished = lambda _cancelled: self._on_scan_finished(scanner)
+        self._scanners.add(scanner)
+        self._update_scan_status()
+        scanner.start()
+
+    def _on_scan_batch(self, paths: list[Path]) -> None:
+        self._add_entries(paths)
+        self._update_scan_status()
+
+    def _on_scan_finished(self, scanner: FolderScanner) -> None:
+        self._scanners.discard(scanner)
+        self._update_scan_status()
+
+    def _update_scan_status(self) -> None:
+        if self._scanners:
+            found = sum(scanner.found for scanner in self._scanners)
+            self._scan_label.set_label(f"Searching folders… {found} files found")
+        self._scan_revealer.set_reveal_child(bool(self._scanners))
+
+    def _on_stop_scan(self, _button: Gtk.Button) -> None:
+        for scanner in self._scanners:
+            scanner.cancel()
+
+    def _add_entries(self, paths: list[Path]) -> None:
+        entries = self.queue.add_many(paths)
+        if entries:
+            self._model.append(entries)
+            self._on_queue_changed()
+
+    def _on_queue_changed(self) -> None:
         self._update_stack()
         self._update_settings_visibility()
 
     def _update_row_status(self, entry: QueueEntry) -> None:
-        idx = self.queue.index_of(entry)
-        row = self._list_box.get_row_at_index(idx)
-        if row is None:
-            return
-        # Update the prefix icon
-        icon = row.get_first_child()
-        # Navigate to the actual icon widget - Adw.ActionRow structure
-        # The prefix is the first child added via add_prefix
-        if entry.status == Status.DONE:
-            self._set_row_icon(row, "emblem-ok-symbolic")
-        elif entry.status == Status.ERROR:
-            self._set_row_icon(row, "dialog-error-symbolic")
-            row.set_subtitle(entry.error_message)
-        elif entry.status == Status.PROCESSING:
-            self._set_row_icon(row, "media-playback-start-symbolic")
-
-    def _set_row_icon(self, row: Adw.ActionRow, icon_name: str) -> None:
-        """Replace the prefix icon in an ActionRow."""
-        # ActionRow prefix box is the first child of the row's internal box
-        # We need to iterate to find our Gtk.Image
-        # Since we add_prefix(icon), it ends up in the row's prefix area
-        # Simplest: remove all prefixes and re-add
-        # Actually, Adw.ActionRow doesn't have remove_prefix, so we'll
-        # track it differently. For now, just update subtitle as indicator.
-        pass  # Icon updates are best-effort; status shown in subtitle
+        item = self._model.get(entry.id)
+        if item is not None:
+            item.sync()
 
     # ── Signal handlers ──────────────────────────────────────────────
 
@@ -263,12 +476,26 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
             files = dialog.open_multiple_finish(result)
         except GLib.Error:
             return  # User cancelled
-        for i in range(files.get_n_items()):
-            gfile = files.get_item(i)
-            path = Path(gfile.get_path())
-            if is_valid_switch_file(path):
-                self.queue.add(path)
-        self._refresh_list()
+        self._scan(self._local_paths(files.get_item(i) for i in range(files.get_n_items())))
+
+    def _on_add_folder_clicked(self, _button: Gtk.Button) -> None:
+        dialog = Gtk.FileDialog()
+        dialog.select_multiple_folders(self, None, self._on_folders_selected)
+
+    def _on_folders_selected(
+        self, dialog: Gtk.FileDialog, result: Gio.AsyncResult
+    ) -> None:
+        try:
+            folders = dialog.select_multiple_folders_finish(result)
+        except GLib.Error:
+            return  # User cancelled
+        self._scan(
+            self._local_paths(folders.get_item(i) for i in range(folders.get_n_items()))
+        )
+
+    @staticmethod
+    def _local_paths(gfiles) -> list[Path]:
+        return [Path(path) for gfile in gfiles if (path := gfile.get_path())]
 
     def _on_drop(
         self,
@@ -277,22 +504,24 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         _x: float,
         _y: float,
     ) -> bool:
-        files = value.get_files()
-        added = False
-        for gfile in files:
-            path = Path(gfile.get_path())
-            if is_valid_switch_file(path):
-                if self.queue.add(path):
-                    added = True
-        if added:
-            self._refresh_list()
+        self._scan(self._local_paths(value.get_files()))
         return True
 
-    def _on_remove_file(self, _button: Gtk.Button, index: int) -> None:
+    def _on_remove_file(self, entry_id: int) -> None:
         if self._processing:
             return  # Don't allow removal during processing
-        self.queue.remove(index)
-        self._refresh_list()
+        self.queue.remove(entry_id)
+        self._model.remove(entry_id)
+        self._on_queue_changed()
+
+    def _on_pause_file(self, entry_id: int) -> None:
+        if self._scheduler.is_paused(entry_id):
+            self._scheduler.resume(entry_id)
+        else:
+            self._scheduler.pause(entry_id)
+        item = self._model.get(entry_id)
+        if item is not None:
+            item.set_paused(self._scheduler.is_paused(entry_id))
 
     def _on_browse_output(self, _button: Gtk.Button) -> None:
         dialog = Gtk.FileDialog()
@@ -308,33 +537,132 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         path = folder.get_path()
         self._output_row.set_subtitle(path)
 
+    def _on_scratch_clicked(self, _button: Gtk.Button) -> None:
+        dialog = Gtk.FileDialog()
+        dialog.select_folder(self, None, self._on_scratch_dir_selected)
+
+    def _on_scratch_dir_selected(
+        self, dialog: Gtk.FileDialog, result: Gio.AsyncResult
+    ) -> None:
+        try:
+            folder = dialog.select_folder_finish(result)
+        except GLib.Error:
+            return
+        path = folder.get_path()
+        if path is None:
+            return
+        self._scratch_dir = path
+        self._scratch_row.set_subtitle(path)
+        self._clear_scratch_button.set_visible(True)
+
+    def _on_clear_scratch_clicked(self, _button: Gtk.Button) -> None:
+        self._scratch_dir = ""
+        self._scratch_row.set_subtitle("Off (write directly to output)")
+        self._clear_scratch_button.set_visible(False)
+
+    def _on_watch_clicked(self, _button: Gtk.Button) -> None:
+        dialog = Gtk.FileDialog()
+        dialog.select_folder(self, None, self._on_watch_folder_selected)
+
+    def _on_watch_folder_selected(
+        self, dialog: Gtk.FileDialog, result: Gio.AsyncResult
+    ) -> None:
+        try:
+            folder = dialog.select_folder_finish(result)
+        except GLib.Error:
+            return
+        path = folder.get_path()
+        if path is None:
+            return
+        from compresswitch.watcher import FolderWatcher
+
+        self._stop_watching()
+        self._watcher = FolderWatcher([Path(path)], on_files=self._on_watched_files)
+        self._watcher.start()
+        self._watch_row.set_subtitle(path)
+        self._unwatch_button.set_visible(True)
+
+    def _on_unwatch_clicked(self, _button: Gtk.Button) -> None:
+        self._stop_watching()
+
+    def _stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        self._watch_row.set_subtitle("Off")
+        self._unwatch_button.set_visible(False)
+
+    def _on_watched_files(self, paths: list[Path]) -> None:
+        from compresswitch.watcher import enqueue_arrivals
+
+        output_dir = self._output_row.get_subtitle()
+        if output_dir == "Same as input":
+            output_dir = ""
+        added, replaced = enqueue_arrivals(self.queue, paths, output_dir)
+        for entry in replaced:
+            self._model.remove(entry.id)
+        if not added:
+            return
+        self._model.append(added)
+        self._on_queue_changed()
+        if self._processing:
+            self._scheduler.start()  # Picks up the new entries
+        else:
+            self._start_processing()
+
+    def _on_close_request(self, _window: Adw.ApplicationWindow) -> bool:
+        for scanner in self._scanners:
+            scanner.cancel()
+        if self._watcher is not None:
+            self._watcher.stop()
+        if self._scheduler is not None:
+            self._scheduler.close()
+        if self._journal is not None:
+            self._journal.close()
+        if self._fingerprints is not None:
+            self._fingerprints.close()
+        if self._history is not None:
+            self._history.close()
+        if self._metrics_log is not None:
+            self._metrics_log.close()
+        return False
+
     def _on_start_cancel(self, _button: Gtk.Button) -> None:
         if self._processing:
             self._cancel_processing()
         else:
             self._start_processing()
 
+    def _on_pause_resume(self, _button: Gtk.Button) -> None:
+        if self._scheduler.paused:
+            self._scheduler.resume()
+            self._pause_button.set_label("Pause")
+            self._last_progress_time = GLib.get_monotonic_time()
+        else:
+            self._scheduler.pause()
+            self._pause_button.set_label("Resume")
+        for entry in self._scheduler.active_entries:
+            item = self._model.get(entry.id)
+            if item is not None:
+                item.set_paused(self._scheduler.is_paused(entry.id))
+        self._update_progress_label()
+
     # ── Processing logic ─────────────────────────────────────────────
 
     def _start_processing(self) -> None:
         if not self.queue.has_pending():
             return
+        if self._scheduler is None:
+            self._scheduler = self._create_scheduler()
 
         self._processing = True
+        self._keys_dialog_shown = False
         self._start_button.set_label("Cancel")
         self._start_button.remove_css_class("suggested-action")
         self._start_button.add_css_class("destructive-action")
-        self._process_next()
-
-    def _process_next(self) -> None:
-        entry = self.queue.next_pending()
-        if entry is None:
-            self._finish_processing()
-            return
-
-        entry.status = Status.PROCESSING
-        self._update_row_status(entry)
-        self._progress_label.set_label(f"Processing: {entry.path.name}")
+        self._pause_button.set_label("Pause")
+        self._pause_button.set_sensitive(True)
+        self._pause_button.set_visible(True)
         self._progress_bar.set_fraction(0)
         self._progress_bar.set_text("0%")
 
@@ -342,70 +670,116 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         if output_dir == "Same as input":
             output_dir = ""
 
-        self._worker = NszWorker(
-            entry,
+        self._last_progress_time = GLib.get_monotonic_time()
+        self._estimate = None
+        self._pulse_timeout_id = GLib.timeout_add(1000, self._check_pulse)
+        self._scheduler.max_jobs = int(self._jobs_row.get_value())
+        low_priority = self._background_row.get_active()
+        self._scheduler.resources = ResourcePolicy(
+            cpu_budget=int(self._cpus_row.get_value()),
+            nice=19 if low_priority else None,
+            ionice="idle" if low_priority else "",
+        )
+        self._scheduler.order = ORDERS[self._order_row.get_selected()]
+        self._scheduler.scratch_dir = self._scratch_dir
+        self._scheduler.verify = self._verify_row.get_active()
+        level_tuner = None
+        if self._auto_level_row.get_active():
+            level_tuner = LevelTuner(
+                target_mbps=self._target_row.get_value(),
+                threads=self._scheduler.resources.threads_for(self._scheduler.max_jobs),
+                fallback_level=int(self._level_row.get_value()),
+                history=self._history,
+            )
+        self._scheduler.start(
             compression_level=int(self._level_row.get_value()),
             block_compression=self._block_row.get_active(),
             output_dir=output_dir or "",
-            on_progress=self._on_worker_progress,
-            on_done=self._on_worker_done,
+            level_tuner=level_tuner,
         )
 
-        self._last_progress_time = GLib.get_monotonic_time()
-        self._pulse_timeout_id = GLib.timeout_add(2000, self._check_pulse)
-        self._worker.start()
+    def _on_job_started(self, entry: QueueEntry) -> None:
+        self._update_row_status(entry)
+        self._update_progress_label()
 
-    def _on_worker_progress(self, entry: QueueEntry, percent: int) -> None:
+    def _update_progress_label(self) -> None:
+        active = self._scheduler.active_entries
+        if self._scheduler.paused:
+            self._progress_label.set_label("Paused")
+            return
+        if len(active) == 1:
+            label = f"Processing: {active[0].path.name}"
+        elif active:
+            label = f"Processing {len(active)} files"
+        else:
+            return
+        estimate = self._estimate
+        if estimate is not None and estimate.remaining:
+            label += f" · {format_duration(estimate.remaining)} left"
+            if estimate.rate:
+                label += f" at {format_rate(estimate.rate)}"
+        self._progress_label.set_label(label)
+
+    def _update_progress_bar(self) -> None:
+        fraction = self._scheduler.progress()
+        self._progress_bar.set_fraction(fraction)
+        self._progress_bar.set_text(f"{int(fraction * 100)}%")
+
+    def _on_worker_progress(self, entry: QueueEntry, event: ProgressEvent) -> None:
         self._last_progress_time = GLib.get_monotonic_time()
-        entry.progress = percent
-        self._progress_bar.set_fraction(percent / 100.0)
-        self._progress_bar.set_text(f"{percent}%")
+        item = self._model.get(entry.id)
+        if item is not None:
+            item.update_progress(event)
+        self._update_progress_bar()
 
     def _on_worker_done(
         self, entry: QueueEntry, success: bool, message: str
     ) -> None:
-        if self._pulse_timeout_id:
-            GLib.source_remove(self._pulse_timeout_id)
-            self._pulse_timeout_id = None
-
-        if success:
-            entry.status = Status.DONE
-            entry.progress = 100
-            self._progress_bar.set_fraction(1.0)
-            self._progress_bar.set_text("100%")
-        else:
-            entry.status = Status.ERROR
-            entry.error_message = message
-            if "keys" in message.lower():
-                dialog = Adw.MessageDialog(
-                    transient_for=self,
-                    heading="Switch Keys Not Found",
-                    body=message,
-                )
-                dialog.add_response("ok", "OK")
-                dialog.present()
+        if not success and message == KEYS_MISSING_MESSAGE:
+            # Every other job would fail the same way, so stop launching
+            # new ones.
+            self._scheduler.stop()
+            self._on_keys_error(message)
 
         self._update_row_status(entry)
-        self._worker = None
+        self._update_progress_bar()
+        self._update_progress_label()
 
-        if self._processing and not entry.error_message.startswith("Cancel"):
-            self._process_next()
-        else:
-            self._finish_processing()
+    def _on_keys_error(self, message: str) -> None:
+        """Tell the user the keys are unusable, once per run."""
+        if self._keys_dialog_shown:
+            return
+        self._keys_dialog_shown = True
+        dialog = Adw.MessageDialog(
+            transient_for=self,
+            heading="Switch Keys Not Found",
+            body=message,
+        )
+        dialog.add_response("ok", "OK")
+        dialog.present()
 
     def _check_pulse(self) -> bool:
-        """Pulse the progress bar if no progress updates received recently."""
+        """Refresh the time-left estimates, and pulse the progress bar if no
+        progress updates were received recently."""
         if not self._processing:
             return False
+        if self._scheduler.paused:
+            return True
+        self._estimate = self._scheduler.estimate()
+        for entry_id, seconds in self._estimate.jobs.items():
+            item = self._model.get(entry_id)
+            if item is not None:
+                item.remaining = seconds
+        self._update_progress_label()
         elapsed = GLib.get_monotonic_time() - self._last_progress_time
         if elapsed > 2_000_000:  # 2 seconds in microseconds
             self._progress_bar.pulse()
         return True
 
     def _cancel_processing(self) -> None:
-        if self._worker:
-            self._worker.cancel()
-        self._finish_processing()
+        self._start_button.set_sensitive(False)
+        self._pause_button.set_sensitive(False)
+        self._scheduler.cancel()
 
     def _finish_processing(self) -> None:
         self._processing = False
@@ -416,12 +790,14 @@ class CompressSwitchWindow(Adw.ApplicationWindow):
         self._start_button.remove_css_class("destructive-action")
         self._start_button.add_css_class("suggested-action")
         self._start_button.set_sensitive(self.queue.has_pending())
+        self._pause_button.set_visible(False)
         self._progress_label.set_label("Ready")
 
 
 class CompressSwitchApp(Adw.Application):
     def __init__(self) -> None:
         super().__init__(application_id=APP_ID)
+        self._first_frame_id = 0
         self.connect("activate", self._on_activate)
 
     def _on_activate(self, _app: Adw.Application) -> None:
@@ -430,6 +806,14 @@ class CompressSwitchApp(Adw.Application):
             win = CompressSwitchWindow(application=self)
         self._setup_actions()
         win.present()
+        if startup.active():
+            clock = win.get_frame_clock()
+            if clock is not None:
+                self._first_frame_id = clock.connect("after-paint", self._on_first_frame)
+
+    def _on_first_frame(self, clock: Gdk.FrameClock) -> None:
+        clock.disconnect(self._first_frame_id)
+        startup.mark("first_frame", final=True)
 
     def _setup_actions(self) -> None:
         quit_action = Gio.SimpleAction(name="quit")
@@ -1,35 +1,132 @@
-"""Background nsz subprocess with pty-based progress capture."""
+"""Background nsz subprocess with structured progress capture."""
 
 from __future__ import annotations
 
+import json
 import os
-import pty
 import select
+import signal
 import subprocess
 import sys
 import threading
+import time
 from pathlib import Path
-from typing import Callable
-
-from gi.repository import GLib
+from typing import TYPE_CHECKING, Callable
 
 from compresswitch.file_queue import QueueEntry
-from compresswitch.utils import parse_progress
+from compresswitch.joblog import JobLog, OutputTail
+from compresswitch.keys import KEYS_MISSING_MESSAGE
+from compresswitch.metrics import JobMetrics, ProcessUsage, wait_with_usage
+from compresswitch.ordering import compression_mode
+from compresswitch.pool import PooledProcess, WorkerPool
+from compresswitch.progress import PROGRESS_FD_ENV, ProgressEvent
+from compresswitch.resources import LIMITS_ENV, JobLimits
+from compresswitch.utils import LineSplitter, parse_progress
+
+if TYPE_CHECKING:
+    from compresswitch.autolevel import LevelTuner
+
+
+# Seconds a cancelled job gets to exit after SIGTERM before it is killed
+KILL_TIMEOUT = 5.0
 
 
 def _find_nsz_command() -> list[str]:
     """Find how to invoke nsz.
 
+    Both modes go through main._run_nsz_worker so the progress channel
+    is installed before nsz starts.
     In PyInstaller: re-invokes ourselves with --nsz-worker flag.
-    In dev mode: uses python -m nsz from the venv.
+    In dev mode: runs compresswitch.main from the venv with the same flag.
     """
     if getattr(sys, "_MEIPASS", None):
         return [sys.executable, "--nsz-worker"]
-    return [sys.executable, "-m", "nsz"]
+    return [sys.executable, "-m", "compresswitch.main", "--nsz-worker"]
+
+
+# Posts ``callback(*args)`` to the UI thread after ``delay`` seconds
+Dispatch = Callable[..., None]
+
+
+def glib_dispatch(delay: float, callback: Callable, *args) -> None:
+    """Run a callback on the GLib main loop.
+
+    GLib is imported on first use so headless callers that pass their own
+    dispatcher never load gi.
+    """
+    from gi.repository import GLib
+
+    if delay <= 0:
+        GLib.idle_add(callback, *args)
+    else:
+        GLib.timeout_add(int(delay * 1000), callback, *args)
+
+
+class _ProgressCoalescer:
+    """Delivers only the latest progress event, at most ``rate`` times a second.
+
+    push() is called from the worker thread; at most one main-loop source
+    is pending per worker no matter how fast nsz reports.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[ProgressEvent], None],
+        dispatch: Dispatch,
+        rate: float = 30.0,
+    ):
+        self._deliver = deliver
+        self._dispatch = dispatch
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._latest: ProgressEvent | None = None
+        self._scheduled = False
+        self._closed = False
+        self._last_delivery = 0.0
+
+    def push(self, event: ProgressEvent) -> None:
+        with self._lock:
+            self._latest = event
+            if self._scheduled or self._closed:
+                return
+            self._scheduled = True
+            delay = self._last_delivery + self._interval - time.monotonic()
+        self._dispatch(max(0.0, delay), self._flush)
+
+    def close(self) -> None:
+        """Drop anything still pending; later pushes are ignored."""
+        with self._lock:
+            self._closed = True
+            self._latest = None
+
+    def _flush(self) -> bool:
+        with self._lock:
+            event = self._latest
+            self._latest = None
+            self._scheduled = False
+            self._last_delivery = time.monotonic()
+        if event is not None:
+            self._deliver(event)
+        return False
 
 
 class NszWorker:
-    """Runs nsz as a subprocess in a pty, parsing progress output."""
+    """Runs nsz as a subprocess, reading its output and progress events.
+
+    Once the process has exited, ``metrics`` holds its wall time and
+    resource usage (see compresswitch.metrics).
+
+    nsz runs in its own process group, so pause, resume and cancel reach
+    the processes it starts too. None of them block: a cancelled job is
+    killed if it has not exited KILL_TIMEOUT seconds after SIGTERM, and
+    its partial output is removed before on_done fires.
+
+    With ``verify``, the entry's existing output in ``output_dir`` is
+    checked with ``nsz -V`` instead, and deleted if it fails.
+
+    Only the tail of nsz's output is kept in memory; with a ``log_path``
+    all of it is appended to that file (see compresswitch.joblog).
+    """
 
     def __init__(
         self,
@@ -38,131 +135,224 @@ class NszWorker:
         compression_level: int = 18,
         block_compression: bool = True,
         output_dir: str = "",
-        on_progress: Callable[[QueueEntry, int], None] | None = None,
+        verify: bool = False,
+        log_path: Path | None = None,
+        level_tuner: LevelTuner | None = None,
+        limits: JobLimits | None = None,
+        pool: WorkerPool | None = None,
+        on_progress: Callable[[QueueEntry, ProgressEvent], None] | None = None,
         on_done: Callable[[QueueEntry, bool, str], None] | None = None,
+        dispatch: Dispatch | None = None,
     ):
         self.entry = entry
         self.compression_level = compression_level
         self.block_compression = block_compression
         self.output_dir = output_dir
+        self.verify = verify
+        self.log_path = log_path
+        self.level_tuner = level_tuner
+        self.limits = limits
+        self.pool = pool
         self.on_progress = on_progress
         self.on_done = on_done
 
-        self._process: subprocess.Popen | None = None
+        self.metrics: JobMetrics | None = None
+        self._process: subprocess.Popen | PooledProcess | None = None
         self._thread: threading.Thread | None = None
         self._cancelled = False
+        self._keep_output = False
+        self._paused = False
+        self._kill_timer: threading.Timer | None = None
+        self._dispatch = dispatch or glib_dispatch
+        self._progress = _ProgressCoalescer(self._deliver_progress, self._dispatch)
+
+    @property
+    def output_path(self) -> Path:
+        """The file nsz will write for this entry."""
+        return self.entry.output_in(self.output_dir)
 
     def _build_command(self) -> list[str]:
-        cmd = list(_find_nsz_command())
+        return _find_nsz_command() + self._build_args()
+
+    def _build_args(self) -> list[str]:
+        """Return the nsz arguments for this entry, without the executable."""
+        if self.verify:
+            return ["-V", str(self.output_path)]
+        args: list[str] = []
         if self.entry.operation == "compress":
-            cmd += ["-C"]
+            args += ["-C"]
             if self.entry.path.suffix.lower() == ".xci" and self.block_compression:
-                cmd += ["-B"]
+                args += ["-B"]
             elif self.entry.path.suffix.lower() == ".xci":
-                cmd += ["-S"]
+                args += ["-S"]
             else:
                 # NSP: block vs solid
                 if self.block_compression:
-                    cmd += ["-B"]
+                    args += ["-B"]
                 else:
-                    cmd += ["-S"]
-            cmd += ["-l", str(self.compression_level)]
+                    args += ["-S"]
+            args += ["-l", str(self.compression_level)]
+            if self.limits is not None and self.limits.threads:
+                args += ["-t", str(self.limits.threads)]
         else:
-            cmd += ["-D"]
+            args += ["-D"]
 
         if self.output_dir:
-            cmd += ["-o", self.output_dir]
+            args += ["-o", self.output_dir]
 
-        # --no-verify to skip post-compression verification (faster)
-        cmd.append(str(self.entry.path))
-        return cmd
+        args.append(str(self.entry.path))
+        return args
 
     def start(self) -> None:
         """Launch the nsz subprocess in a background thread."""
         self._cancelled = False
+        self._keep_output = False
         self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
 
-    def cancel(self) -> None:
-        """Cancel the running operation."""
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def pause(self) -> None:
+        """Stop nsz where it is (SIGSTOP) until resume()."""
+        self._paused = True
+        self._signal(signal.SIGSTOP)
+
+    def resume(self) -> None:
+        self._paused = False
+        self._signal(signal.SIGCONT)
+
+    def cancel(self, discard: bool = True) -> None:
+        """Cancel the running operation; returns at once.
+
+        Without ``discard``, what nsz wrote is left alone, for when the
+        output path belongs to someone else by now.
+        """
         self._cancelled = True
-        if self._process and self._process.poll() is None:
-            self._process.terminate()
-            try:
-                self._process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self._process.kill()
+        self._keep_output = not discard
+        self._terminate()
 
-    def _run(self) -> None:
-        """Thread target: run nsz and capture progress."""
-        try:
-            cmd = self._build_command()
-        except FileNotFoundError as e:
-            self._report_done(False, str(e))
+    def _terminate(self) -> None:
+        if self._process is None:
+            return  # _run terminates it once it has started
+        self._signal(signal.SIGTERM)
+        self._signal(signal.SIGCONT)  # A stopped process cannot exit
+        if self._kill_timer is None:
+            self._kill_timer = threading.Timer(KILL_TIMEOUT, self._signal, (signal.SIGKILL,))
+            self._kill_timer.daemon = True
+            self._kill_timer.start()
+
+    def _signal(self, sig: int) -> None:
+        """Send ``sig`` to nsz's process group, if it is still running."""
+        process = self._process
+        if process is None or process.returncode is not None:
             return
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
 
-        master_fd, slave_fd = pty.openpty()
+    def _run(self) -> None:
+        """Thread target: run nsz and capture its output and progress events."""
+        out_r, out_w = os.pipe()
+        prog_r, prog_w = os.pipe()
+        log = None
         try:
-            self._process = subprocess.Popen(
-                cmd,
-                stdout=slave_fd,
-                stderr=slave_fd,
-                stdin=subprocess.DEVNULL,
-                close_fds=True,
-            )
-            os.close(slave_fd)
-            slave_fd = -1
+            if (
+                self.level_tuner is not None
+                and self.entry.operation == "compress"
+                and not self.verify
+            ):
+                self._report_progress(ProgressEvent(stage="tune"))
+                self.compression_level = self.level_tuner.level_for(self.entry.path)
+            if self._cancelled:
+                self._report_done(False, "Cancelled")
+                return
+            if self.log_path is not None:
+                try:
+                    log = JobLog(self.log_path)
+                except OSError:
+                    pass  # Run without a log rather than not at all
+                else:
+                    log.header(self._build_args())
+            started = time.monotonic()
+            self._process = self._launch(out_w, prog_w)
+            if self._cancelled:
+                self._terminate()
+            elif self._paused:
+                self._signal(signal.SIGSTOP)
+            os.close(out_w)
+            os.close(prog_w)
+            out_w = prog_w = -1
 
-            output_lines: list[str] = []
-            buf = b""
-            while True:
+            tail = OutputTail()
+            structured = False
+            splitters = {out_r: LineSplitter(), prog_r: LineSplitter()}
+            open_fds = [out_r, prog_r]
+            while open_fds:
                 if self._cancelled:
                     break
-                ready, _, _ = select.select([master_fd], [], [], 0.2)
-                if ready:
+                ready, _, _ = select.select(open_fds, [], [], 0.2)
+                if not ready:
+                    if self._process.poll() is not None:
+                        break
+                    continue
+                for fd in ready:
                     try:
-                        data = os.read(master_fd, 4096)
+                        data = os.read(fd, 65536)
                     except OSError:
-                        break
+                        data = b""
                     if not data:
-                        break
-                    buf += data
-                    # Process line-like chunks (enlighten uses \r for updates)
-                    while b"\r" in buf or b"\n" in buf:
-                        # Split on either \r or \n
-                        idx_r = buf.find(b"\r")
-                        idx_n = buf.find(b"\n")
-                        if idx_r == -1:
-                            idx = idx_n
-                        elif idx_n == -1:
-                            idx = idx_r
-                        else:
-                            idx = min(idx_r, idx_n)
-                        line = buf[:idx].decode("utf-8", errors="replace")
-                        buf = buf[idx + 1 :]
-                        if line.strip():
-                            output_lines.append(line)
-                            pct = parse_progress(line)
-                            if pct is not None:
-                                self._report_progress(pct)
-                elif self._process.poll() is not None:
-                    break
+                        open_fds.remove(fd)
+                        continue
+                    lines = splitters[fd].feed(data)
+                    if fd == prog_r:
+                        # Only the newest event matters; skip parsing stale ones.
+                        for line in reversed(lines):
+                            event = ProgressEvent.from_json(line)
+                            if event is not None:
+                                structured = True
+                                self._report_progress(event)
+                                break
+                        continue
+                    for raw in lines:
+                        line = raw.decode("utf-8", errors="replace")
+                        if not line.strip():
+                            continue
+                        pct = parse_progress(line)
+                        tail.add(line, progress=pct is not None)
+                        if log is not None:
+                            log.write(line, pct)
+                        if pct is not None and not structured:
+                            # Fallback for workers that only print bars
+                            self._report_progress(ProgressEvent(fraction=pct / 100))
+            rest = splitters[out_r].flush()
+            if rest.strip():
+                line = rest.decode("utf-8", errors="replace")
+                tail.add(line)
+                if log is not None:
+                    log.write(line)
 
-            # Read any remaining data
-            try:
-                while True:
-                    ready, _, _ = select.select([master_fd], [], [], 0.1)
-                    if not ready:
-                        break
-                    data = os.read(master_fd, 4096)
-                    if not data:
-                        break
-                    output_lines.append(data.decode("utf-8", errors="replace"))
-            except OSError:
-                pass
-
-            self._process.wait()
-            returncode = self._process.returncode
+            if self._cancelled:
+                self._terminate()
+            returncode, usage = self._wait()
+            if log is not None:
+                log.write("cancelled" if self._cancelled else f"exit code {returncode}")
+            if self._kill_timer is not None:
+                self._kill_timer.cancel()
+            if (returncode != 0 or self._cancelled) and not self._keep_output:
+                self._discard_output()
+            compressing = self.entry.operation == "compress"
+            self.metrics = JobMetrics(
+                path=str(self.entry.path),
+                operation=self.entry.operation,
+                level=self.compression_level if compressing else 0,
+                mode=compression_mode(self.block_compression) if compressing else "",
+                success=returncode == 0 and not self._cancelled,
+                wall_seconds=time.monotonic() - started,
+                usage=usage,
+            )
 
             if self._cancelled:
                 self._report_done(False, "Cancelled")
@@ -170,14 +360,14 @@ class NszWorker:
                 self._report_done(True, "")
             else:
                 # Check for known errors
-                full_output = "\n".join(output_lines)
-                if "keys" in full_output.lower() and (
-                    "missing" in full_output.lower()
-                    or "not found" in full_output.lower()
-                    or "prod.keys" in full_output.lower()
+                output = tail.text().lower()
+                if "keys" in output and (
+                    "missing" in output or "not found" in output or "prod.keys" in output
                 ):
+                    self._report_done(False, KEYS_MISSING_MESSAGE)
+                elif self.verify:
                     self._report_done(
-                        False, "Switch keys not found. Place prod.keys in ~/.switch/"
+                        False, f"Verification failed (nsz exited with code {returncode})"
                     )
                 else:
                     self._report_done(
@@ -186,20 +376,65 @@ class NszWorker:
         except Exception as e:
             self._report_done(False, str(e))
         finally:
-            if slave_fd >= 0:
-                try:
-                    os.close(slave_fd)
-                except OSError:
-                    pass
+            if log is not None:
+                log.close()
+            for fd in (out_w, prog_w, out_r, prog_r):
+                if fd >= 0:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+
+    def _launch(self, out_fd: int, progress_fd: int) -> subprocess.Popen | PooledProcess:
+        """Start nsz on the pool if there is one, else spawn a fresh process."""
+        limits = self.limits.to_dict() if self.limits is not None else None
+        if self.pool is not None:
             try:
-                os.close(master_fd)
+                return self.pool.launch(self._build_args(), out_fd, progress_fd, limits)
             except OSError:
-                pass
+                pass  # Fall back to a one-off process below
+        env = dict(os.environ)
+        env[PROGRESS_FD_ENV] = str(progress_fd)
+        if limits is not None:
+            env[LIMITS_ENV] = json.dumps(limits)
+        return subprocess.Popen(
+            self._build_command(),
+            stdout=out_fd,
+            stderr=out_fd,
+            stdin=subprocess.DEVNULL,
+            pass_fds=[progress_fd],
+            env=env,
+            start_new_session=True,  # Its own process group, see _signal
+        )
+
+    def _discard_output(self) -> None:
+        """Remove what a failed or cancelled nsz run wrote."""
+        try:
+            self.output_path.unlink()
+        except OSError:
+            pass
+
+    def _wait(self) -> tuple[int, ProcessUsage | None]:
+        """Wait for nsz to exit; return its exit code and resource usage."""
+        process = self._process
+        if isinstance(process, PooledProcess):
+            return process.wait(), process.usage
+        try:
+            done = wait_with_usage(process.pid)
+        except ChildProcessError:
+            return process.wait(), None
+        process.returncode = done[0]
+        return done
+
+    def _report_progress(self, event: ProgressEvent) -> None:
+        if self.on_progress:
+            self._progress.push(event)
 
-    def _report_progress(self, percent: int) -> None:
+    def _deliver_progress(self, event: ProgressEvent) -> None:
         if self.on_progress:
-            GLib.idle_add(self.on_progress, self.entry, percent)
+            self.on_progress(self.entry, event)
 
     def _report_done(self, success: bool, message: str) -> None:
+        self._progress.close()
         if self.on_done:
-            GLib.idle_add(self.on_done, self.entry, success, message)
+            self._dispatch(0, self.on_done, self.entry, success, message)
@@ -0,0 +1,122 @@
+"""Several batch processes sharing one ``--coordinate`` directory.
+
+Each "host" is a local ``compresswitch batch`` process running the fake nsz
+from benchmarks/, so no Switch keys or game files are needed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_NSZ = ROOT / "benchmarks" / "fake_nsz.py"
+MiB = 1 << 20
+
+_HOST = """
+import sys
+from compresswitch import cli, worker
+worker._find_nsz_command = lambda: [sys.executable, {fake!r}]
+sys.exit(cli.run_batch(sys.argv[1:]))
+""".format(fake=str(FAKE_NSZ))
+
+_KEYS = "\n".join(
+    [
+        "header_key = " + "a" * 64,
+        "aes_kek_generation_source = " + "c" * 32,
+        "aes_key_generation_source = " + "c" * 32,
+        "titlekek_source = " + "c" * 32,
+        "key_area_key_application_source = " + "c" * 32,
+        "master_key_00 = " + "c" * 32,
+    ]
+)
+
+
+@pytest.fixture
+def batch(tmp_path: Path) -> Path:
+    """A home with keys, six inputs and an empty coordination directory."""
+    (tmp_path / "home" / ".switch").mkdir(parents=True)
+    (tmp_path / "home" / ".switch" / "prod.keys").write_text(_KEYS)
+    (tmp_path / "in").mkdir()
+    for i in range(6):
+        with open(tmp_path / "in" / f"game{i}.nsp", "wb") as f:
+            f.truncate(2 * MiB)
+    (tmp_path / "out").mkdir()
+    return tmp_path
+
+
+def _start_host(batch: Path, *args: str, rate: float) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "HOME": str(batch / "home"),
+        "XDG_CACHE_HOME": str(batch / "home" / "cache"),
+        "XDG_DATA_HOME": str(batch / "home" / "data"),
+        "XDG_STATE_HOME": str(batch / "home" / "state"),
+        "PYTHONPATH": str(ROOT / "src"),
+        "FAKE_NSZ_RATE": str(rate),
+    }
+    command = [sys.executable, "-c", _HOST, str(batch / "in"), "-o", str(batch / "out")]
+    return subprocess.Popen(
+        command + ["--coordinate", str(batch / "shared"), *args],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+
+
+def _results(batch: Path) -> list[dict]:
+    return [json.loads(p.read_text()) for p in (batch / "shared" / "results").glob("*.json")]
+
+
+def test_hosts_convert_each_file_once(batch: Path) -> None:
+    hosts = [_start_host(batch, "-j", "1", rate=8) for _ in range(3)]
+    started = time.monotonic()
+    outputs = [host.communicate(timeout=60)[0] for host in hosts]
+    elapsed = time.monotonic() - started
+
+    assert [host.returncode for host in hosts] == [0, 0, 0], outputs
+    runs = sum(output.count("started  ") for output in outputs)
+    assert runs == 6, outputs
+    assert sorted(p.name for p in (batch / "out").iterdir()) == [
+        f"game{i}.nsz" for i in range(6)
+    ]
+    results = _results(batch)
+    assert len(results) == 6 and all(r["status"] == "done" for r in results)
+    assert not list((batch / "shared" / "leases").glob("*.lease"))
+    for output in outputs:
+        summary = output.strip().splitlines()[-1]
+        converted = int(summary.split(" converted,")[0])
+        assert converted == 6 or f"{6 - converted} converted on other hosts" in summary
+        assert "up to date" not in summary
+    # Hosts settle the others' files as they finish, not at the next
+    # heartbeat (every 10 s with the default --lease-ttl).
+    assert elapsed < 8, outputs
+
+
+def test_lease_of_killed_host_is_taken_over(batch: Path) -> None:
+    dead = _start_host(batch, "-j", "6", "--lease-ttl", "1", rate=1)
+    for line in dead.stdout:
+        if line.startswith("started"):
+            break
+    time.sleep(0.3)
+    dead.send_signal(signal.SIGKILL)  # Leaves its leases behind
+    dead.communicate()
+    assert list((batch / "shared" / "leases").glob("*.lease"))
+
+    survivor = _start_host(batch, "-j", "6", "--lease-ttl", "1", rate=0)
+    output = survivor.communicate(timeout=60)[0]
+
+    assert survivor.returncode == 0, output
+    assert output.count("started  ") == 6, output
+    results = _results(batch)
+    assert len(results) == 6
+    assert {r["host"].rsplit(":", 1)[1] for r in results} == {str(survivor.pid)}
+    assert len(list((batch / "out").iterdir())) == 6
@@ -0,0 +1,62 @@
+"""LineSplitter, which splits nsz's stdout and progress pipes into lines."""
+
+from __future__ import annotations
+
+import pytest
+
+from compresswitch.utils import LineSplitter
+
+# A bar redrawn with CR, then regular output ending in LF and CRLF
+STREAM = b"10%|#   |\r55%|###  |\rdone\nwritten: out.nsz\r\nverified\n"
+LINES = [b"10%|#   |", b"55%|###  |", b"done", b"written: out.nsz", b"verified"]
+
+
+def _split(chunks: list[bytes], max_line: int = 1 << 16) -> tuple[list[bytes], bytes]:
+    splitter = LineSplitter(max_line)
+    lines = [line for chunk in chunks for line in splitter.feed(chunk)]
+    return lines, splitter.flush()
+
+
+def _content(lines: list[bytes]) -> list[bytes]:
+    # Readers skip blank lines, such as the one between the CR and LF of a CRLF.
+    return [line for line in lines if line.strip()]
+
+
+@pytest.mark.parametrize("end", [b"\r", b"\n", b"\r\n"])
+def test_line_endings(end: bytes) -> None:
+    lines, rest = _split([b"one" + end + b"two" + end])
+    assert _content(lines) == [b"one", b"two"]
+    assert not rest.strip()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16])
+def test_chunk_boundaries_do_not_change_lines(size: int) -> None:
+    chunks = [STREAM[i : i + size] for i in range(0, len(STREAM), size)]
+    lines, rest = _split(chunks)
+    assert _content(lines) == LINES
+    assert rest == b""
+
+
+def test_crlf_split_between_chunks() -> None:
+    whole, _ = _split([b"first\r\nsecond\r\n"])
+    split, _ = _split([b"first\r", b"\nsecond\r", b"\n"])
+    assert split == whole
+    assert _content(split) == [b"first", b"second"]
+
+
+def test_partial_line_waits_for_its_end() -> None:
+    splitter = LineSplitter()
+    assert splitter.feed(b"compressing ga") == []
+    assert splitter.feed(b"me.nsp") == []
+    assert splitter.feed(b"\nwrit") == [b"compressing game.nsp"]
+    assert splitter.flush() == b"writ"
+    assert splitter.flush() == b""
+
+
+def test_runaway_line_is_cut_at_max_line() -> None:
+    splitter = LineSplitter(max_line=8)
+    assert splitter.feed(b"12345678") == []  # At the limit it is still kept
+    assert splitter.feed(b"9") == [b"123456789"]
+    assert splitter.feed(b"abc\n") == [b"abc"]
+    assert splitter.feed(b"line\n" + b"x" * 20) == [b"line", b"x" * 20]
+    assert splitter.flush() == b""
@@ -0,0 +1,65 @@
+"""_ProgressCoalescer, which throttles progress events into the main loop."""
+
+from __future__ import annotations
+
+from typing import Callable
+
+from compresswitch.progress import ProgressEvent
+from compresswitch.worker import _ProgressCoalescer
+
+
+class _Loop:
+    """Records dispatched callbacks instead of running them."""
+
+    def __init__(self) -> None:
+        self.pending: list[tuple[float, Callable[[], bool]]] = []
+
+    def dispatch(self, delay: float, callback: Callable[[], bool]) -> None:
+        self.pending.append((delay, callback))
+
+    def run(self) -> None:
+        pending, self.pending = self.pending, []
+        for _, callback in pending:
+            callback()
+
+
+def _coalescer(rate: float = 30.0) -> tuple[_ProgressCoalescer, _Loop, list[ProgressEvent]]:
+    loop = _Loop()
+    delivered: list[ProgressEvent] = []
+    return _ProgressCoalescer(delivered.append, loop.dispatch, rate), loop, delivered
+
+
+def test_latest_event_wins() -> None:
+    coalescer, loop, delivered = _coalescer()
+    for fraction in (0.1, 0.2, 0.3):
+        coalescer.push(ProgressEvent(fraction=fraction))
+    assert len(loop.pending) == 1  # One source however many events arrive
+    loop.run()
+    assert [event.fraction for event in delivered] == [0.3]
+
+    loop.run()
+    assert len(delivered) == 1
+
+
+def test_deliveries_are_spaced_by_rate() -> None:
+    coalescer, loop, delivered = _coalescer(rate=10)
+    coalescer.push(ProgressEvent(fraction=0.1))
+    assert loop.pending[0][0] == 0.0
+    loop.run()
+    coalescer.push(ProgressEvent(fraction=0.2))
+    delay = loop.pending[0][0]
+    assert 0.0 < delay <= 0.1
+    loop.run()
+    assert [event.fraction for event in delivered] == [0.1, 0.2]
+
+
+def test_nothing_is_delivered_after_close() -> None:
+    coalescer, loop, delivered = _coalescer()
+    coalescer.push(ProgressEvent(fraction=0.5))
+    coalescer.close()
+    loop.run()  # The source scheduled before close() still fires
+    assert delivered == []
+
+    coalescer.push(ProgressEvent(fraction=0.9))
+    assert loop.pending == []
+    assert delivered == []